@@ -0,0 +1,160 @@
+"""Data for the live admin dashboard stream.
+
+The stream tracks the highest bill and transaction ids the page has seen and
+the latest ``Transaction.settled_at``. Each poll costs three single-row index
+reads while nothing changes. A new bill or transaction moves an id; a gateway
+payment settling updates its pending transaction in place and moves the
+settlement mark. Either way only the new or settled rows and the KPI
+aggregates are read and sent. Everything is limited to the current
+organization.
+"""
+
+from __future__ import annotations
+
+import json
+
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Count, Q, Sum
+
+from billingapp.models import Bill, Subscription, Transaction
+from billingapp.tenancy import scoped_customers
+
+MAX_ROWS_PER_EVENT = 20
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def dashboard_kpis() -> dict:
+    """Headline figures shown at the top of the admin dashboard."""
+
+    bill_totals = Bill.scoped.aggregate(
+        pending_bills_count=Count("id", filter=Q(status=Bill.STATUS_UNPAID)),
+        total_outstanding=Sum("amount", filter=Q(status=Bill.STATUS_UNPAID)),
+    )
+    return {
+        "total_customers": scoped_customers().count(),
+        "pending_bills_count": bill_totals["pending_bills_count"],
+        "total_outstanding": bill_totals["total_outstanding"] or 0,
+        "total_paid": Transaction.scoped.filter(status=Transaction.STATUS_SUCCESS).aggregate(total=Sum("amount"))["total"]
+        or 0,
+        "subscription_stats": list(
+            Subscription.scoped.values("active").annotate(total=Count("id")).order_by("-active")
+        ),
+    }
+
+
+def high_water_marks() -> tuple[int, int, int]:
+    """Return ``(last bill id, last transaction id, settlement mark)`` for the current organization.
+
+    The settlement mark is the latest ``settled_at`` in microseconds since the
+    epoch. Each read walks backwards along an index and stops at the first row.
+    """
+
+    bill_mark = Bill.scoped.order_by("-id").values_list("id", flat=True).first()
+    transaction_mark = Transaction.scoped.order_by("-id").values_list("id", flat=True).first()
+    settled_at = (
+        Transaction.scoped.filter(settled_at__isnull=False)
+        .order_by("-settled_at")
+        .values_list("settled_at", flat=True)
+        .first()
+    )
+    settled_mark = (settled_at - EPOCH) // timedelta(microseconds=1) if settled_at else 0
+    return bill_mark or 0, transaction_mark or 0, settled_mark
+
+
+def format_mark(bill_mark: int, transaction_mark: int, settled_mark: int) -> str:
+    return f"{bill_mark}-{transaction_mark}-{settled_mark}"
+
+
+def parse_mark(value: str | None) -> tuple[int, int, int] | None:
+    try:
+        bill_mark, transaction_mark, settled_mark = (int(part) for part in (value or "").split("-"))
+    except ValueError:
+        return None
+    if bill_mark < 0 or transaction_mark < 0 or settled_mark < 0:
+        return None
+    return bill_mark, transaction_mark, settled_mark
+
+
+def _bill_row(bill: Bill) -> dict:
+    return {
+        "id": bill.pk,
+        "user_id": bill.user_id,
+        "username": bill.user.username,
+        "title": bill.title,
+        "bill_type": bill.get_bill_type_display(),
+        "due_date": bill.due_date.isoformat(),
+        "created": bill.created_at.strftime("%d %b %Y"),
+        "amount": str(bill.amount),
+        "status": bill.status,
+    }
+
+
+def _transaction_row(txn: Transaction) -> dict:
+    return {
+        "id": txn.pk,
+        "bill_id": txn.bill_id,
+        "user_id": txn.user_id,
+        "username": txn.user.username,
+        "bill_title": txn.bill_title,
+        "payment_date": txn.payment_date.strftime("%d %b %Y %H:%M"),
+        "amount": str(txn.amount),
+        "method": txn.method,
+        "status": txn.status,
+        "status_display": txn.get_status_display(),
+    }
+
+
+def dashboard_changes(
+    bill_mark: int, transaction_mark: int, settled_mark: int
+) -> tuple[tuple[int, int, int], dict | None]:
+    """Return the new marks and a delta payload, or ``None`` when nothing changed.
+
+    Transactions are sent when they are new or settled after ``settled_mark``;
+    the page replaces a row it already shows.
+    """
+
+    marks = high_water_marks()
+    if marks == (bill_mark, transaction_mark, settled_mark):
+        return marks, None
+
+    new_bills = list(
+        Bill.scoped.filter(pk__gt=bill_mark).select_related("user").order_by("-id")[:MAX_ROWS_PER_EVENT]
+    )
+    new_transactions = list(
+        Transaction.scoped.filter(
+            Q(pk__gt=transaction_mark) | Q(settled_at__gt=EPOCH + timedelta(microseconds=settled_mark))
+        )
+        .select_related("user")
+        .order_by("-id")[:MAX_ROWS_PER_EVENT]
+    )
+    return marks, {
+        "bills": [_bill_row(bill) for bill in new_bills],
+        "transactions": [_transaction_row(txn) for txn in new_transactions],
+        "kpis": kpi_snapshot(),
+    }
+
+
+def kpi_snapshot() -> dict:
+    return encode_kpis(dashboard_kpis())
+
+
+def encode_kpis(kpis: dict) -> dict:
+    return {
+        "total_customers": kpis["total_customers"],
+        "pending_bills_count": kpis["pending_bills_count"],
+        "total_outstanding": f"{kpis['total_outstanding']:.2f}",
+        "total_paid": f"{kpis['total_paid']:.2f}",
+        "subscriptions_active": sum(row["total"] for row in kpis["subscription_stats"] if row["active"]),
+        "subscriptions_paused": sum(row["total"] for row in kpis["subscription_stats"] if not row["active"]),
+    }
+
+
+def sse_message(event: str, data, event_id: str | None = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
@@ -1,3 +1,283 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from adminportal.live import dashboard_changes, format_mark, high_water_marks, parse_mark
+from billingapp.bulkbills import assign_bills, segment_customers
+from billingapp.jobs import DuplicateJob, claim_next_job, enqueue, run_job
+from billingapp.models import Bill, Job, Profile, Subscription, Transaction
+from billingapp.payments import SimulatedGateway, settle, start_payment
+from billingplatform.querybudget import unbudgeted_views
+from billingplatform.testing import STORAGES, ConstantQueriesMixin, add_billing_history
+
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_CHECKS=True, QUERY_BUDGET_STRICT=True, STORAGES=STORAGES)
+class QueryBudgetTests(ConstantQueriesMixin, TestCase):
+    """Every admin page stays within its budget and issues the same number of queries as data grows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("staff", password="secret", is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.customers = []
+
+    def seed(self, size):
+        while len(self.customers) < size:
+            number = len(self.customers)
+            customer = User.objects.create_user(f"customer{number}", password="secret")
+            add_billing_history(customer, number, paid_by=self.admin)
+            Job.objects.create(name="ensure_subscription_bills", payload={"user_id": customer.pk}, created_by=self.admin)
+            self.customers.append(customer)
+
+    def grow_customer(self, customer, size):
+        today = timezone.now().date()
+        subscription = customer.subscriptions.first()
+        for number in range(customer.bills.count(), size):
+            bill = Bill.objects.create(
+                user=customer, subscription=subscription, title=f"Bill {number}", amount=10, due_date=today + timedelta(days=number)
+            )
+            if number % 2:
+                bill.mark_paid(paid_by=self.admin)
+                Subscription.objects.filter(pk=subscription.pk).update(active=not subscription.active)
+
+    def test_every_view_declares_a_budget(self):
+        self.assertEqual(unbudgeted_views({"adminportal.views"}), [])
+
+    def test_list_pages(self):
+        for name in ("dashboard", "customer_list", "job_list", "bill_create", "bulk_bill_create", "subscription_create", "customer_create"):
+            with self.subTest(name=name):
+                self.customers = list(User.objects.filter(is_staff=False).order_by("pk"))
+                self.assertConstantQueries(lambda: reverse(f"adminportal:{name}"), self.seed)
+
+    def test_search(self):
+        self.assertConstantQueries(lambda: reverse("adminportal:search") + "?q=customer", self.seed)
+
+    def test_customer_pages(self):
+        self.seed(1)
+        customer = self.customers[0]
+        for name in ("customer_detail", "profile_update"):
+            with self.subTest(name=name):
+                self.assertConstantQueries(
+                    lambda: reverse(f"adminportal:{name}", args=[customer.pk]),
+                    lambda size: self.grow_customer(customer, size),
+                )
+
+    def test_create_customer(self):
+        response = self.client.post(
+            reverse("adminportal:customer_create"),
+            {"username": "newcustomer", "email": "new@example.com", "full_name": "New Customer", "password1": "Sup3r-secret!", "password2": "Sup3r-secret!"},
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_create_bill(self):
+        self.seed(1)
+        response = self.client.post(
+            reverse("adminportal:bill_create"),
+            {"user": self.customers[0].pk, "title": "Hostel", "bill_type": "fees", "amount": "1200.00", "due_date": "2030-01-31"},
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_create_subscription(self):
+        self.seed(1)
+        response = self.client.post(
+            reverse("adminportal:subscription_create"),
+            {"user": self.customers[0].pk, "name": "Gym", "bill_type": "fees", "amount": "30.00", "next_renewal_date": "2030-01-31"},
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_update_profile(self):
+        self.seed(1)
+        response = self.client.post(
+            reverse("adminportal:profile_update", args=[self.customers[0].pk]),
+            {"full_name": "Customer Zero", "phone": "555-0100", "address": "1 Main St"},
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_subscription_toggle(self):
+        self.seed(1)
+        subscription = self.customers[0].subscriptions.get()
+        response = self.client.post(reverse("adminportal:subscription_toggle", args=[subscription.pk]))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(QUERY_BUDGET_CHECKS=True, QUERY_BUDGET_STRICT=True, STORAGES=STORAGES)
+class BulkAssignTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("staff", password="secret", is_staff=True)
+        cls.customers = []
+        for number in range(3):
+            customer = User.objects.create_user(f"customer{number}", password="secret")
+            add_billing_history(customer, number, paid_by=cls.admin)
+            cls.customers.append(customer)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def bulk_assign(self, segment, **data):
+        data = {"title": "Exam fee", "bill_type": "fees", "amount": "75.00", "due_date": "2030-01-31", "segment": segment, **data}
+        data.setdefault("batch", uuid.uuid4())
+        return self.client.post(reverse("adminportal:bulk_bill_create"), data)
+
+    def run_queued_jobs(self):
+        Job.objects.filter(status=Job.STATUS_QUEUED).exclude(name="assign_bills").delete()
+        while job := claim_next_job():
+            with self.captureOnCommitCallbacks(execute=True):
+                run_job(job)
+
+    def test_bulk_assign_uploaded_ids(self):
+        first, second, third = self.customers
+        batch = uuid.uuid4()
+        for _ in range(2):
+            upload = SimpleUploadedFile("ids.csv", f"{first.pk},\n{third.pk}\n".encode())
+            response = self.bulk_assign("ids", customer_ids=upload, batch=batch)
+            self.assertRedirects(response, reverse("adminportal:job_list"))
+        self.assertEqual(Job.objects.filter(name="assign_bills").count(), 1)
+
+        self.run_queued_jobs()
+
+        job = Job.objects.get(name="assign_bills")
+        self.assertEqual((job.status, job.progress_done, job.progress_total), (Job.STATUS_SUCCEEDED, 2, 2))
+        self.assertEqual(set(Bill.objects.filter(batch=batch).values_list("user_id", flat=True)), {first.pk, third.pk})
+        bill = Bill.objects.get(batch=batch, user=first)
+        self.assertEqual((bill.title, bill.amount, bill.created_by), ("Exam fee", 75, self.admin))
+
+        # Re-running the batch over everyone only bills the customer it missed.
+        totals = assign_bills(segment_customers("all"), job.payload["bill"], batch, chunk_size=2)
+        self.assertEqual(totals, {"customers": 3, "created": 1, "skipped": 2})
+        self.assertTrue(Bill.objects.filter(batch=batch, user=second).exists())
+
+    def test_bulk_assign_subscribers(self):
+        self.customers[1].subscriptions.update(active=False)
+        self.customers[2].subscriptions.update(bill_type="electricity")
+
+        self.bulk_assign("subscribers", subscription_type="subscription")
+        self.run_queued_jobs()
+
+        self.assertEqual(list(Bill.objects.filter(title="Exam fee").values_list("user_id", flat=True)), [self.customers[0].pk])
+
+    def test_bulk_assign_rejects_unknown_ids(self):
+        upload = SimpleUploadedFile("ids.txt", f"{self.admin.pk}\n".encode())
+
+        response = self.bulk_assign("ids", customer_ids=upload)
+
+        self.assertContains(response, "do not belong to customers")
+        self.assertFalse(Job.objects.exists())
+
+    def test_a_batch_is_queued_once(self):
+        enqueue("assign_bills", {"batch": "b1"}, dedupe_key="assign_bills:b1")
+
+        with self.assertRaises(DuplicateJob):
+            enqueue("assign_bills", {"batch": "b1"}, dedupe_key="assign_bills:b1")
+        enqueue("assign_bills", {"batch": "b2"}, dedupe_key="assign_bills:b2")
+
+        self.assertEqual(Job.objects.filter(name="assign_bills").count(), 2)
+
+
+@override_settings(QUERY_BUDGET_CHECKS=True, QUERY_BUDGET_STRICT=True, STORAGES=STORAGES)
+class CustomerPickerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("staff", password="secret", is_staff=True)
+        cls.customers = [User.objects.create_user(name, password="secret") for name in ("zoe", "zora.quill", "adam", "bezo")]
+        for number in range(20):
+            User.objects.create_user(f"customer{number}", password="secret")
+        Profile.objects.filter(user=cls.customers[1]).update(full_name="Zora Quill")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def autocomplete(self, query):
+        return self.client.get(reverse("adminportal:customer_autocomplete"), {"q": query}).json()["results"]
+
+    def test_customer_picker_does_not_list_customers(self):
+        customer = self.customers[2]
+
+        response = self.client.get(reverse("adminportal:bill_create"), {"user": customer.pk})
+
+        self.assertContains(response, f'value="{customer.pk}"')
+        self.assertContains(response, 'data-autocomplete-min-length="2"')
+        self.assertContains(response, "js/customer-autocomplete.js")
+        self.assertNotContains(response, "<option value=\"%s\"" % self.customers[0].pk)
+        self.assertNotContains(response, "customer0<")
+
+    def test_customer_autocomplete_matches_username_prefixes(self):
+        results = self.autocomplete("zo")
+
+        self.assertEqual(
+            sorted(results, key=lambda result: result["id"]),
+            [{"id": self.customers[0].pk, "label": "zoe"}, {"id": self.customers[1].pk, "label": "Zora Quill (zora.quill)"}],
+        )
+        self.assertEqual(self.autocomplete("z"), [])
+        self.assertEqual(self.autocomplete(""), [])
+        self.assertEqual(self.autocomplete("staff"), [])
+
+
+class LiveDashboardTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user("customer", password="secret")
+        self.bill = Bill.objects.create(user=self.customer, title="Power", amount=80, due_date=timezone.now().date())
+
+    def test_unchanged_marks_send_nothing(self):
+        marks = high_water_marks()
+
+        self.assertEqual(dashboard_changes(*marks), (marks, None))
+
+    def test_settlement_is_sent_after_the_pending_row(self):
+        marks = high_water_marks()
+        payment = start_payment(self.bill, gateway=SimulatedGateway())
+        marks, delta = dashboard_changes(*marks)
+        self.assertEqual([row["status"] for row in delta["transactions"]], [Transaction.STATUS_PENDING])
+
+        settle(payment.pk, succeeded=True)
+        marks, delta = dashboard_changes(*marks)
+
+        self.assertEqual(marks[:2], (self.bill.pk, payment.pk))
+        self.assertEqual([(row["id"], row["status"]) for row in delta["transactions"]], [(payment.pk, Transaction.STATUS_SUCCESS)])
+        self.assertEqual(delta["bills"], [])
+        self.assertEqual(delta["kpis"]["total_paid"], "80.00")
+        self.assertEqual(delta["kpis"]["pending_bills_count"], 0)
+        self.assertIsNone(dashboard_changes(*marks)[1])
+
+    def test_stream_polls_under_wsgi(self):
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        since = format_mark(*high_water_marks())
+        bill = Bill.objects.create(user=self.customer, title="Water", amount=20, due_date=timezone.now().date())
+
+        response = self.client.get(reverse("adminportal:dashboard_stream"), {"since": since})
+        quiet = self.client.get(reverse("adminportal:dashboard_stream"), HTTP_LAST_EVENT_ID=format_mark(*high_water_marks()))
+
+        self.assertFalse(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = response.content.decode()
+        self.assertTrue(body.startswith("retry: 15000\n\n"))
+        self.assertIn(f"id: {format_mark(*high_water_marks())}\nevent: delta\n", body)
+        self.assertIn(f'"id":{bill.pk}', body)
+        self.assertEqual(quiet.content.decode(), f"retry: 15000\n\nid: {format_mark(*high_water_marks())}\n\n")
+
+    @override_settings(DASHBOARD_STREAM_MAX_SECONDS=0)
+    async def test_stream_is_held_open_under_asgi(self):
+        staff = await User.objects.acreate(username="staff", is_staff=True)
+        await self.async_client.aforce_login(staff)
+
+        response = await self.async_client.get(reverse("adminportal:dashboard_stream"))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join([chunk async for chunk in response.streaming_content]), b"retry: 2000\n\n")
+
+    def test_parse_mark(self):
+        self.assertEqual(parse_mark(format_mark(3, 4, 1700000000000000)), (3, 4, 1700000000000000))
+        # Ids from before the settlement mark existed make the stream start afresh.
+        self.assertIsNone(parse_mark("3-4"))
+        self.assertIsNone(parse_mark("3--4-5"))
+        self.assertIsNone(parse_mark(None))
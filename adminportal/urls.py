@@ -8,11 +8,18 @@ app_name = "adminportal"
 
 urlpatterns = [
     path("dashboard/", views.dashboard, name="dashboard"),
+    path("dashboard/stream/", views.dashboard_stream, name="dashboard_stream"),
     path("customers/", views.customer_list, name="customer_list"),
+    path("search/", views.search, name="search"),
     path("customers/new/", views.customer_create, name="customer_create"),
+    path("customers/autocomplete/", views.customer_autocomplete, name="customer_autocomplete"),
     path("customers/<int:user_id>/", views.customer_detail, name="customer_detail"),
     path("customers/<int:user_id>/profile/", views.profile_update, name="profile_update"),
     path("bills/new/", views.bill_create, name="bill_create"),
+    path("bills/bulk/", views.bulk_bill_create, name="bulk_bill_create"),
     path("subscriptions/new/", views.subscription_create, name="subscription_create"),
     path("subscriptions/<int:subscription_id>/toggle/", views.subscription_toggle, name="subscription_toggle"),
+    path("jobs/", views.job_list, name="job_list"),
+    path("profiles/", views.profile_list, name="profile_list"),
+    path("profiles/<str:profile_id>/", views.profile_download, name="profile_download"),
 ]
\ No newline at end of file
@@ -1,20 +1,45 @@
 from __future__ import annotations
 
+import asyncio
+import time
 from functools import wraps
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Count, Q, Sum
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 
-from billingapp.forms import BillForm, ProfileForm, SubscriptionForm, UserCreationWithProfileForm
-from billingapp.models import Bill, Profile, Subscription, Transaction
+from billingapp.bulkbills import bill_template
+from billingapp.events import record
+from billingapp.forms import (
+    BillForm,
+    BulkBillForm,
+    ProfileForm,
+    SubscriptionForm,
+    UserCreationWithProfileForm,
+    customer_label,
+)
+from billingapp.jobs import DuplicateJob, enqueue
+from billingapp.models import Bill, BillingEvent, Job, Profile, Subscription, Transaction
+from billingapp.search import autocomplete_customers, search_bills, search_customers
+from billingapp.tenancy import scoped_customers, use_organization
 from billingapp.utils import ensure_subscription_bills
+from billingplatform.profiling import profile_path, profile_summary, recent_profiles
+from billingplatform.querybudget import query_budget
+
+from .live import dashboard_changes, dashboard_kpis, format_mark, high_water_marks, kpi_snapshot, parse_mark, sse_message
 
 
 User = get_user_model()
 
+AUTOCOMPLETE_LIMIT = 10
+
 
 def admin_required(view_func):
     @wraps(view_func)
@@ -30,50 +55,124 @@ def admin_required(view_func):
     return _wrapped
 
 
+@query_budget(16)
 @admin_required
 def dashboard(request):
     ensure_subscription_bills()
 
-    total_customers = User.objects.filter(is_staff=False).count()
-    pending_bills_count = Bill.objects.filter(status=Bill.STATUS_UNPAID).count()
-    total_outstanding = Bill.objects.filter(status=Bill.STATUS_UNPAID).aggregate(total=Sum("amount"))["total"] or 0
-    total_paid = Transaction.objects.aggregate(total=Sum("amount"))["total"] or 0
+    stream_mark = format_mark(*high_water_marks())
+    kpis = dashboard_kpis()
 
     recent_bills = (
-        Bill.objects.select_related("user")
+        Bill.scoped.select_related("user")
         .order_by("-created_at")[:6]
     )
 
-    recent_transactions = Transaction.objects.select_related("bill", "user").all()[:10]
+    recent_transactions = Transaction.scoped.select_related("user").all()[:10]
     open_bills = (
-        Bill.objects.filter(status=Bill.STATUS_UNPAID)
+        Bill.scoped.filter(status=Bill.STATUS_UNPAID)
         .select_related("user")
         .order_by("due_date")[:10]
     )
 
-    subscription_stats = (
-        Subscription.objects.values("active")
-        .annotate(total=Count("id"))
-        .order_by("-active")
-    )
-    
     context = {
-        "total_customers": total_customers,
-        "pending_bills_count": pending_bills_count,
-        "total_outstanding": total_outstanding,
-        "total_paid": total_paid,
+        **kpis,
         "recent_bills": recent_bills,
         "recent_transactions": recent_transactions,
         "open_bills": open_bills,
-        "subscription_stats": subscription_stats,
+        "stream_mark": stream_mark,
     }
     return render(request, "admin/dashboard.html", context)
 
 
+@query_budget(13)
+async def dashboard_stream(request):
+    """Server-sent events with dashboard deltas; the dashboard patches itself from these.
+
+    Serve the project through ASGI so each open stream costs a coroutine
+    rather than a worker thread. Streams end after
+    ``DASHBOARD_STREAM_MAX_SECONDS`` and the browser reconnects, resuming
+    from ``Last-Event-ID``.
+
+    Under WSGI (including ``runserver``) a stream would be buffered and hold
+    a worker thread for its whole life, so the view answers at once with any
+    changes and tells the browser to reconnect after
+    ``DASHBOARD_POLL_SECONDS``: ``EventSource`` then polls.
+    """
+
+    user = await request.auser()
+    if not user.is_authenticated or not user.is_staff:
+        return HttpResponseForbidden()
+
+    organization = getattr(request, "organization", None)
+    marks = parse_mark(request.headers.get("Last-Event-ID") or request.GET.get("since"))
+    if marks is None:
+        marks = await _in_organization(organization, high_water_marks)
+
+    if not isinstance(request, ASGIRequest):
+        response = HttpResponse(await _dashboard_poll(organization, marks), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    response = StreamingHttpResponse(_dashboard_events(organization, marks), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _in_organization(organization, func, *args):
+    # The stream outlives TenantMiddleware, so each query re-enters the tenant.
+    def call():
+        with use_organization(organization):
+            return func(*args)
+
+    return await sync_to_async(call)()
+
+
+async def _dashboard_poll(organization, marks) -> str:
+    new_marks, delta = await _in_organization(organization, dashboard_changes, *marks)
+    message = f"retry: {int(settings.DASHBOARD_POLL_SECONDS * 1000)}\n\n"
+    if delta is not None:
+        return message + sse_message("delta", delta, format_mark(*new_marks))
+    # An id-only message still moves the browser's Last-Event-ID forward.
+    return message + f"id: {format_mark(*new_marks)}\n\n"
+
+
+async def _dashboard_events(organization, marks):
+    poll_seconds = settings.DASHBOARD_STREAM_POLL_SECONDS
+    started = last_sent = time.monotonic()
+    next_kpi_check = started + settings.DASHBOARD_STREAM_KPI_SECONDS
+    kpis = None
+
+    yield f"retry: {int(poll_seconds * 1000)}\n\n"
+    while time.monotonic() - started < settings.DASHBOARD_STREAM_MAX_SECONDS:
+        marks, delta = await _in_organization(organization, dashboard_changes, *marks)
+        now = time.monotonic()
+        if delta is not None:
+            kpis = delta["kpis"]
+            next_kpi_check = now + settings.DASHBOARD_STREAM_KPI_SECONDS
+            last_sent = now
+            yield sse_message("delta", delta, format_mark(*marks))
+        elif now >= next_kpi_check:
+            # Customers and subscriptions change without new bills; refresh the
+            # figures occasionally and send them only when they moved.
+            next_kpi_check = now + settings.DASHBOARD_STREAM_KPI_SECONDS
+            latest = await _in_organization(organization, kpi_snapshot)
+            if latest != kpis:
+                kpis = latest
+                last_sent = now
+                yield sse_message("kpis", kpis, format_mark(*marks))
+        if now - last_sent >= 15:
+            last_sent = now
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(poll_seconds)
+
+
+@query_budget(4)
 @admin_required
 def customer_list(request):
     customers = (
-        User.objects.filter(is_staff=False)
+        scoped_customers()
         .select_related("profile")
         .annotate(
             unpaid_bills=Count("bills", filter=Q(bills__status=Bill.STATUS_UNPAID)),
@@ -83,6 +182,28 @@ def customer_list(request):
     return render(request, "admin/customer_list.html", {"customers": customers})
 
 
+@query_budget(6)
+@admin_required
+def search(request):
+    query = request.GET.get("q", "").strip()
+    context = {
+        "query": query,
+        "customers": search_customers(query) if query else [],
+        "bills": search_bills(query) if query else [],
+    }
+    return render(request, "admin/search.html", context)
+
+
+@query_budget(5)
+@admin_required
+def customer_autocomplete(request):
+    """Customers matching ``?q=`` for the customer picker on admin forms."""
+
+    customers = autocomplete_customers(request.GET.get("q", ""), limit=AUTOCOMPLETE_LIMIT)
+    return JsonResponse({"results": [{"id": customer.pk, "label": customer_label(customer)} for customer in customers]})
+
+
+@query_budget(8)
 @admin_required
 def customer_create(request):
     if request.method == "POST":
@@ -97,24 +218,28 @@ def customer_create(request):
     return render(request, "admin/customer_form.html", {"form": form})
 
 
+@query_budget(11)
 @admin_required
 def customer_detail(request, user_id):
-    customer = get_object_or_404(User.objects.select_related("profile"), pk=user_id, is_staff=False)
+    customer = get_object_or_404(scoped_customers().select_related("profile"), pk=user_id)
     ensure_subscription_bills(customer)
 
     bills = customer.bills.select_related("subscription").order_by("status", "due_date")
     subscriptions = customer.subscriptions.all()
-    transactions = customer.transactions.select_related("bill")[:20]
+    transactions = customer.transactions.all()[:20]
+    events = BillingEvent.objects.for_customer(customer).select_related("bill", "subscription", "actor")[:20]
 
     context = {
         "customer": customer,
         "bills": bills,
         "subscriptions": subscriptions,
         "transactions": transactions,
+        "events": events,
     }
     return render(request, "admin/customer_detail.html", context)
 
 
+@query_budget(7)
 @admin_required
 def bill_create(request):
     if request.method == "POST":
@@ -126,12 +251,43 @@ def bill_create(request):
             messages.success(request, f"Bill '{bill.title}' assigned to {bill.user.username}.")
             return redirect("adminportal:customer_list")
     else:
-        form = BillForm()
+        form = BillForm(initial={"user": request.GET.get("user")})
 
-    form.fields["user"].queryset = User.objects.filter(is_staff=False)
     return render(request, "admin/bill_form.html", {"form": form})
 
 
+@query_budget(8)
+@admin_required
+def bulk_bill_create(request):
+    if request.method == "POST":
+        form = BulkBillForm(request.POST, request.FILES)
+        if form.is_valid():
+            batch = str(form.cleaned_data["batch"])
+            try:
+                enqueue(
+                    "assign_bills",
+                    {
+                        "batch": batch,
+                        "bill": bill_template(form.cleaned_data),
+                        "segment": form.cleaned_data["segment"],
+                        "subscription_type": form.cleaned_data["subscription_type"],
+                        "customer_ids": form.cleaned_data["customer_ids"],
+                    },
+                    created_by=request.user,
+                    dedupe_key=f"assign_bills:{batch}",
+                )
+            except DuplicateJob:
+                messages.info(request, "This bulk assignment is already queued.")
+                return redirect("adminportal:job_list")
+            messages.success(request, f"Bulk assignment of '{form.cleaned_data['title']}' queued.")
+            return redirect("adminportal:job_list")
+    else:
+        form = BulkBillForm()
+
+    return render(request, "admin/bulk_bill_form.html", {"form": form})
+
+
+@query_budget(8)
 @admin_required
 def subscription_create(request):
     if request.method == "POST":
@@ -140,31 +296,40 @@ def subscription_create(request):
             subscription = form.save(commit=False)
             subscription.created_by_role = Subscription.ROLE_ADMIN
             subscription.save()
-            ensure_subscription_bills(subscription.user)
-            messages.success(request, f"Subscription '{subscription.name}' created.")
+            enqueue("ensure_subscription_bills", {"user_id": subscription.user_id}, created_by=request.user)
+            messages.success(request, f"Subscription '{subscription.name}' created. Bill generation has been queued.")
             return redirect("adminportal:customer_list")
     else:
         form = SubscriptionForm()
 
-    form.fields["user"].queryset = User.objects.filter(is_staff=False)
     return render(request, "admin/subscription_form.html", {"form": form})
 
 
+@query_budget(7)
 @admin_required
 def subscription_toggle(request, subscription_id):
-    subscription = get_object_or_404(Subscription, pk=subscription_id)
-    subscription.active = not subscription.active
-    if subscription.active:
-        subscription.next_renewal_date = max(subscription.next_renewal_date, timezone.now().date())
-    subscription.save(update_fields=["active", "next_renewal_date", "updated_at"])
+    # The change and its billing event commit together.
+    with transaction.atomic():
+        subscription = get_object_or_404(Subscription.scoped.select_for_update(), pk=subscription_id)
+        subscription.active = not subscription.active
+        if subscription.active:
+            subscription.next_renewal_date = max(subscription.next_renewal_date, timezone.now().date())
+        subscription.save(update_fields=["active", "next_renewal_date", "updated_at"])
+        record(
+            BillingEvent.KIND_SUBSCRIPTION_RESUMED if subscription.active else BillingEvent.KIND_SUBSCRIPTION_PAUSED,
+            user=subscription.user_id,
+            subscription=subscription,
+            actor=request.user,
+        )
     status = "activated" if subscription.active else "paused"
     messages.info(request, f"Subscription '{subscription.name}' {status}.")
     return redirect("adminportal:customer_detail", user_id=subscription.user_id)
 
 
+@query_budget(5)
 @admin_required
 def profile_update(request, user_id):
-    customer = get_object_or_404(User.objects.select_related("profile"), pk=user_id, is_staff=False)
+    customer = get_object_or_404(scoped_customers().select_related("profile"), pk=user_id)
     profile = customer.profile
 
     if request.method == "POST":
@@ -177,3 +342,36 @@ def profile_update(request, user_id):
         form = ProfileForm(instance=profile)
 
     return render(request, "admin/profile_form.html", {"form": form, "customer": customer})
+
+
+@query_budget(4)
+@admin_required
+def job_list(request):
+    jobs = Job.scoped.select_related("created_by")[:50]
+    has_pending = any(not job.is_finished for job in jobs)
+    return render(request, "admin/job_list.html", {"jobs": jobs, "has_pending": has_pending})
+
+
+def _profile_organization(request):
+    """The organization whose profiles the user may see; ``None`` shows every profile."""
+
+    return None if request.user.is_superuser else request.organization
+
+
+@query_budget(3)
+@admin_required
+def profile_list(request):
+    profiles = recent_profiles(organization=_profile_organization(request))
+    return render(request, "admin/profile_list.html", {"profiles": profiles})
+
+
+@query_budget(3)
+@admin_required
+def profile_download(request, profile_id):
+    try:
+        path = profile_path(profile_id)
+    except ValueError:
+        raise Http404("No such profile.")
+    if profile_summary(profile_id, _profile_organization(request)) is None or not path.is_file():
+        raise Http404("No such profile.")
+    return FileResponse(path.open("rb"), content_type="text/plain; charset=utf-8", as_attachment=True)
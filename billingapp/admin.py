@@ -1,33 +1,166 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils import timezone
 
-from .models import Bill, Profile, Subscription, Transaction
+from .models import (
+    Bill,
+    BillingEvent,
+    BillReminder,
+    Job,
+    Organization,
+    OutboxMessage,
+    Profile,
+    Subscription,
+    Transaction,
+)
+from .pagination import EstimatedCountPaginator
+from .search import bill_id_filter, customer_id_filter, subscription_id_filter
+
+
+class IndexedSearchMixin:
+    """Serve changelist and autocomplete searches from the indexes in ``billingapp.search``.
+
+    ``search_fields`` stays declared so Django renders the search box and
+    allows autocomplete lookups against this admin.
+    """
+
+    def indexed_search_filter(self, search_term):
+        raise NotImplementedError
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(self.indexed_search_filter(search_term)), False
+
+
+class LargeTableAdminMixin:
+    """Changelist settings for tables that grow without bound.
+
+    Totals come from planner estimates instead of ``COUNT(*)``, and the
+    unfiltered "N total" count is skipped entirely.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Organization)
+class OrganizationAdmin(admin.ModelAdmin):
+    list_display = ("name", "slug", "domain", "database")
+    search_fields = ("name", "slug", "domain")
+    prepopulated_fields = {"slug": ("name",)}
 
 
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
-    list_display = ("user", "full_name", "phone")
+class ProfileAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ("user", "full_name", "phone", "organization")
+    list_filter = ("organization",)
+    list_select_related = ("user", "organization")
     search_fields = ("user__username", "full_name", "phone")
 
+    def indexed_search_filter(self, search_term):
+        return customer_id_filter(search_term)
+
 
 @admin.register(Bill)
-class BillAdmin(admin.ModelAdmin):
+class BillAdmin(LargeTableAdminMixin, IndexedSearchMixin, admin.ModelAdmin):
     list_display = ("title", "user", "amount", "due_date", "status")
-    list_filter = ("status", "bill_type")
+    list_filter = ("status", "bill_type", "organization")
+    list_select_related = ("user",)
+    date_hierarchy = "due_date"
     search_fields = ("title", "user__username", "bill_type")
     autocomplete_fields = ("user", "subscription", "created_by")
+    actions = ("mark_selected_paid",)
+
+    @admin.action(description="Mark selected bills as paid")
+    def mark_selected_paid(self, request, queryset):
+        paid = queryset.mark_paid(paid_by=request.user)
+        self.message_user(request, f"{paid} bill(s) marked as paid.", messages.SUCCESS)
+
+    def indexed_search_filter(self, search_term):
+        return bill_id_filter(search_term) | customer_id_filter(search_term)
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(LargeTableAdminMixin, IndexedSearchMixin, admin.ModelAdmin):
     list_display = ("name", "user", "amount", "next_renewal_date", "active")
-    list_filter = ("active", "created_by_role")
+    list_filter = ("active", "created_by_role", "organization")
+    list_select_related = ("user",)
+    date_hierarchy = "next_renewal_date"
     search_fields = ("name", "user__username")
     autocomplete_fields = ("user",)
+    actions = ("pause_selected", "resume_selected")
+
+    @admin.action(description="Pause selected subscriptions")
+    def pause_selected(self, request, queryset):
+        paused = queryset.set_active(False, actor=request.user)
+        self.message_user(request, f"{paused} subscription(s) paused.", messages.SUCCESS)
+
+    @admin.action(description="Resume selected subscriptions")
+    def resume_selected(self, request, queryset):
+        resumed = queryset.set_active(True, actor=request.user)
+        self.message_user(request, f"{resumed} subscription(s) resumed.", messages.SUCCESS)
+
+    def indexed_search_filter(self, search_term):
+        return subscription_id_filter(search_term) | customer_id_filter(search_term)
 
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
-    list_display = ("bill", "user", "amount", "payment_date", "method", "status")
-    list_filter = ("status", "method")
-    search_fields = ("bill__title", "user__username", "method")
+class TransactionAdmin(LargeTableAdminMixin, IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ("bill_title", "user", "amount", "payment_date", "method", "status")
+    list_filter = ("status", "method", "organization")
+    list_select_related = ("user",)
+    date_hierarchy = "payment_date"
+    search_fields = ("bill_title", "user__username", "method")
     autocomplete_fields = ("bill", "user", "processed_by")
+    readonly_fields = ("bill_title", "bill_type", "bill_due_date")
+
+    def indexed_search_filter(self, search_term):
+        return bill_id_filter(search_term, field="bill_id") | customer_id_filter(search_term)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "run_after", "created_at", "finished_at")
+    list_filter = ("status", "name")
+    readonly_fields = ("attempts", "started_at", "finished_at", "result", "last_error")
+
+
+@admin.register(BillReminder)
+class BillReminderAdmin(admin.ModelAdmin):
+    list_display = ("bill", "kind", "sent_at")
+    list_filter = ("kind",)
+    list_select_related = ("bill__user",)
+    autocomplete_fields = ("bill",)
+
+
+@admin.register(BillingEvent)
+class BillingEventAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("created_at", "kind", "user", "bill", "subscription", "amount", "actor")
+    list_filter = ("kind",)
+    list_select_related = ("user", "bill__user", "subscription__user", "actor")
+    date_hierarchy = "created_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ("created_at", "endpoint", "kind", "customer_id", "status", "attempts", "next_attempt_at")
+    list_filter = ("status", "endpoint", "kind")
+    readonly_fields = ("event_id", "payload", "attempts", "last_error", "created_at", "delivered_at")
+    actions = ("retry_selected",)
+
+    @admin.action(description="Retry selected failed messages")
+    def retry_selected(self, request, queryset):
+        retried = queryset.filter(status=OutboxMessage.STATUS_FAILED).update(
+            status=OutboxMessage.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{retried} message(s) queued for delivery.", messages.SUCCESS)
@@ -1,7 +1,12 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class BillingappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'billingapp'
     verbose_name = 'Billing'
+
+    def ready(self):
+        # Register background job handlers declared in each app's tasks module.
+        autodiscover_modules("tasks")
@@ -0,0 +1,115 @@
+"""Assign one bill to a whole segment of customers.
+
+The admin portal queues an ``assign_bills`` job with a bill template and a
+segment; the job walks the segment in primary-key chunks and creates each
+chunk's bills with one ``bulk_create``, reporting progress on the job.
+
+Every assignment carries a ``batch`` UUID that is stored on its bills, and a
+customer gets at most one bill per batch (``unique_bill_per_batch``). A job
+that is retried after failing part-way therefore only bills the customers
+that were not billed yet. The job is queued with the batch as its
+``dedupe_key``, so a form submitted twice queues one job.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .events import buffered_events, record
+from .models import Bill, BillingEvent, Profile, Subscription
+from .money import Money
+from .outbox import batched_outbox
+from .tenancy import get_current_organization, scoped_customers
+
+
+SEGMENT_ALL = "all"
+SEGMENT_SUBSCRIBERS = "subscribers"
+SEGMENT_IDS = "ids"
+SEGMENT_CHOICES = (
+    (SEGMENT_ALL, "All customers"),
+    (SEGMENT_SUBSCRIBERS, "Customers with active subscriptions"),
+    (SEGMENT_IDS, "Uploaded list of customer IDs"),
+)
+
+def segment_customers(segment: str, subscription_type: str = "", customer_ids=None):
+    """Customers of the current organization in ``segment``."""
+
+    customers = scoped_customers()
+    if segment == SEGMENT_SUBSCRIBERS:
+        subscriptions = Subscription.objects.filter(user=OuterRef("pk"), active=True)
+        if subscription_type:
+            subscriptions = subscriptions.filter(bill_type=subscription_type)
+        return customers.filter(Exists(subscriptions))
+    if segment == SEGMENT_IDS:
+        return customers.filter(pk__in=customer_ids or [])
+    return customers
+
+
+def bill_template(cleaned_data: dict) -> dict:
+    """The JSON-safe bill fields a job payload carries."""
+
+    return {
+        "title": cleaned_data["title"],
+        "bill_type": cleaned_data["bill_type"],
+        "description": cleaned_data.get("description", ""),
+        "amount": str(cleaned_data["amount"]),
+        "due_date": cleaned_data["due_date"].isoformat(),
+    }
+
+
+def assign_bills(customers, template: dict, batch, created_by=None, chunk_size: int = 1000, progress=None) -> dict:
+    """Bill every customer in ``customers`` once for ``batch``.
+
+    ``progress(done, total)`` is called after each chunk. Returns
+    ``{"customers": ..., "created": ..., "skipped": ...}``; ``skipped`` counts
+    customers who already had this batch's bill.
+    """
+
+    fields = {
+        **template,
+        "amount": Money(template["amount"]),
+        "due_date": date.fromisoformat(str(template["due_date"])),
+    }
+    created_by_id = getattr(created_by, "pk", created_by)
+    organization = get_current_organization()
+    total = customers.count()
+    totals = {"customers": 0, "created": 0, "skipped": 0}
+    if progress is not None:
+        progress(0, total)
+
+    last_pk = 0
+    while True:
+        ids = list(customers.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            break
+        with buffered_events(), transaction.atomic(), batched_outbox():
+            billed = set(Bill.objects.filter(batch=batch, user_id__in=ids).values_list("user_id", flat=True))
+            if organization is not None:
+                organizations = dict.fromkeys(ids, organization.pk)
+            else:
+                organizations = dict(Profile.objects.filter(user_id__in=ids).values_list("user_id", "organization_id"))
+            # bulk_create skips the signals that stamp the organization and log new bills.
+            bills = Bill.objects.bulk_create(
+                Bill(user_id=pk, organization_id=organizations.get(pk), batch=batch, created_by_id=created_by_id, **fields)
+                for pk in ids
+                if pk not in billed
+            )
+            for bill in bills:
+                record(
+                    BillingEvent.KIND_BILL_CREATED,
+                    user=bill.user_id,
+                    bill=bill.pk,
+                    actor=created_by_id,
+                    amount=bill.amount,
+                    due_date=str(bill.due_date),
+                )
+        totals["customers"] += len(ids)
+        totals["created"] += len(bills)
+        totals["skipped"] += len(billed)
+        last_pk = ids[-1]
+        if progress is not None:
+            progress(totals["customers"], total)
+    return totals
@@ -0,0 +1,105 @@
+"""Per-user HTTP validators for customer portal pages."""
+
+from __future__ import annotations
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import get_user_model
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Bill, Profile, Subscription, Transaction
+
+User = get_user_model()
+
+
+def _max_updated(model):
+    return Subquery(
+        model.objects.filter(user=OuterRef("pk")).order_by().values("user").annotate(latest=Max("updated_at")).values("latest")[:1]
+    )
+
+
+def _row_count(model):
+    return Subquery(
+        model.objects.filter(user=OuterRef("pk")).order_by().values("user").annotate(total=Count("id")).values("total")[:1],
+        output_field=IntegerField(),
+    )
+
+
+def user_data_version(user) -> dict:
+    """Return the newest ``updated_at`` and row counts across a user's billing data.
+
+    Everything is gathered in a single round trip; each subquery is served by
+    the ``(user, updated_at)`` indexes.
+    """
+
+    return (
+        User.objects.filter(pk=user.pk)
+        .values("pk")
+        .annotate(
+            bill_updated=_max_updated(Bill),
+            subscription_updated=_max_updated(Subscription),
+            transaction_updated=_max_updated(Transaction),
+            profile_updated=_max_updated(Profile),
+            bill_count=_row_count(Bill),
+            subscription_count=_row_count(Subscription),
+            transaction_count=_row_count(Transaction),
+        )
+        .get()
+    )
+
+
+def conditional_page(view_func):
+    """Answer repeat GETs of a per-user page with ``304 Not Modified``.
+
+    The ETag covers the user's billing data, the current date (pages highlight
+    bills that are due soon) and ``PAGE_CACHE_VERSION`` so a deploy that changes
+    templates can invalidate every cached copy. Requests with pending flash
+    messages always render so the message is not swallowed by a 304.
+    """
+
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or not request.user.is_authenticated:
+            return view_func(request, *args, **kwargs)
+        if len(messages.get_messages(request)):
+            return view_func(request, *args, **kwargs)
+
+        version = user_data_version(request.user)
+        timestamps = [
+            value
+            for key, value in version.items()
+            if key.endswith("_updated") and value is not None
+        ]
+        last_modified = max(timestamps) if timestamps else None
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        fingerprint = "|".join(
+            [
+                request.path,
+                str(request.user.pk),
+                timezone.localdate().isoformat(),
+                str(getattr(settings, "PAGE_CACHE_VERSION", "")),
+            ]
+            + [str(version[key]) for key in sorted(version)]
+        )
+        etag = quote_etag(hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest())
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response.headers["ETag"] = etag
+        if timestamp is not None:
+            response.headers["Last-Modified"] = http_date(timestamp)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return _wrapped
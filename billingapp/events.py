@@ -0,0 +1,106 @@
+"""Append-only billing event log with batched writes.
+
+State changes call :func:`record`. Inside :func:`buffered_events` (every web
+request via :class:`BillingEventMiddleware`, every background job, and the
+bulk/renewal code paths) events are collected in memory and written with one
+``bulk_create`` when the block ends, so auditing does not add an INSERT per
+state change. Events join the buffer only once the surrounding transaction
+commits; changes that are rolled back are never logged. Events for webhook
+endpoints go to the transactional outbox (:mod:`billingapp.outbox`).
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.utils import timezone
+
+from .outbox import publish
+
+
+class _Buffer(list):
+    closed = False
+
+
+_buffer: ContextVar[_Buffer | None] = ContextVar("billing_event_buffer", default=None)
+
+
+def _add(buffer: _Buffer, event) -> None:
+    # A transaction that outlives the buffered block commits after the final
+    # flush; write such stragglers directly.
+    if buffer.closed:
+        event.save()
+    else:
+        buffer.append(event)
+
+
+def record(kind: str, *, user, bill=None, subscription=None, actor=None, amount=None, **data) -> None:
+    """Log that ``kind`` happened to ``user``'s bill or subscription."""
+
+    from .models import BillingEvent
+
+    event = BillingEvent(
+        kind=kind,
+        user_id=getattr(user, "pk", user),
+        bill_id=getattr(bill, "pk", bill),
+        subscription_id=getattr(subscription, "pk", subscription),
+        actor_id=getattr(actor, "pk", actor),
+        amount=amount,
+        data=data,
+        created_at=timezone.now(),
+    )
+    # Webhook deliveries are queued now, inside the caller's transaction.
+    publish(event)
+    buffer = _buffer.get()
+    if buffer is None:
+        transaction.on_commit(event.save)
+    else:
+        transaction.on_commit(lambda: _add(buffer, event))
+
+
+def flush() -> int:
+    """Write buffered events now; returns how many were written."""
+
+    from .models import BillingEvent
+
+    buffer = _buffer.get()
+    if not buffer:
+        return 0
+    events, buffer[:] = list(buffer), []
+    BillingEvent.objects.bulk_create(events, batch_size=500)
+    return len(events)
+
+
+@contextmanager
+def buffered_events():
+    """Collect events recorded in the block and write them in bulk at the end.
+
+    Nested blocks share the outermost buffer.
+    """
+
+    if _buffer.get() is not None:
+        yield
+        return
+
+    token = _buffer.set(_Buffer())
+    try:
+        yield
+    finally:
+        try:
+            flush()
+        finally:
+            _buffer.get().closed = True
+            _buffer.reset(token)
+
+
+class BillingEventMiddleware:
+    """Buffer billing events for the duration of each request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered_events():
+            return self.get_response(request)
@@ -1,8 +1,16 @@
+import re
+import uuid
+
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.urls import reverse
+from django.utils.html import format_html
 
+from .bulkbills import SEGMENT_CHOICES, SEGMENT_IDS
 from .models import BILL_TYPE_CHOICES, Bill, Profile, Subscription
+from .search import AUTOCOMPLETE_MIN_LENGTH
+from .tenancy import scoped_customers
 
 User = get_user_model()
 
@@ -20,6 +28,52 @@ class StyledFormMixin:
             widget.attrs["class"] = (existing + " form-control").strip()
 
 
+def customer_label(customer) -> str:
+    full_name = getattr(getattr(customer, "profile", None), "full_name", "")
+    return f"{full_name} ({customer.username})" if full_name else customer.username
+
+
+class CustomerAutocomplete(forms.Widget):
+    """Search-as-you-type customer picker that submits the chosen customer's id.
+
+    Unlike a ``<select>``, it renders no option per customer: only the selected
+    customer is read (by primary key) to show its name, and matches are fetched
+    from ``adminportal:customer_autocomplete`` once the user has typed
+    ``AUTOCOMPLETE_MIN_LENGTH`` characters of a username.
+    """
+
+    url_name = "adminportal:customer_autocomplete"
+
+    class Media:
+        js = ("js/customer-autocomplete.js",)
+
+    def selected_label(self, value) -> str:
+        try:
+            pk = int(value)
+        except (TypeError, ValueError):
+            return ""
+        customer = scoped_customers().select_related("profile").filter(pk=pk).first()
+        return customer_label(customer) if customer else ""
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        return format_html(
+            '<div class="autocomplete" data-autocomplete-url="{}" data-autocomplete-min-length="{}">'
+            '<input type="hidden" name="{}" value="{}">'
+            '<input type="search" id="{}" class="{}" value="{}" placeholder="Start typing a username" '
+            'autocomplete="off" role="combobox" aria-autocomplete="list" aria-expanded="false">'
+            '<ul class="autocomplete-results" role="listbox" hidden></ul>'
+            "</div>",
+            reverse(self.url_name),
+            AUTOCOMPLETE_MIN_LENGTH,
+            name,
+            "" if value is None else value,
+            attrs.get("id", f"id_{name}"),
+            attrs.get("class", ""),
+            self.selected_label(value),
+        )
+
+
 class UserCreationWithProfileForm(StyledFormMixin, UserCreationForm):
     full_name = forms.CharField(max_length=150, required=True)
     phone = forms.CharField(max_length=20, required=False)
@@ -51,10 +105,63 @@ class BillForm(StyledFormMixin, forms.ModelForm):
     class Meta:
         model = Bill
         fields = ["user", "title", "bill_type", "description", "amount", "due_date"]
+        widgets = {"user": CustomerAutocomplete}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["bill_type"].widget = forms.Select(choices=BILL_TYPE_CHOICES)
+        self.fields["user"].queryset = scoped_customers()
+
+
+class BulkBillForm(StyledFormMixin, forms.ModelForm):
+    """A bill template and the segment of customers who receive it."""
+
+    segment = forms.ChoiceField(choices=SEGMENT_CHOICES, widget=forms.RadioSelect, initial=SEGMENT_CHOICES[0][0])
+    subscription_type = forms.ChoiceField(
+        choices=(("", "Any bill type"),) + BILL_TYPE_CHOICES,
+        required=False,
+        help_text="Only customers with an active subscription of this type.",
+    )
+    customer_ids = forms.FileField(required=False, help_text="Customer IDs separated by commas or new lines.")
+    batch = forms.UUIDField(widget=forms.HiddenInput)
+    due_date = forms.DateField(widget=forms.DateInput(attrs={"type": "date"}))
+
+    max_ids_file_size = 5 * 1024 * 1024
+
+    class Meta:
+        model = Bill
+        fields = ["title", "bill_type", "description", "amount", "due_date"]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["bill_type"].widget = forms.Select(choices=BILL_TYPE_CHOICES)
+        # A fresh form gets a new batch; a resubmitted one keeps its own.
+        self.fields["batch"].initial = uuid.uuid4()
+
+    def clean_customer_ids(self):
+        upload = self.cleaned_data.get("customer_ids")
+        if upload is None:
+            return []
+        if upload.size > self.max_ids_file_size:
+            raise forms.ValidationError("The ID list must be smaller than 5 MB.")
+        text = upload.read().decode("utf-8-sig", errors="replace")
+        tokens = [token for token in re.split(r"[\s,;]+", text) if token]
+        invalid = [token for token in tokens if not token.isdigit()]
+        if invalid:
+            raise forms.ValidationError(f"Not a customer ID: {', '.join(invalid[:5])}.")
+        ids = sorted({int(token) for token in tokens})
+        unknown = sorted(set(ids) - set(scoped_customers().filter(pk__in=ids).values_list("pk", flat=True)))
+        if unknown:
+            raise forms.ValidationError(
+                f"{len(unknown)} ID(s) do not belong to customers: {', '.join(map(str, unknown[:10]))}."
+            )
+        return ids
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("segment") == SEGMENT_IDS and not cleaned_data.get("customer_ids"):
+            self.add_error("customer_ids", "Upload the customer IDs to bill.")
+        return cleaned_data
 
 
 class SubscriptionForm(StyledFormMixin, forms.ModelForm):
@@ -63,10 +170,12 @@ class SubscriptionForm(StyledFormMixin, forms.ModelForm):
     class Meta:
         model = Subscription
         fields = ["user", "name", "amount", "bill_type", "next_renewal_date", "notes"]
+        widgets = {"user": CustomerAutocomplete}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["bill_type"].widget = forms.Select(choices=BILL_TYPE_CHOICES)
+        self.fields["user"].queryset = scoped_customers()
 
 
 class SelfSubscriptionForm(StyledFormMixin, forms.ModelForm):
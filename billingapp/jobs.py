@@ -0,0 +1,192 @@
+"""A small database-backed job queue.
+
+Handlers are plain functions registered with :func:`job_handler` in an app's
+``tasks`` module (discovered when the app registry is ready). Views call
+:func:`enqueue` and return immediately; ``manage.py run_worker`` claims queued
+jobs with a conditional UPDATE, so any number of worker processes can share
+the table without a message broker or row locks. While a handler runs, a
+heartbeat thread touches the job's ``updated_at`` every ``HEARTBEAT_SECONDS``,
+so only jobs whose worker died look stale to :func:`requeue_stale_jobs`.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Callable
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import buffered_events
+from .models import Job
+from .tenancy import get_current_organization, use_organization
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+HEARTBEAT_SECONDS = 60
+
+_handlers: dict[str, Callable] = {}
+
+
+def job_handler(name: str):
+    """Register ``func(job, **payload)`` as the handler for jobs called ``name``."""
+
+    def decorator(func):
+        _handlers[name] = func
+        return func
+
+    return decorator
+
+
+class DuplicateJob(Exception):
+    """A job with the same ``dedupe_key`` was already queued."""
+
+
+def enqueue(
+    name: str,
+    payload: dict | None = None,
+    *,
+    created_by=None,
+    max_attempts: int = 3,
+    run_after=None,
+    dedupe_key: str | None = None,
+) -> Job:
+    """Queue a job; with ``dedupe_key``, raise :class:`DuplicateJob` if that key was queued before."""
+
+    if name not in _handlers:
+        raise ValueError(f"No job handler registered for '{name}'.")
+    if created_by is not None and created_by._state.db != router.db_for_write(Job):
+        # Staff of a tenant on its own database cannot be referenced from the job table.
+        created_by = None
+    job = Job(
+        name=name,
+        payload=payload or {},
+        dedupe_key=dedupe_key,
+        created_by=created_by,
+        organization=get_current_organization(),
+        max_attempts=max_attempts,
+        run_after=run_after or timezone.now(),
+    )
+    if dedupe_key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic(using=router.db_for_write(Job)):
+            job.save()
+    except IntegrityError:
+        raise DuplicateJob(dedupe_key) from None
+    return job
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS))
+
+
+def claim_next_job() -> Job | None:
+    """Atomically move the oldest runnable job to ``running`` and return it."""
+
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(status=Job.STATUS_QUEUED, run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            attempts=F("attempts") + 1,
+            started_at=now,
+            updated_at=now,
+        )
+        if claimed:
+            return Job.objects.select_related("organization").get(pk=pk)
+    return None
+
+
+def run_job(job: Job) -> None:
+    handler = _handlers.get(job.name)
+    if handler is None:
+        _finish(job, Job.STATUS_FAILED, error=f"No job handler registered for '{job.name}'.")
+        return
+
+    try:
+        with heartbeat(job), use_organization(job.organization), buffered_events():
+            result = handler(job, **job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            logger.warning("Job %s failed (attempt %s/%s); retrying", job.pk, job.attempts, job.max_attempts)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.STATUS_QUEUED,
+                run_after=timezone.now() + retry_delay(job.attempts),
+                last_error=error,
+                updated_at=timezone.now(),
+            )
+        else:
+            logger.error("Job %s failed permanently after %s attempt(s)", job.pk, job.attempts)
+            _finish(job, Job.STATUS_FAILED, error=error)
+        return
+
+    _finish(job, Job.STATUS_SUCCEEDED, result=result)
+
+
+@contextmanager
+def heartbeat(job: Job):
+    """Touch ``job.updated_at`` every ``HEARTBEAT_SECONDS`` while the block runs."""
+
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(HEARTBEAT_SECONDS):
+                Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING).update(updated_at=timezone.now())
+        except Exception:
+            logger.exception("Heartbeat for job %s failed", job.pk)
+        finally:
+            # The thread opened its own connection.
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f"job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _finish(job: Job, status: str, result=None, error: str = "") -> None:
+    now = timezone.now()
+    fields = {"status": status, "finished_at": now, "updated_at": now, "last_error": error}
+    if result is not None:
+        fields["result"] = result
+    if status == Job.STATUS_SUCCEEDED and job.progress_total:
+        fields["progress_done"] = job.progress_total
+    Job.objects.filter(pk=job.pk).update(**fields)
+
+
+def requeue_stale_jobs(timeout: timedelta) -> tuple[int, int]:
+    """Recover jobs whose worker stopped sending heartbeats (crash, kill -9).
+
+    Jobs with attempts left return to the queue; the rest fail, as they would
+    have had the attempt raised. Returns ``(requeued, failed)``.
+    """
+
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING, updated_at__lt=now - timeout)
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.STATUS_FAILED,
+        last_error="The worker stopped while running this job.",
+        finished_at=now,
+        updated_at=now,
+    )
+    requeued = stale.update(status=Job.STATUS_QUEUED, run_after=now, updated_at=now)
+    return requeued, failed
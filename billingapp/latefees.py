@@ -0,0 +1,201 @@
+"""Late fees on overdue bills.
+
+:func:`apply_late_fees` reads unpaid overdue bills in primary-key chunks into
+NumPy arrays (amount in minor units, days overdue, bill type) and prices each
+chunk in one pass with the rule for every bill's type from ``LATE_FEE_RULES``::
+
+    fee = flat + amount * percent / 100
+          + amount * ((1 + monthly_percent / 100) ** months - 1)
+
+``months`` counts whole 30-day periods overdue beyond ``grace_days``, and
+``cap`` (when set) limits the fee. A bill carries at most one fee bill
+(``Bill.late_fee_for``): it is created with ``bulk_create`` on the first run
+and brought up to date with ``bulk_update`` on later runs while it is unpaid,
+so the fee compounds without stacking. Paid fee bills are never changed.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .events import buffered_events, record
+from .models import BILL_TYPE_OTHER, Bill, BillingEvent
+from .money import MINOR_UNITS, Money
+from .outbox import batched_outbox
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+
+DAYS_PER_MONTH = 30
+
+
+@dataclass(frozen=True)
+class LateFeeRule:
+    grace_days: int = 0
+    flat: Decimal = Decimal("0")
+    percent: float = 0.0
+    monthly_percent: float = 0.0
+    cap: Decimal | None = None
+
+
+def late_fee_rules() -> dict[str, LateFeeRule]:
+    """``LATE_FEE_RULES`` by bill type; ``"default"`` covers the other types."""
+
+    configured = getattr(settings, "LATE_FEE_RULES", {})
+    rules = {"default": LateFeeRule()}
+    for bill_type, options in configured.items():
+        options = dict(options)
+        for key in ("flat", "cap"):
+            if options.get(key) is not None:
+                options[key] = Decimal(str(options[key]))
+        try:
+            rules[bill_type] = LateFeeRule(**options)
+        except TypeError as exc:
+            raise ImproperlyConfigured(f"LATE_FEE_RULES[{bill_type!r}]: {exc}")
+    return rules
+
+
+class RuleTable:
+    """Rule parameters as arrays indexed by rule number, for vectorized lookups."""
+
+    def __init__(self, rules: dict[str, LateFeeRule]):
+        self.names = list(rules)
+        ordered = [rules[name] for name in self.names]
+        self.grace_days = np.array([rule.grace_days for rule in ordered], dtype=np.int64)
+        self.flat = np.array([float(rule.flat) * MINOR_UNITS for rule in ordered])
+        self.percent = np.array([rule.percent / 100 for rule in ordered])
+        self.growth = np.array([1 + rule.monthly_percent / 100 for rule in ordered])
+        self.cap = np.array([np.inf if rule.cap is None else float(rule.cap) * MINOR_UNITS for rule in ordered])
+
+    def index(self, bill_types):
+        """Rule number for each bill type, falling back to ``"default"``."""
+
+        kinds, inverse = np.unique(bill_types, return_inverse=True)
+        default = self.names.index("default")
+        lookup = np.array([self.names.index(kind) if kind in self.names else default for kind in kinds.tolist()])
+        return lookup[inverse]
+
+    def fees(self, amounts, days_overdue, rule):
+        """Fee in minor units for each bill; zero while within the grace period."""
+
+        late_days = days_overdue - self.grace_days[rule]
+        months = np.maximum(late_days, 0) // DAYS_PER_MONTH
+        fee = (
+            self.flat[rule]
+            + amounts * self.percent[rule]
+            + amounts * (np.power(self.growth[rule], months) - 1)
+        )
+        fee = np.minimum(fee, self.cap[rule])
+        return np.where(late_days > 0, np.rint(fee), 0).astype(np.int64)
+
+
+def _overdue_chunk(bills, last_pk: int, chunk_size: int) -> list[tuple]:
+    return list(
+        bills.filter(pk__gt=last_pk)
+        .order_by("pk")
+        .annotate(amount_minor=Cast("amount", models.BigIntegerField()))
+        .values_list("pk", "amount_minor", "due_date", "bill_type", "user_id", "organization_id", "title")[:chunk_size]
+    )
+
+
+def apply_late_fees(
+    today: date | None = None, bills=None, chunk_size: int = 5000, dry_run: bool = False
+) -> dict:
+    """Charge or update late fees for every unpaid overdue bill.
+
+    Returns ``{"bills": scanned, "charged": ..., "created": ..., "updated": ...,
+    "total": Money}``, where ``total`` is the sum of current fees. With
+    ``dry_run`` nothing is written and ``created``/``updated`` count what would be.
+    """
+
+    if np is None:
+        raise ImproperlyConfigured("Late fees need NumPy; install it with `pip install numpy`.")
+
+    today = today or timezone.localdate()
+    table = RuleTable(late_fee_rules())
+    bills = Bill.scoped.all() if bills is None else bills
+    overdue = bills.filter(status=Bill.STATUS_UNPAID, due_date__lt=today, late_fee_for__isnull=True)
+    if not dry_run:
+        overdue = overdue.select_for_update()
+    totals = {"bills": 0, "charged": 0, "created": 0, "updated": 0, "total": 0}
+
+    last_pk = 0
+    while True:
+        with buffered_events(), transaction.atomic(), batched_outbox():
+            rows = _overdue_chunk(overdue, last_pk, chunk_size)
+            if not rows:
+                break
+            pks, amounts, due_dates, bill_types, user_ids, organization_ids, titles = zip(*rows)
+            days_overdue = (np.datetime64(today, "D") - np.array(due_dates, dtype="datetime64[D]")).astype(np.int64)
+            fees = table.fees(np.array(amounts, dtype=np.float64), days_overdue, table.index(np.array(bill_types)))
+
+            charged = np.flatnonzero(fees > 0)
+            totals["bills"] += len(rows)
+            totals["charged"] += len(charged)
+            totals["total"] += int(fees.sum())
+            if len(charged):
+                created, updated = _write_fees(
+                    charged, fees, pks, user_ids, organization_ids, titles, due_dates, today, dry_run
+                )
+                totals["created"] += created
+                totals["updated"] += updated
+        last_pk = rows[-1][0]
+
+    totals["total"] = Money.from_minor(totals["total"])
+    return totals
+
+
+def _write_fees(charged, fees, pks, user_ids, organization_ids, titles, due_dates, today, dry_run):
+    """Create missing fee bills and update unpaid ones whose fee changed."""
+
+    existing = {
+        source: (pk, amount, status)
+        for source, pk, amount, status in Bill.objects.filter(late_fee_for_id__in=[pks[i] for i in charged])
+        .annotate(amount_minor=Cast("amount", models.BigIntegerField()))
+        .values_list("late_fee_for_id", "pk", "amount_minor", "status")
+    }
+    now = timezone.now()
+    new_bills, changed = [], []
+    for i in charged.tolist():
+        fee = int(fees[i])
+        current = existing.get(pks[i])
+        if current is None:
+            new_bills.append(
+                Bill(
+                    user_id=user_ids[i],
+                    organization_id=organization_ids[i],
+                    late_fee_for_id=pks[i],
+                    title=f"Late fee: {titles[i]}"[:150],
+                    description=f"Late fee on bill #{pks[i]} due {due_dates[i]:%Y-%m-%d}.",
+                    amount=Money.from_minor(fee),
+                    due_date=today,
+                    bill_type=BILL_TYPE_OTHER,
+                )
+            )
+        elif current[2] == Bill.STATUS_UNPAID and current[1] != fee:
+            changed.append(Bill(pk=current[0], amount=Money.from_minor(fee), updated_at=now))
+
+    if not dry_run:
+        # bulk_create skips the post_save signal that logs new bills.
+        for bill in Bill.objects.bulk_create(new_bills, batch_size=1000):
+            record(
+                BillingEvent.KIND_BILL_CREATED,
+                user=bill.user_id,
+                bill=bill.pk,
+                amount=bill.amount,
+                due_date=str(bill.due_date),
+                late_fee_for=bill.late_fee_for_id,
+            )
+        Bill.objects.bulk_update(changed, ["amount", "updated_at"], batch_size=1000)
+    return len(new_bills), len(changed)
@@ -0,0 +1,41 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from billingapp.latefees import apply_late_fees
+from billingapp.models import Organization
+from billingapp.tenancy import use_organization
+
+
+class Command(BaseCommand):
+    help = "Charge configurable late fees on unpaid overdue bills."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Overdue bills priced per batch.")
+        parser.add_argument("--organization", help="Only this organization's bills (by slug).")
+        parser.add_argument("--dry-run", action="store_true", help="Preview the fees without writing them.")
+
+    def handle(self, *args, **options):
+        organization = None
+        if options["organization"]:
+            organization = Organization.objects.filter(slug=options["organization"]).first()
+            if organization is None:
+                raise CommandError(f"Unknown organization {options['organization']!r}.")
+
+        started = time.perf_counter()
+        try:
+            with use_organization(organization):
+                totals = apply_late_fees(chunk_size=options["chunk_size"], dry_run=options["dry_run"])
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        created, updated = ("Would create", "update") if options["dry_run"] else ("Created", "updated")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{created} {totals['created']} and {updated} {totals['updated']} fee bill(s); "
+                f"{totals['charged']} of {totals['bills']} overdue bill(s) owe {totals['total']} in late fees. "
+                f"{totals['bills'] / elapsed if elapsed else 0:,.0f} rows/s."
+            )
+        )
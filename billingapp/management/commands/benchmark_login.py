@@ -0,0 +1,97 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+
+BENCHMARK_PASSWORD = "benchmark-Passw0rd!"
+
+
+def _verify_for(encoded: str, seconds: float) -> int:
+    """Verify ``encoded`` repeatedly for ``seconds`` and return the number of checks."""
+
+    django.setup()
+    checks = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        check_password(BENCHMARK_PASSWORD, encoded)
+        checks += 1
+    return checks
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure password verification and full login throughput with the configured hasher and session engine."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each measurement.")
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes for the hash benchmark.")
+        parser.add_argument("--skip-flow", action="store_true", help="Only benchmark password verification.")
+
+    def handle(self, *args, **options):
+        seconds = options["seconds"]
+        processes = max(1, options["processes"])
+
+        hasher = get_hasher()
+        encoded = make_password(BENCHMARK_PASSWORD)
+        self.stdout.write(f"Hasher: {hasher.algorithm} ({hasher.safe_summary(encoded)})")
+        self.stdout.write(f"Session engine: {settings.SESSION_ENGINE}")
+
+        started = time.perf_counter()
+        check_password(BENCHMARK_PASSWORD, encoded)
+        single = time.perf_counter() - started
+        self.stdout.write(f"Single verification: {single * 1000:.1f} ms")
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            totals = list(pool.map(_verify_for, [encoded] * processes, [seconds] * processes))
+        per_core = sum(totals) / seconds / processes
+        self.stdout.write(
+            f"Verification throughput: {per_core:.1f}/s per core, {per_core * processes:.1f}/s on {processes} process(es)"
+        )
+
+        if not options["skip_flow"]:
+            self._benchmark_flow(seconds)
+
+    def _benchmark_flow(self, seconds: float) -> None:
+        """POST the login form end to end; all rows written are rolled back.
+
+        Rate limits are switched off for the run, which would otherwise reject
+        the benchmark after the first few logins.
+        """
+
+        User = get_user_model()
+        username = f"login-benchmark-{os.getpid()}"
+        try:
+            with transaction.atomic(), override_settings(RATE_LIMITS={}):
+                User.objects.create_user(username, password=BENCHMARK_PASSWORD)
+                url = reverse("login")
+                logins = 0
+                deadline = time.perf_counter() + seconds
+                with CaptureQueriesContext(connection) as queries:
+                    while time.perf_counter() < deadline:
+                        response = Client().post(url, {"username": username, "password": BENCHMARK_PASSWORD})
+                        if response.status_code != 302:
+                            self.stderr.write(f"Unexpected login response: {response.status_code}")
+                            break
+                        logins += 1
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if logins:
+            self.stdout.write(
+                f"Login flow: {logins / seconds:.1f} logins/s on one core, "
+                f"{len(queries) / logins:.1f} queries per login"
+            )
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+TABLE = "billingapp_money_benchmark"
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare SUM/AVG/GROUP BY speed for NUMERIC(10,2) amounts versus BIGINT minor units."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Rows in the scratch table.")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per query; the fastest is reported.")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        self.stdout.write(f"Database: {connection.vendor}, {rows:,} rows")
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    self._populate(cursor, rows)
+                    self._report(cursor, options["repeat"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _populate(self, cursor, rows):
+        cursor.execute(f"CREATE TEMPORARY TABLE {TABLE} (user_id INTEGER, major NUMERIC(10, 2), minor BIGINT)")
+        started = time.perf_counter()
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"INSERT INTO {TABLE} (user_id, major, minor) "
+                "SELECT n %% 1000, (n %% 100000) / 100.0, n %% 100000 FROM generate_series(1, %s) AS n",
+                [rows],
+            )
+            cursor.execute(f"ANALYZE {TABLE}")
+        else:
+            cursor.execute(
+                f"WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s) "
+                f"INSERT INTO {TABLE} (user_id, major, minor) "
+                "SELECT n %% 1000, CAST(n %% 100000 AS NUMERIC) / 100.0, n %% 100000 FROM seq",
+                [rows],
+            )
+        self.stdout.write(f"Populated in {time.perf_counter() - started:.1f}s")
+
+    def _report(self, cursor, repeat):
+        queries = (
+            ("SUM", "SELECT SUM({column}) FROM {table}"),
+            ("AVG", "SELECT AVG({column}) FROM {table}"),
+            ("SUM per customer", "SELECT user_id, SUM({column}) FROM {table} GROUP BY user_id"),
+        )
+        for label, template in queries:
+            major = self._best(cursor, template.format(column="major", table=TABLE), repeat)
+            minor = self._best(cursor, template.format(column="minor", table=TABLE), repeat)
+            self.stdout.write(
+                f"{label:<18} numeric {major * 1000:8.1f} ms   bigint {minor * 1000:8.1f} ms   "
+                f"speedup {major / minor:4.2f}x"
+            )
+
+    def _best(self, cursor, sql, repeat):
+        timings = []
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            cursor.execute(sql)
+            cursor.fetchall()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,43 @@
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Deliver queued billing events to the endpoints in WEBHOOK_ENDPOINTS."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="Database whose outbox to deliver.")
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent HTTP requests.")
+        parser.add_argument(
+            "--shard",
+            default="0/1",
+            help="Deliver only customers with id %% N == I, given as I/N, to split delivery across processes.",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when nothing is due.")
+        parser.add_argument("--burst", action="store_true", help="Exit once nothing is due.")
+
+    def handle(self, *args, **options):
+        from billingapp.webhooks import Dispatcher
+
+        try:
+            shard, shards = (int(part) for part in options["shard"].split("/"))
+        except ValueError:
+            raise CommandError("--shard must look like I/N, e.g. 0/4.")
+        if not 0 <= shard < shards:
+            raise CommandError("--shard I/N needs 0 <= I < N.")
+
+        dispatcher = Dispatcher(using=options["database"], workers=options["workers"], shard=(shard, shards))
+        if not dispatcher.endpoints:
+            raise CommandError("WEBHOOK_ENDPOINTS is empty; nothing to deliver to.")
+
+        stop_event = threading.Event()
+        self.stdout.write(f"Delivering to {len(dispatcher.endpoints)} endpoint(s). Press Ctrl+C to stop.")
+        try:
+            totals = dispatcher.run(stop_event, burst=options["burst"], poll_interval=options["poll_interval"])
+        except KeyboardInterrupt:
+            stop_event.set()
+            totals = dispatcher.totals
+        self.stdout.write(
+            f"Delivered {totals['delivered']}, rescheduled {totals['retried']}, failed {totals['failed']} message(s)."
+        )
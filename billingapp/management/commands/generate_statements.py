@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billingapp.models import Organization
+from billingapp.statements import generate_statements, parse_month, previous_month
+from billingapp.tenancy import use_organization
+
+
+class Command(BaseCommand):
+    help = "Render monthly statements for every customer with activity in the month."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Billing month as YYYY-MM; defaults to last month.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Customers read per query batch.")
+        parser.add_argument("--workers", type=int, help="Rendering processes; 0 renders in this process.")
+        parser.add_argument("--organization", help="Only this organization's customers (by slug).")
+
+    def handle(self, *args, **options):
+        try:
+            month = parse_month(options["month"]) if options["month"] else previous_month()
+        except ValueError:
+            raise CommandError("--month must look like 2026-09.")
+
+        organization = None
+        if options["organization"]:
+            organization = Organization.objects.filter(slug=options["organization"]).first()
+            if organization is None:
+                raise CommandError(f"Unknown organization {options['organization']!r}.")
+
+        started = time.perf_counter()
+        with use_organization(organization):
+            totals = generate_statements(month, chunk_size=options["chunk_size"], workers=options["workers"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered {totals['statements']} statement(s) for {month:%B %Y} from {totals['customers']} "
+                f"customer(s) in {time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,45 @@
+import argparse
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a management command (or, with --call, a function) under the sampling profiler "
+        "and save its profile to PROFILES_ROOT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--call",
+            metavar="DOTTED.PATH",
+            help="Profile a function called without arguments, e.g. billingapp.utils.ensure_subscription_bills.",
+        )
+        parser.add_argument("command", nargs="?", help="Management command to profile.")
+        parser.add_argument("command_args", nargs=argparse.REMAINDER, help="Arguments for the profiled command.")
+
+    def handle(self, *args, **options):
+        from billingplatform.profiling import profile_path, sample
+
+        if bool(options["call"]) == bool(options["command"]):
+            raise CommandError("Give a command name or --call, but not both.")
+
+        if options["call"]:
+            try:
+                target = import_string(options["call"])
+            except ImportError as exc:
+                raise CommandError(str(exc))
+            with sample(options["call"], "function") as profile:
+                result = target()
+            if result is not None:
+                self.stdout.write(f"Returned {result!r}")
+        else:
+            label = " ".join(["manage.py", options["command"], *options["command_args"]])
+            with sample(label, "command") as profile:
+                call_command(options["command"], *options["command_args"], stdout=self.stdout, stderr=self.stderr)
+
+        self.stdout.write(
+            f"{profile.samples} sample(s) over {profile.duration_ms:.0f} ms saved to {profile_path(profile.id)}"
+        )
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+DB_BACKED_ENGINES = (
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+)
+
+
+class Command(BaseCommand):
+    help = "Delete expired database sessions in small batches to avoid long table locks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows deleted per statement.")
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE not in DB_BACKED_ENGINES:
+            self.stdout.write(f"{settings.SESSION_ENGINE} does not store sessions in the database; nothing to purge.")
+            return
+
+        batch_size = options["batch_size"]
+        cutoff = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=cutoff)
+
+        purged = 0
+        while True:
+            keys = list(expired.values_list("session_key", flat=True)[:batch_size])
+            if not keys:
+                break
+            purged += Session.objects.filter(session_key__in=keys).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired session(s)."))
@@ -0,0 +1,98 @@
+import logging
+import multiprocessing
+import signal
+import time
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+
+logger = logging.getLogger("billingapp.jobs")
+
+# How often the parent process looks for jobs abandoned by crashed workers.
+STALE_CHECK_SECONDS = 60
+
+
+def worker_loop(stop_event, poll_interval: float, burst: bool) -> None:
+    """Claim and run jobs until ``stop_event`` is set (or the queue drains in burst mode)."""
+
+    django.setup()
+    from billingapp.jobs import claim_next_job, run_job
+
+    # The parent handles Ctrl+C and asks children to stop between jobs.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    connections.close_all()
+
+    while not stop_event.is_set():
+        close_old_connections()
+        job = claim_next_job()
+        if job is None:
+            if burst:
+                break
+            stop_event.wait(poll_interval)
+            continue
+        logger.info("Running job %s (%s)", job.pk, job.name)
+        run_job(job)
+
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Process queued background jobs with a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2, help="Number of worker processes.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=30,
+            help="Minutes after which a running job whose worker stopped sending heartbeats is re-queued.",
+        )
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options["stale_after"])
+        self.recover_stale_jobs(stale_after)
+
+        # Children must open their own database connections.
+        connections.close_all()
+
+        stop_event = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(
+                target=worker_loop,
+                args=(stop_event, options["poll_interval"], options["burst"]),
+                name=f"billing-worker-{index}",
+            )
+            for index in range(max(1, options["processes"]))
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} worker process(es). Press Ctrl+C to stop.")
+
+        try:
+            next_stale_check = time.monotonic() + STALE_CHECK_SECONDS
+            while any(worker.is_alive() for worker in workers):
+                time.sleep(0.5)
+                if time.monotonic() >= next_stale_check:
+                    # A worker killed elsewhere (another host, OOM) leaves its job running.
+                    next_stale_check = time.monotonic() + STALE_CHECK_SECONDS
+                    self.recover_stale_jobs(stale_after)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the current jobs finish...")
+            stop_event.set()
+        finally:
+            for worker in workers:
+                worker.join()
+
+    def recover_stale_jobs(self, stale_after: timedelta) -> None:
+        from billingapp.jobs import requeue_stale_jobs
+
+        requeued, failed = requeue_stale_jobs(stale_after)
+        if requeued:
+            self.stdout.write(f"Re-queued {requeued} stale job(s).")
+        if failed:
+            self.stdout.write(f"Failed {failed} stale job(s) that had used all their attempts.")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from billingapp.reminders import send_reminders
+
+
+class Command(BaseCommand):
+    help = "Email each customer one digest of bills that are due soon or overdue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=3, help="Remind about bills due within this many days.")
+        parser.add_argument("--chunk-size", type=int, default=100, help="Digests sent per batch.")
+        parser.add_argument("--dry-run", action="store_true", help="Count reminders without sending or logging them.")
+
+    def handle(self, *args, **options):
+        totals = send_reminders(days=options["days"], chunk_size=options["chunk_size"], dry_run=options["dry_run"])
+        verb = "Would send" if options["dry_run"] else "Sent"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {totals['customers']} digest(s) covering {totals['bills']} bill(s).")
+        )
@@ -0,0 +1,132 @@
+"""Search indexes for customers and bills.
+
+PostgreSQL gets trigram GIN indexes on ``UPPER(column::text)``, the expression
+Django emits for ``icontains``. SQLite gets an FTS5 table maintained by
+triggers; each row id is ``source_id * 4 + kind`` (1 = customer,
+2 = subscription, 3 = bill).
+"""
+
+from django.db import migrations
+
+
+TRIGRAM_INDEXES = (
+    ("billing_user_username_trgm", "auth_user", "username"),
+    ("billing_profile_name_trgm", "billingapp_profile", "full_name"),
+    ("billing_profile_phone_trgm", "billingapp_profile", "phone"),
+    ("billing_bill_title_trgm", "billingapp_bill", "title"),
+    ("billing_subscription_name_trgm", "billingapp_subscription", "name"),
+)
+
+CUSTOMER_BODY = (
+    "(SELECT u.username || ' ' || COALESCE(p.full_name, '') || ' ' || COALESCE(p.phone, '') "
+    "FROM auth_user u LEFT JOIN billingapp_profile p ON p.user_id = u.id WHERE u.id = {user_id})"
+)
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE billingapp_search_index USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')",
+    # Customers: one row per user combining username, full name and phone.
+    f"""CREATE TRIGGER billingapp_search_user_ai AFTER INSERT ON auth_user BEGIN
+        INSERT INTO billingapp_search_index(rowid, body) VALUES (new.id * 4 + 1, {CUSTOMER_BODY.format(user_id='new.id')});
+    END""",
+    f"""CREATE TRIGGER billingapp_search_user_au AFTER UPDATE OF username ON auth_user BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.id * 4 + 1;
+        INSERT INTO billingapp_search_index(rowid, body) VALUES (new.id * 4 + 1, {CUSTOMER_BODY.format(user_id='new.id')});
+    END""",
+    """CREATE TRIGGER billingapp_search_user_ad AFTER DELETE ON auth_user BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.id * 4 + 1;
+    END""",
+    f"""CREATE TRIGGER billingapp_search_profile_ai AFTER INSERT ON billingapp_profile BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = new.user_id * 4 + 1;
+        INSERT INTO billingapp_search_index(rowid, body) VALUES (new.user_id * 4 + 1, {CUSTOMER_BODY.format(user_id='new.user_id')});
+    END""",
+    f"""CREATE TRIGGER billingapp_search_profile_au AFTER UPDATE OF full_name, phone ON billingapp_profile BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = new.user_id * 4 + 1;
+        INSERT INTO billingapp_search_index(rowid, body) VALUES (new.user_id * 4 + 1, {CUSTOMER_BODY.format(user_id='new.user_id')});
+    END""",
+    f"""CREATE TRIGGER billingapp_search_profile_ad AFTER DELETE ON billingapp_profile BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.user_id * 4 + 1;
+        INSERT INTO billingapp_search_index(rowid, body)
+            SELECT old.user_id * 4 + 1, {CUSTOMER_BODY.format(user_id='old.user_id')}
+            WHERE EXISTS (SELECT 1 FROM auth_user WHERE id = old.user_id);
+    END""",
+    # Subscriptions: one row per subscription name.
+    """CREATE TRIGGER billingapp_search_subscription_ai AFTER INSERT ON billingapp_subscription BEGIN
+        INSERT INTO billingapp_search_index(rowid, body) VALUES (new.id * 4 + 2, new.name);
+    END""",
+    """CREATE TRIGGER billingapp_search_subscription_au AFTER UPDATE OF name ON billingapp_subscription BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.id * 4 + 2;
+        INSERT INTO billingapp_search_index(rowid, body) VALUES (new.id * 4 + 2, new.name);
+    END""",
+    """CREATE TRIGGER billingapp_search_subscription_ad AFTER DELETE ON billingapp_subscription BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.id * 4 + 2;
+    END""",
+    # Bills: one row per bill title.
+    """CREATE TRIGGER billingapp_search_bill_ai AFTER INSERT ON billingapp_bill BEGIN
+        INSERT INTO billingapp_search_index(rowid, body) VALUES (new.id * 4 + 3, new.title);
+    END""",
+    """CREATE TRIGGER billingapp_search_bill_au AFTER UPDATE OF title ON billingapp_bill BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.id * 4 + 3;
+        INSERT INTO billingapp_search_index(rowid, body) VALUES (new.id * 4 + 3, new.title);
+    END""",
+    """CREATE TRIGGER billingapp_search_bill_ad AFTER DELETE ON billingapp_bill BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.id * 4 + 3;
+    END""",
+    # Backfill existing rows.
+    """INSERT INTO billingapp_search_index(rowid, body)
+        SELECT u.id * 4 + 1, u.username || ' ' || COALESCE(p.full_name, '') || ' ' || COALESCE(p.phone, '')
+        FROM auth_user u LEFT JOIN billingapp_profile p ON p.user_id = u.id""",
+    "INSERT INTO billingapp_search_index(rowid, body) SELECT id * 4 + 2, name FROM billingapp_subscription",
+    "INSERT INTO billingapp_search_index(rowid, body) SELECT id * 4 + 3, title FROM billingapp_bill",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS billingapp_search_user_ai",
+    "DROP TRIGGER IF EXISTS billingapp_search_user_au",
+    "DROP TRIGGER IF EXISTS billingapp_search_user_ad",
+    "DROP TRIGGER IF EXISTS billingapp_search_profile_ai",
+    "DROP TRIGGER IF EXISTS billingapp_search_profile_au",
+    "DROP TRIGGER IF EXISTS billingapp_search_profile_ad",
+    "DROP TRIGGER IF EXISTS billingapp_search_subscription_ai",
+    "DROP TRIGGER IF EXISTS billingapp_search_subscription_au",
+    "DROP TRIGGER IF EXISTS billingapp_search_subscription_ad",
+    "DROP TRIGGER IF EXISTS billingapp_search_bill_ai",
+    "DROP TRIGGER IF EXISTS billingapp_search_bill_au",
+    "DROP TRIGGER IF EXISTS billingapp_search_bill_ad",
+    "DROP TABLE IF EXISTS billingapp_search_index",
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, table, column in TRIGRAM_INDEXES:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+            )
+    elif vendor == "sqlite":
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for name, _table, _column in TRIGRAM_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+    elif vendor == "sqlite":
+        for statement in SQLITE_REVERSE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0004_job'),
+        # The triggers read auth_user, so every auth migration that rebuilds it must run first.
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
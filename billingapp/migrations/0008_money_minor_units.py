@@ -0,0 +1,108 @@
+"""Store bill, subscription and transaction amounts as integer minor units.
+
+Each table gets a nullable ``amount_minor`` column, the old ``amount`` is made
+nullable (so the migration can be reversed onto a populated table), values
+are copied across in primary-key chunks, and the new column takes over the
+``amount`` name. Reversing copies the minor units back into decimals.
+
+SQLite rebuilds altered tables, which drops the search triggers created by
+``0005_search_indexes``; they are recreated afterwards in both directions.
+"""
+
+from decimal import Decimal
+from importlib import import_module
+
+import django.core.validators
+from django.db import migrations, models
+
+import billingapp.money
+
+
+CHUNK_SIZE = 2000
+MODELS = ("bill", "subscription", "transaction")
+SEARCH_TRIGGER_TABLES = (" ON billingapp_bill ", " ON billingapp_subscription ")
+
+
+def _copy_in_chunks(model, db_alias, source, target, convert):
+    objects = model.objects.using(db_alias)
+    last_pk = 0
+    while True:
+        rows = list(objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", source)[:CHUNK_SIZE])
+        if not rows:
+            break
+        objects.bulk_update(
+            [model(pk=pk, **{target: None if value is None else convert(value)}) for pk, value in rows],
+            [target],
+        )
+        last_pk = rows[-1][0]
+
+
+def to_minor_units(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    for name in MODELS:
+        model = apps.get_model("billingapp", name)
+        _copy_in_chunks(model, db_alias, "amount", "amount_minor", lambda value: int(Decimal(value) * 100))
+
+
+def to_major_units(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    for name in MODELS:
+        model = apps.get_model("billingapp", name)
+        _copy_in_chunks(model, db_alias, "amount_minor", "amount", lambda value: Decimal(value) / 100)
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    search_indexes = import_module("billingapp.migrations.0005_search_indexes")
+    for statement in search_indexes.SQLITE_FORWARD:
+        if statement.startswith("CREATE TRIGGER") and any(table in statement for table in SEARCH_TRIGGER_TABLES):
+            trigger = statement.split()[2]
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            schema_editor.execute(statement)
+
+
+def _split_amount(model_name):
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name="amount_minor",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name="amount",
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
+
+
+def _replace_amount(model_name, validators):
+    return [
+        migrations.RemoveField(model_name=model_name, name="amount"),
+        migrations.RenameField(model_name=model_name, old_name="amount_minor", new_name="amount"),
+        migrations.AlterField(
+            model_name=model_name,
+            name="amount",
+            field=billingapp.money.MoneyField(validators=validators),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0007_bill_reminders'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        *_split_amount("bill"),
+        *_split_amount("subscription"),
+        *_split_amount("transaction"),
+        migrations.RunPython(to_minor_units, to_major_units),
+        *_replace_amount("bill", [django.core.validators.MinValueValidator(0)]),
+        *_replace_amount("subscription", [django.core.validators.MinValueValidator(0)]),
+        *_replace_amount("transaction", []),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:48
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+TENANT_MODELS = ("profile", "subscription", "bill", "transaction")
+
+
+def _search_trigger_sql():
+    return import_module("billingapp.migrations.0005_search_indexes")
+
+
+def drop_search_triggers(apps, schema_editor):
+    # SQLite rebuilds tables when columns are removed; triggers that mention
+    # the rebuilt tables would abort the rebuild, so they are set aside.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in _search_trigger_sql().SQLITE_REVERSE:
+        if statement.startswith("DROP TRIGGER"):
+            schema_editor.execute(statement)
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    drop_search_triggers(apps, schema_editor)
+    for statement in _search_trigger_sql().SQLITE_FORWARD:
+        if statement.startswith("CREATE TRIGGER"):
+            schema_editor.execute(statement)
+
+
+def assign_default_organization(apps, schema_editor):
+    """Existing data becomes the "Default" organization."""
+
+    db_alias = schema_editor.connection.alias
+    if db_alias != "default":
+        return
+    Profile = apps.get_model("billingapp", "Profile")
+    if not Profile.objects.using(db_alias).exists():
+        return
+    Organization = apps.get_model("billingapp", "Organization")
+    organization, _created = Organization.objects.using(db_alias).get_or_create(
+        slug="default", defaults={"name": "Default"}
+    )
+    for name in TENANT_MODELS:
+        model = apps.get_model("billingapp", name)
+        model.objects.using(db_alias).filter(organization__isnull=True).update(organization=organization)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0009_billing_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Reversing removes the new columns; restore the search triggers afterwards.
+        migrations.RunPython(migrations.RunPython.noop, create_search_triggers),
+        migrations.CreateModel(
+            name='Organization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150)),
+                ('slug', models.SlugField(unique=True)),
+                ('domain', models.CharField(blank=True, help_text='Host name that selects this organization.', max_length=253, null=True, unique=True)),
+                ('database', models.CharField(blank=True, help_text='Database alias for a tenant on its own database; blank for the shared one.', max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='organization',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='bills', to='billingapp.organization'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='organization',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='profiles', to='billingapp.organization'),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='organization',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='subscriptions', to='billingapp.organization'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='organization',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='billingapp.organization'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='organization',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='billingapp.organization'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['organization', 'status', 'due_date'], name='bill_org_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['organization', '-created_at'], name='bill_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['organization', 'user'], name='profile_org_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['organization', 'active', 'next_renewal_date'], name='subscription_org_renewal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['organization', '-payment_date'], name='transaction_org_payment_idx'),
+        ),
+        migrations.RunPython(assign_default_organization, migrations.RunPython.noop),
+        migrations.RunPython(migrations.RunPython.noop, drop_search_triggers),
+    ]
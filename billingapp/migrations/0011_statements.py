@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:00
+
+import billingapp.money
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0010_organizations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Statement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the billing month.')),
+                ('html_digest', models.CharField(max_length=64)),
+                ('text_digest', models.CharField(max_length=64)),
+                ('total_billed', billingapp.money.MoneyField(default=0)),
+                ('total_paid', billingapp.money.MoneyField(default=0)),
+                ('outstanding', billingapp.money.MoneyField(default=0)),
+                ('generated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='unique_statement_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0011_statements'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='failure_reason',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='reference',
+            field=models.CharField(blank=True, help_text='Gateway reference for asynchronous settlement.', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='settled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='billingevent',
+            name='kind',
+            field=models.CharField(choices=[('bill_created', 'Bill created'), ('bill_paid', 'Bill paid'), ('payment_failed', 'Payment failed'), ('renewal_generated', 'Renewal bill generated'), ('subscription_paused', 'Subscription paused'), ('subscription_resumed', 'Subscription resumed')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed')], default='success', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['reference'], name='transaction_reference_idx'),
+        ),
+    ]
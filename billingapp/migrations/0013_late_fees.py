@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:09
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Removing the column on reverse rebuilds the bill table on SQLite.
+search_triggers = import_module("billingapp.migrations.0010_organizations")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0012_payment_settlement'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, search_triggers.create_search_triggers),
+        migrations.AddField(
+            model_name='bill',
+            name='late_fee_for',
+            field=models.ForeignKey(blank=True, help_text='The overdue bill this late fee was charged on.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='late_fees', to='billingapp.bill'),
+        ),
+        migrations.AddConstraint(
+            model_name='bill',
+            constraint=models.UniqueConstraint(condition=models.Q(('late_fee_for__isnull', False)), fields=('late_fee_for',), name='unique_late_fee_per_bill'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, search_triggers.drop_search_triggers),
+    ]
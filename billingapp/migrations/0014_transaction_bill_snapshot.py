@@ -0,0 +1,59 @@
+"""Copy each transaction's bill title, type and due date onto the transaction.
+
+Existing rows are backfilled in primary-key chunks from their bills; new
+transactions take the snapshot when they are created.
+"""
+
+from django.db import migrations, models
+
+
+CHUNK_SIZE = 2000
+SNAPSHOT_FIELDS = ("bill_title", "bill_type", "bill_due_date")
+
+
+def backfill_bill_snapshot(apps, schema_editor):
+    Transaction = apps.get_model("billingapp", "Transaction")
+    objects = Transaction.objects.using(schema_editor.connection.alias)
+    last_pk = 0
+    while True:
+        rows = list(
+            objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "bill__title", "bill__bill_type", "bill__due_date")[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        objects.bulk_update(
+            [
+                Transaction(pk=pk, bill_title=title, bill_type=bill_type, bill_due_date=due_date)
+                for pk, title, bill_type, due_date in rows
+            ],
+            SNAPSHOT_FIELDS,
+        )
+        last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0013_late_fees'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='bill_due_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='bill_title',
+            field=models.CharField(blank=True, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='bill_type',
+            field=models.CharField(blank=True, choices=[('electricity', 'Electricity'), ('fees', 'Fees'), ('subscription', 'Subscription'), ('other', 'Other')], max_length=40),
+        ),
+        migrations.RunPython(backfill_bill_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0014_transaction_bill_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='batch',
+            field=models.UUIDField(blank=True, editable=False, help_text='Bulk assignment that created this bill.', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='bill',
+            constraint=models.UniqueConstraint(condition=models.Q(('batch__isnull', False)), fields=('batch', 'user'), name='unique_bill_per_batch'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:22
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0015_bill_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=50)),
+                ('event_id', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Idempotency key sent to receivers.')),
+                ('kind', models.CharField(choices=[('bill_created', 'Bill created'), ('bill_paid', 'Bill paid'), ('payment_failed', 'Payment failed'), ('renewal_generated', 'Renewal bill generated'), ('subscription_paused', 'Subscription paused'), ('subscription_resumed', 'Subscription resumed')], max_length=30)),
+                ('customer_id', models.BigIntegerField()),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('delivered', 'Delivered'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['endpoint', 'status', 'next_attempt_at'], name='outbox_due_idx'), models.Index(fields=['endpoint', 'customer_id', 'status'], name='outbox_customer_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,99 @@
+"""Keep the SQLite search triggers from reading ``auth_user``.
+
+``0005_search_indexes`` built each customer's search row with a subquery
+joining ``auth_user`` and ``billingapp_profile``. SQLite re-parses every
+trigger when a table is renamed, so a rebuild of ``auth_user`` (for example by
+a later ``auth`` migration) failed with "no such table: main.auth_user" in the
+profile triggers. The search table now has two columns. ``name`` holds a
+customer's username, or a subscription name or bill title. ``details`` holds
+a customer's full name and phone. Each trigger only reads its own row and
+writes the search table.
+
+Migrations that rebuild a searched table on SQLite must drop these triggers
+first and recreate them afterwards, as ``0010_organizations`` does for the
+``0005`` ones.
+"""
+
+from importlib import import_module
+
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE billingapp_search_index USING fts5(name, details, tokenize = 'unicode61 remove_diacritics 2')",
+    # Customers: the user trigger writes the username, the profile triggers the details.
+    """CREATE TRIGGER billingapp_search_user_ai AFTER INSERT ON auth_user BEGIN
+        INSERT INTO billingapp_search_index(rowid, name, details) VALUES (new.id * 4 + 1, new.username, '');
+    END""",
+    """CREATE TRIGGER billingapp_search_user_au AFTER UPDATE OF username ON auth_user BEGIN
+        UPDATE billingapp_search_index SET name = new.username WHERE rowid = new.id * 4 + 1;
+    END""",
+    """CREATE TRIGGER billingapp_search_user_ad AFTER DELETE ON auth_user BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.id * 4 + 1;
+    END""",
+    """CREATE TRIGGER billingapp_search_profile_ai AFTER INSERT ON billingapp_profile BEGIN
+        UPDATE billingapp_search_index SET details = new.full_name || ' ' || new.phone WHERE rowid = new.user_id * 4 + 1;
+    END""",
+    """CREATE TRIGGER billingapp_search_profile_au AFTER UPDATE OF full_name, phone ON billingapp_profile BEGIN
+        UPDATE billingapp_search_index SET details = new.full_name || ' ' || new.phone WHERE rowid = new.user_id * 4 + 1;
+    END""",
+    """CREATE TRIGGER billingapp_search_profile_ad AFTER DELETE ON billingapp_profile BEGIN
+        UPDATE billingapp_search_index SET details = '' WHERE rowid = old.user_id * 4 + 1;
+    END""",
+    # Subscriptions: one row per subscription name.
+    """CREATE TRIGGER billingapp_search_subscription_ai AFTER INSERT ON billingapp_subscription BEGIN
+        INSERT INTO billingapp_search_index(rowid, name, details) VALUES (new.id * 4 + 2, new.name, '');
+    END""",
+    """CREATE TRIGGER billingapp_search_subscription_au AFTER UPDATE OF name ON billingapp_subscription BEGIN
+        UPDATE billingapp_search_index SET name = new.name WHERE rowid = new.id * 4 + 2;
+    END""",
+    """CREATE TRIGGER billingapp_search_subscription_ad AFTER DELETE ON billingapp_subscription BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.id * 4 + 2;
+    END""",
+    # Bills: one row per bill title.
+    """CREATE TRIGGER billingapp_search_bill_ai AFTER INSERT ON billingapp_bill BEGIN
+        INSERT INTO billingapp_search_index(rowid, name, details) VALUES (new.id * 4 + 3, new.title, '');
+    END""",
+    """CREATE TRIGGER billingapp_search_bill_au AFTER UPDATE OF title ON billingapp_bill BEGIN
+        UPDATE billingapp_search_index SET name = new.title WHERE rowid = new.id * 4 + 3;
+    END""",
+    """CREATE TRIGGER billingapp_search_bill_ad AFTER DELETE ON billingapp_bill BEGIN
+        DELETE FROM billingapp_search_index WHERE rowid = old.id * 4 + 3;
+    END""",
+    # Backfill existing rows.
+    """INSERT INTO billingapp_search_index(rowid, name, details)
+        SELECT u.id * 4 + 1, u.username, COALESCE(p.full_name || ' ' || p.phone, '')
+        FROM auth_user u LEFT JOIN billingapp_profile p ON p.user_id = u.id""",
+    "INSERT INTO billingapp_search_index(rowid, name, details) SELECT id * 4 + 2, name, '' FROM billingapp_subscription",
+    "INSERT INTO billingapp_search_index(rowid, name, details) SELECT id * 4 + 3, title, '' FROM billingapp_bill",
+]
+
+# The trigger and table names are unchanged, so the 0005 statements drop either layout.
+SQLITE_REVERSE = import_module("billingapp.migrations.0005_search_indexes").SQLITE_REVERSE
+
+
+def _run(schema_editor, *statement_lists):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statements in statement_lists:
+        for statement in statements:
+            schema_editor.execute(statement)
+
+
+def split_search_columns(apps, schema_editor):
+    _run(schema_editor, SQLITE_REVERSE, SQLITE_FORWARD)
+
+
+def join_search_columns(apps, schema_editor):
+    _run(schema_editor, SQLITE_REVERSE, import_module("billingapp.migrations.0005_search_indexes").SQLITE_FORWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0016_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_search_columns, join_search_columns),
+    ]
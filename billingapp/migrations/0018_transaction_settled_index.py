@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0017_search_index_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['organization', '-settled_at'], name='transaction_org_settled_idx'),
+        ),
+    ]
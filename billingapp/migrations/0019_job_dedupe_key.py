@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:08
+
+from django.db import migrations, models
+
+
+def key_bulk_assignments(apps, schema_editor):
+    # Give queued bulk assignments their key so resubmitting them is still refused.
+    Job = apps.get_model("billingapp", "Job")
+    seen = set()
+    jobs = Job.objects.using(schema_editor.connection.alias).filter(name="assign_bills").order_by("pk")
+    for pk, payload in jobs.values_list("pk", "payload").iterator():
+        batch = (payload or {}).get("batch")
+        key = f"assign_bills:{batch}"
+        if batch and key not in seen:
+            seen.add(key)
+            Job.objects.using(schema_editor.connection.alias).filter(pk=pk).update(dedupe_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billingapp', '0018_transaction_settled_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='dedupe_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(key_bulk_assignments, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,25 @@
 from __future__ import annotations
 
 import calendar
+import uuid
 from datetime import date
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, router, transaction
 from django.db.models import Q
-from django.db.models.signals import post_save
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
+from .events import buffered_events, record
+from .money import MoneyField
+from .outbox import batched_outbox
+from .tenancy import TenantManager, TenantQuerySet, get_current_organization
+
 User = get_user_model()
 
 BILL_TYPE_ELECTRICITY = "electricity"
@@ -41,16 +49,118 @@ def _add_month(reference_date: date) -> date:
     return date(year, month, day)
 
 
+class Organization(models.Model):
+    """A client organization (tenant) whose customers and billing data are kept apart.
+
+    Foreign keys to it skip the database constraint so tenant rows can live on a
+    dedicated database while organizations stay on ``default``.
+    """
+
+    name = models.CharField(max_length=150)
+    slug = models.SlugField(unique=True)
+    domain = models.CharField(
+        max_length=253, unique=True, null=True, blank=True, help_text="Host name that selects this organization."
+    )
+    database = models.CharField(
+        max_length=50, blank=True, help_text="Database alias for a tenant on its own database; blank for the shared one."
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self) -> str:
+        return self.name
+
+    def clean(self) -> None:
+        if self.database and self.database not in settings.DATABASES:
+            raise ValidationError({"database": f"Unknown database alias '{self.database}'."})
+
+
+class SubscriptionQuerySet(TenantQuerySet):
+    def set_active(self, active: bool, actor: User | None = None) -> int:
+        """Pause or resume every subscription in one UPDATE; returns rows changed.
+
+        Resumed subscriptions never renew in the past, matching the admin toggle.
+        """
+
+        changes = {"active": active, "updated_at": timezone.now()}
+        if active:
+            changes["next_renewal_date"] = Greatest("next_renewal_date", models.Value(timezone.now().date()))
+        kind = BillingEvent.KIND_SUBSCRIPTION_RESUMED if active else BillingEvent.KIND_SUBSCRIPTION_PAUSED
+        with buffered_events(), transaction.atomic(), batched_outbox():
+            rows = list(self.exclude(active=active).select_for_update().values_list("pk", "user_id"))
+            changed = Subscription.objects.filter(pk__in=[pk for pk, _user_id in rows]).update(**changes)
+            for pk, user_id in rows:
+                record(kind, user=user_id, subscription=pk, actor=actor)
+        return changed
+
+
+class BillQuerySet(TenantQuerySet):
+    def mark_paid(self, paid_by: User | None = None, method: str = "Simulated", chunk_size: int = 1000) -> int:
+        """Set-based :meth:`Bill.mark_paid` for every unpaid bill; returns bills paid.
+
+        Each chunk costs one locking SELECT, one UPDATE and one bulk INSERT of
+        transactions, regardless of how many bills it contains.
+        """
+
+        paid = 0
+        unpaid = self.filter(status=Bill.STATUS_UNPAID).order_by("pk")
+        last_pk = 0
+        while True:
+            with buffered_events(), transaction.atomic(), batched_outbox():
+                rows = list(
+                    unpaid.filter(pk__gt=last_pk)
+                    .select_for_update()
+                    .values_list("pk", "user_id", "amount", "organization_id", "title", "bill_type", "due_date")[
+                        :chunk_size
+                    ]
+                )
+                if not rows:
+                    break
+                now = timezone.now()
+                Bill.objects.filter(pk__in=[row[0] for row in rows]).update(
+                    status=Bill.STATUS_PAID, paid_at=now, updated_at=now
+                )
+                Transaction.objects.bulk_create(
+                    Transaction(
+                        user_id=user_id,
+                        bill_id=pk,
+                        organization_id=organization_id,
+                        amount=amount,
+                        method=method,
+                        status=Transaction.STATUS_SUCCESS,
+                        processed_by=paid_by,
+                        **Transaction.bill_snapshot(title, bill_type, due_date),
+                    )
+                    for pk, user_id, amount, organization_id, title, bill_type, due_date in rows
+                )
+                for pk, user_id, amount, *_ in rows:
+                    record(BillingEvent.KIND_BILL_PAID, user=user_id, bill=pk, actor=paid_by, amount=amount, method=method)
+            paid += len(rows)
+            last_pk = rows[-1][0]
+        return paid
+
+
 class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="profile")
+    organization = models.ForeignKey(
+        Organization, null=True, blank=True, on_delete=models.PROTECT, db_constraint=False, related_name="profiles"
+    )
     full_name = models.CharField(max_length=150, blank=True)
     phone = models.CharField(max_length=20, blank=True)
     address = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TenantQuerySet.as_manager()
+    scoped = TenantManager.from_queryset(TenantQuerySet)()
+
     class Meta:
         ordering = ["user__username"]
+        indexes = [
+            models.Index(fields=["organization", "user"], name="profile_org_user_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.full_name or self.user.get_username()
@@ -65,8 +175,11 @@ class Subscription(models.Model):
     )
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="subscriptions")
+    organization = models.ForeignKey(
+        Organization, null=True, blank=True, on_delete=models.PROTECT, db_constraint=False, related_name="subscriptions"
+    )
     name = models.CharField(max_length=120)
-    amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    amount = MoneyField(validators=[MinValueValidator(0)])
     bill_type = models.CharField(max_length=40, choices=BILL_TYPE_CHOICES, default=BILL_TYPE_SUBSCRIPTION)
     next_renewal_date = models.DateField()
     active = models.BooleanField(default=True)
@@ -75,8 +188,16 @@ class Subscription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SubscriptionQuerySet.as_manager()
+    scoped = TenantManager.from_queryset(SubscriptionQuerySet)()
+
     class Meta:
         ordering = ["-active", "next_renewal_date"]
+        indexes = [
+            models.Index(fields=["organization", "active", "next_renewal_date"], name="subscription_org_renewal_idx"),
+            models.Index(fields=["user", "updated_at"], name="subscription_user_updated_idx"),
+            models.Index(fields=["next_renewal_date"], name="subscription_renewal_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name} - {self.user.username}"
@@ -94,10 +215,13 @@ class Bill(models.Model):
     )
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="bills")
+    organization = models.ForeignKey(
+        Organization, null=True, blank=True, on_delete=models.PROTECT, db_constraint=False, related_name="bills"
+    )
     subscription = models.ForeignKey(Subscription, on_delete=models.SET_NULL, null=True, blank=True, related_name="bills")
     title = models.CharField(max_length=150)
     description = models.TextField(blank=True)
-    amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    amount = MoneyField(validators=[MinValueValidator(0)])
     due_date = models.DateField()
     bill_type = models.CharField(max_length=40, choices=BILL_TYPE_CHOICES, default=BILL_TYPE_SUBSCRIPTION)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_UNPAID)
@@ -105,6 +229,18 @@ class Bill(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     paid_at = models.DateTimeField(null=True, blank=True)
+    late_fee_for = models.ForeignKey(
+        "self",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name="late_fees",
+        help_text="The overdue bill this late fee was charged on.",
+    )
+    batch = models.UUIDField(null=True, blank=True, editable=False, help_text="Bulk assignment that created this bill.")
+
+    objects = BillQuerySet.as_manager()
+    scoped = TenantManager.from_queryset(BillQuerySet)()
 
     class Meta:
         ordering = ["status", "due_date"]
@@ -113,12 +249,29 @@ class Bill(models.Model):
                 fields=["subscription", "due_date"],
                 name="unique_subscription_bill_per_cycle",
                 condition=Q(subscription__isnull=False),
-            )
+            ),
+            models.UniqueConstraint(
+                fields=["late_fee_for"], name="unique_late_fee_per_bill", condition=Q(late_fee_for__isnull=False)
+            ),
+            models.UniqueConstraint(fields=["batch", "user"], name="unique_bill_per_batch", condition=Q(batch__isnull=False)),
+        ]
+        indexes = [
+            models.Index(fields=["user", "updated_at"], name="bill_user_updated_idx"),
+            models.Index(fields=["due_date"], name="bill_due_date_idx"),
+            models.Index(fields=["status", "due_date"], name="bill_status_due_date_idx"),
+            models.Index(fields=["organization", "status", "due_date"], name="bill_org_status_due_idx"),
+            models.Index(fields=["organization", "-created_at"], name="bill_org_created_idx"),
         ]
 
     def __str__(self) -> str:
         return f"{self.title} ({self.user.username})"
 
+    def save(self, *args, **kwargs):
+        # record_bill_created queues webhook messages; keep them in the bill's transaction.
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
     def mark_paid(self, paid_by: User | None = None, method: str = "Simulated") -> "Transaction":
         if self.status == self.STATUS_PAID:
             try:
@@ -126,49 +279,350 @@ class Bill(models.Model):
             except Transaction.DoesNotExist:  # type: ignore[name-defined]
                 pass
 
-        self.status = self.STATUS_PAID
-        self.paid_at = timezone.now()
-        self.save(update_fields=["status", "paid_at", "updated_at"])
-
-        return Transaction.objects.create(
-            user=self.user,
-            bill=self,
-            amount=self.amount,
-            method=method,
-            status=Transaction.STATUS_SUCCESS,
-            processed_by=paid_by,
-        )
+        with transaction.atomic():
+            self.status = self.STATUS_PAID
+            self.paid_at = timezone.now()
+            self.save(update_fields=["status", "paid_at", "updated_at"])
+            record(BillingEvent.KIND_BILL_PAID, user=self.user_id, bill=self, actor=paid_by, amount=self.amount, method=method)
+
+            return Transaction.objects.create(
+                user=self.user,
+                bill=self,
+                amount=self.amount,
+                method=method,
+                status=Transaction.STATUS_SUCCESS,
+                processed_by=paid_by,
+                **Transaction.bill_snapshot(self.title, self.bill_type, self.due_date),
+            )
 
 
 class Transaction(models.Model):
     METHOD_SIMULATED = "Simulated"
+    STATUS_PENDING = "pending"
     STATUS_SUCCESS = "success"
     STATUS_FAILED = "failed"
     STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
         (STATUS_SUCCESS, "Success"),
         (STATUS_FAILED, "Failed"),
     )
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="transactions")
     bill = models.ForeignKey(Bill, on_delete=models.CASCADE, related_name="transactions")
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    organization = models.ForeignKey(
+        Organization, null=True, blank=True, on_delete=models.PROTECT, db_constraint=False, related_name="transactions"
+    )
+    amount = MoneyField()
     payment_date = models.DateTimeField(auto_now_add=True)
     method = models.CharField(max_length=40, default=METHOD_SIMULATED)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_SUCCESS)
     processed_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="processed_transactions"
     )
+    reference = models.CharField(max_length=64, blank=True, help_text="Gateway reference for asynchronous settlement.")
+    failure_reason = models.CharField(max_length=200, blank=True)
+    settled_at = models.DateTimeField(null=True, blank=True)
+    # Snapshot of the bill when the payment was made, so payment history
+    # reads this table alone and keeps showing what the customer paid for.
+    bill_title = models.CharField(max_length=150, blank=True)
+    bill_type = models.CharField(max_length=40, choices=BILL_TYPE_CHOICES, blank=True)
+    bill_due_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantQuerySet.as_manager()
+    scoped = TenantManager.from_queryset(TenantQuerySet)()
 
     class Meta:
         ordering = ["-payment_date"]
         get_latest_by = "payment_date"
+        indexes = [
+            models.Index(fields=["organization", "-payment_date"], name="transaction_org_payment_idx"),
+            models.Index(fields=["user", "updated_at"], name="transaction_user_updated_idx"),
+            models.Index(fields=["payment_date"], name="transaction_payment_date_idx"),
+            models.Index(fields=["reference"], name="transaction_reference_idx"),
+            models.Index(fields=["organization", "-settled_at"], name="transaction_org_settled_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.bill_title} - {self.amount}"
+
+    @staticmethod
+    def bill_snapshot(title: str, bill_type: str, due_date: date) -> dict:
+        return {"bill_title": title, "bill_type": bill_type, "bill_due_date": due_date}
+
+
+class BillReminder(models.Model):
+    """Sent-log for reminder emails; one row per bill and reminder kind."""
+
+    KIND_DUE_SOON = "due_soon"
+    KIND_OVERDUE = "overdue"
+    KIND_CHOICES = (
+        (KIND_DUE_SOON, "Due soon"),
+        (KIND_OVERDUE, "Overdue"),
+    )
+
+    bill = models.ForeignKey(Bill, on_delete=models.CASCADE, related_name="reminders")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-sent_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["bill", "kind"], name="unique_bill_reminder_kind"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} reminder for bill #{self.bill_id}"
+
+
+class Statement(models.Model):
+    """A customer's statement for one billing month.
+
+    The rendered documents live on disk, addressed by the SHA-256 digests kept
+    here (see :mod:`billingapp.statements`).
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="statements")
+    month = models.DateField(help_text="First day of the billing month.")
+    html_digest = models.CharField(max_length=64)
+    text_digest = models.CharField(max_length=64)
+    total_billed = MoneyField(default=0)
+    total_paid = MoneyField(default=0)
+    outstanding = MoneyField(default=0)
+    generated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-month"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "month"], name="unique_statement_month"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Statement {self.month:%Y-%m} for user #{self.user_id}"
+
+    def digest(self, fmt: str) -> str:
+        return self.html_digest if fmt == "html" else self.text_digest
+
+
+class BillingEventQuerySet(models.QuerySet):
+    def for_customer(self, user):
+        """Newest first; served by ``billing_event_user_idx``."""
+
+        return self.filter(user=user).order_by("-created_at", "-id")
+
+    def for_bill(self, bill):
+        """Newest first; served by ``billing_event_bill_idx``."""
+
+        return self.filter(bill=bill).order_by("-created_at", "-id")
+
+
+class BillingEvent(models.Model):
+    """Append-only history of billing state changes, written via ``billingapp.events``."""
+
+    KIND_BILL_CREATED = "bill_created"
+    KIND_BILL_PAID = "bill_paid"
+    KIND_PAYMENT_FAILED = "payment_failed"
+    KIND_RENEWAL_GENERATED = "renewal_generated"
+    KIND_SUBSCRIPTION_PAUSED = "subscription_paused"
+    KIND_SUBSCRIPTION_RESUMED = "subscription_resumed"
+    KIND_CHOICES = (
+        (KIND_BILL_CREATED, "Bill created"),
+        (KIND_BILL_PAID, "Bill paid"),
+        (KIND_PAYMENT_FAILED, "Payment failed"),
+        (KIND_RENEWAL_GENERATED, "Renewal bill generated"),
+        (KIND_SUBSCRIPTION_PAUSED, "Subscription paused"),
+        (KIND_SUBSCRIPTION_RESUMED, "Subscription resumed"),
+    )
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    # Events outlive the rows they describe, including the customer's account.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="billing_events"
+    )
+    bill = models.ForeignKey(Bill, null=True, blank=True, on_delete=models.SET_NULL, related_name="events")
+    subscription = models.ForeignKey(
+        Subscription, null=True, blank=True, on_delete=models.SET_NULL, related_name="events"
+    )
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    amount = MoneyField(null=True, blank=True)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = BillingEventQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="billing_event_user_idx"),
+            models.Index(fields=["bill", "-created_at"], name="billing_event_bill_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} ({self.created_at:%Y-%m-%d %H:%M})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Billing events are append-only.")
+        super().save(*args, **kwargs)
+
+
+class OutboxMessage(models.Model):
+    """A billing event waiting to be delivered to one webhook endpoint.
+
+    Written in the same transaction as the change it describes and delivered
+    by ``manage.py dispatch_webhooks`` (see :mod:`billingapp.webhooks`).
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_DELIVERED = "delivered"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_DELIVERED, "Delivered"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    endpoint = models.CharField(max_length=50)
+    event_id = models.UUIDField(default=uuid.uuid4, editable=False, help_text="Idempotency key sent to receivers.")
+    kind = models.CharField(max_length=30, choices=BillingEvent.KIND_CHOICES)
+    # Deliveries are ordered per customer. A plain id rather than a foreign key
+    # so deleting a customer does not discard their undelivered messages.
+    customer_id = models.BigIntegerField()
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["endpoint", "status", "next_attempt_at"], name="outbox_due_idx"),
+            models.Index(fields=["endpoint", "customer_id", "status"], name="outbox_customer_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()} → {self.endpoint} ({self.status})"
+
+
+class Job(models.Model):
+    """A unit of background work picked up by ``manage.py run_worker``."""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # A submission id (e.g. a bulk assignment's batch); each is queued at most once.
+    dedupe_key = models.CharField(max_length=100, null=True, blank=True, unique=True, editable=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    progress_done = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="jobs")
+    # Jobs run inside the organization that queued them.
+    organization = models.ForeignKey(
+        Organization, null=True, blank=True, on_delete=models.SET_NULL, db_constraint=False, related_name="+"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    # Workers claim jobs of every organization through ``objects``.
+    objects = models.Manager()
+    scoped = TenantManager()
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="job_status_run_after_idx"),
+        ]
 
     def __str__(self) -> str:
-        return f"{self.bill.title} - {self.amount}"
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+    @property
+    def progress_percent(self) -> int | None:
+        if not self.progress_total:
+            return 100 if self.status == self.STATUS_SUCCEEDED else None
+        return min(100, int(self.progress_done * 100 / self.progress_total))
+
+    def set_progress(self, done: int, total: int | None = None) -> None:
+        """Record progress with a single UPDATE so status pages can poll it."""
+
+        self.progress_done = done
+        if total is not None:
+            self.progress_total = total
+        self.updated_at = timezone.now()
+        Job.objects.filter(pk=self.pk).update(
+            progress_done=self.progress_done,
+            progress_total=self.progress_total,
+            updated_at=self.updated_at,
+        )
+
+
+@receiver(pre_save, sender=Profile)
+@receiver(pre_save, sender=Subscription)
+@receiver(pre_save, sender=Bill)
+@receiver(pre_save, sender=Transaction)
+def assign_organization(sender, instance, raw: bool = False, **kwargs) -> None:
+    """Stamp new tenant rows with the current organization, or their customer's."""
+
+    if raw or not instance._state.adding or instance.organization_id is not None:
+        return
+    organization = get_current_organization()
+    if organization is not None:
+        instance.organization_id = organization.pk
+    elif sender is Transaction:
+        instance.organization_id = instance.bill.organization_id
+    elif sender is not Profile:
+        instance.organization_id = (
+            Profile.objects.filter(user_id=instance.user_id).values_list("organization_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Bill)
+def record_bill_created(sender, instance: Bill, created: bool, raw: bool = False, **kwargs) -> None:
+    if not created or raw:
+        return
+    kind = BillingEvent.KIND_RENEWAL_GENERATED if instance.subscription_id else BillingEvent.KIND_BILL_CREATED
+    record(
+        kind,
+        user=instance.user_id,
+        bill=instance,
+        subscription=instance.subscription_id,
+        actor=instance.created_by_id,
+        amount=instance.amount,
+        due_date=str(instance.due_date),
+    )
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def create_or_update_profile(sender, instance: User, created: bool, **kwargs) -> None:
+def create_or_update_profile(sender, instance: User, created: bool, update_fields=None, **kwargs) -> None:
+    # ``login()`` saves only ``last_login``; skip the profile lookup on that hot path.
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
     if created:
         Profile.objects.create(user=instance, full_name=instance.get_full_name())
     else:
@@ -0,0 +1,136 @@
+"""Money stored as integer minor units (paise/cents).
+
+``MoneyField`` keeps amounts in a ``BIGINT`` column so ``SUM``/``AVG`` run on
+native integers and indexes stay small, while Python code, forms, templates
+and the admin keep working with two-decimal :class:`Money` values.
+
+``Sum``, ``Min`` and ``Max`` over a ``MoneyField`` return ``Money``. ``Avg``
+and arithmetic (``F("amount") * 2``) resolve to plain numeric fields and would
+return minor units: use :class:`MoneyAvg`, and give arithmetic
+``output_field=MoneyField()``::
+
+    Bill.objects.aggregate(average=MoneyAvg("amount"))
+    Bill.objects.annotate(double=ExpressionWrapper(F("amount") * 2, output_field=MoneyField()))
+"""
+
+from __future__ import annotations
+
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django import forms
+from django.core import exceptions
+from django.db import models
+from django.db.models import Avg
+
+
+MINOR_UNITS = 100
+_CENT = Decimal("0.01")
+
+
+class Money(Decimal):
+    """A ``Decimal`` always quantised to two places.
+
+    Being a ``Decimal`` it formats, compares and serialises exactly like the
+    old ``DecimalField`` values (``floatformat``, ``JsonResponse``, ``float()``).
+    Values with more than two decimal places raise ``ValueError``; use
+    :meth:`rounded` to round them half up on purpose.
+    """
+
+    def __new__(cls, value="0"):
+        decimal = _to_decimal(value)
+        money = decimal.quantize(_CENT)
+        if money != decimal:
+            raise ValueError(f"{value!r} has more than two decimal places.")
+        return super().__new__(cls, money)
+
+    @classmethod
+    def rounded(cls, value) -> "Money":
+        return cls(_to_decimal(value).quantize(_CENT, rounding=ROUND_HALF_UP))
+
+    @classmethod
+    def from_minor(cls, minor) -> "Money":
+        """Convert minor units; fractions (from ``AVG``) are rounded half up."""
+
+        return cls.rounded(_to_decimal(minor) / MINOR_UNITS)
+
+    @property
+    def minor(self) -> int:
+        return int(self * MINOR_UNITS)
+
+    def __repr__(self) -> str:
+        return f"Money('{self}')"
+
+
+def _to_decimal(value) -> Decimal:
+    if isinstance(value, float):
+        value = repr(value)
+    return Decimal(value)
+
+
+class MoneyField(models.BigIntegerField):
+    description = "Amount of money stored in minor units"
+    default_error_messages = {
+        "decimal_places": "“%(value)s” has more than two decimal places.",
+    }
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Money.from_minor(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Money):
+            return value
+        try:
+            decimal = _to_decimal(value)
+        except (InvalidOperation, TypeError, ValueError):
+            raise exceptions.ValidationError(
+                self.error_messages["invalid"],
+                code="invalid",
+                params={"value": value},
+            )
+        try:
+            return Money(decimal)
+        except InvalidOperation:
+            raise exceptions.ValidationError(
+                self.error_messages["invalid"],
+                code="invalid",
+                params={"value": value},
+            )
+        except ValueError:
+            raise exceptions.ValidationError(
+                self.error_messages["decimal_places"],
+                code="decimal_places",
+                params={"value": value},
+            )
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, "resolve_expression"):
+            return value
+        return self.to_python(value).minor
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return "" if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        return super(models.BigIntegerField, self).formfield(
+            **{
+                "form_class": forms.DecimalField,
+                "max_digits": 17,
+                "decimal_places": 2,
+                **kwargs,
+            }
+        )
+
+
+class MoneyAvg(Avg):
+    """``Avg`` of a ``MoneyField`` as ``Money``, rounded half up to the cent."""
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, output_field=MoneyField(), **extra)
+
+    @property
+    def convert_value(self):
+        # Integer output fields are cast with int(), which would truncate the average.
+        return self._convert_value_noop
@@ -0,0 +1,90 @@
+"""Transactional outbox for webhook deliveries.
+
+:func:`~billingapp.events.record` hands every billing event to
+:func:`publish`, which writes one :class:`~billingapp.models.OutboxMessage`
+per interested endpoint in ``WEBHOOK_ENDPOINTS``. The insert runs in the
+caller's transaction, so a message exists exactly when the bill or payment
+change it describes was committed, and no downstream system is called on the
+request path. :mod:`billingapp.webhooks` delivers the messages.
+
+Bulk code paths wrap their transaction body in :func:`batched_outbox` to
+insert a chunk's messages with one ``bulk_create`` before the commit.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+_batch: ContextVar[list | None] = ContextVar("outbox_batch", default=None)
+
+
+def endpoints_for(kind: str) -> list[str]:
+    """Names of the endpoints subscribed to ``kind``; no ``events`` list means every kind."""
+
+    return [
+        name
+        for name, options in getattr(settings, "WEBHOOK_ENDPOINTS", {}).items()
+        if options.get("events") is None or kind in options["events"]
+    ]
+
+
+def event_payload(event) -> dict:
+    return {
+        "type": event.kind,
+        "occurred_at": event.created_at.isoformat(),
+        "customer_id": event.user_id,
+        "bill_id": event.bill_id,
+        "subscription_id": event.subscription_id,
+        "actor_id": event.actor_id,
+        "amount": None if event.amount is None else str(event.amount),
+        "data": event.data,
+    }
+
+
+def publish(event) -> None:
+    """Queue ``event`` (an unsaved ``BillingEvent``) for every subscribed endpoint."""
+
+    endpoints = endpoints_for(event.kind)
+    if not endpoints:
+        return
+
+    from .models import OutboxMessage
+
+    payload = event_payload(event)
+    messages = [
+        OutboxMessage(endpoint=name, kind=event.kind, customer_id=event.user_id, payload=payload)
+        for name in endpoints
+    ]
+    batch = _batch.get()
+    if batch is not None:
+        batch.extend(messages)
+    else:
+        OutboxMessage.objects.bulk_create(messages)
+
+
+@contextmanager
+def batched_outbox():
+    """Insert the messages published in the block with one ``bulk_create`` at its end.
+
+    Use it inside ``transaction.atomic()`` so the insert still commits with
+    the changes. Nested blocks share the outermost batch.
+    """
+
+    if _batch.get() is not None:
+        yield
+        return
+
+    from .models import OutboxMessage
+
+    token = _batch.set([])
+    try:
+        yield
+        messages = _batch.get()
+        if messages:
+            OutboxMessage.objects.bulk_create(messages, batch_size=500)
+    finally:
+        _batch.reset(token)
@@ -0,0 +1,178 @@
+"""Payment gateways and asynchronous settlement.
+
+:func:`start_payment` records a ``pending`` transaction and hands it to the
+gateway named by ``settings.PAYMENT_GATEWAY`` once the database transaction
+commits, so the request returns without waiting for the gateway. Gateways
+report the outcome through :func:`settle`, which moves a pending transaction
+to ``success`` (marking the bill paid) or ``failed`` exactly once.
+
+:class:`SimulatedGateway` is a local stand-in for load testing: it queues a
+``settle_payment`` job that runs after a random latency, declines a share of
+payments and raises :class:`GatewayUnavailable` for another share. The job
+queue retries those with exponential backoff; a payment whose retries run out
+is failed. :class:`InstantGateway` settles during the request.
+
+A payment still pending ``PAYMENT_PENDING_TIMEOUT`` minutes after it started
+(its settlement job was lost, or the worker is down) is failed when the
+customer next tries to pay the bill, so a bill is never locked for good; a
+late outcome for it is ignored.
+"""
+
+from __future__ import annotations
+
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .events import record
+from .models import Bill, BillingEvent, Transaction
+
+
+class PaymentError(Exception):
+    """The payment cannot be started; the message is safe to show to the customer."""
+
+
+class GatewayUnavailable(Exception):
+    """A transient gateway error; the settlement is retried."""
+
+
+class PaymentGateway:
+    method = Transaction.METHOD_SIMULATED
+
+    def submit(self, payment: Transaction) -> None:
+        """Start charging ``payment``; the outcome must eventually reach :func:`settle`."""
+
+        raise NotImplementedError
+
+    def charge(self, payment_id: int) -> tuple[bool, str]:
+        """One settlement attempt for gateways settled by the ``settle_payment`` job.
+
+        Returns ``(succeeded, reason)`` or raises :class:`GatewayUnavailable`.
+        """
+
+        raise NotImplementedError
+
+
+class InstantGateway(PaymentGateway):
+    """Approves every payment immediately, inside the request."""
+
+    def submit(self, payment: Transaction) -> None:
+        settle(payment.pk, *self.charge(payment.pk))
+
+    def charge(self, payment_id: int) -> tuple[bool, str]:
+        return True, ""
+
+
+class SimulatedGateway(PaymentGateway):
+    """Settles in the background after ``latency`` seconds with configurable failures.
+
+    ``failure_rate`` is the share of payments declined; ``error_rate`` the share
+    of settlement attempts that hit a transient error and are retried, up to
+    ``max_attempts`` attempts in total.
+    """
+
+    def __init__(self, latency=(0.5, 3.0), failure_rate=0.05, error_rate=0.02, max_attempts=4, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.max_attempts = max_attempts
+        self.random = random.Random(seed)
+
+    def submit(self, payment: Transaction) -> None:
+        from .jobs import enqueue
+
+        delay = timedelta(seconds=self.random.uniform(*self.latency))
+        enqueue(
+            "settle_payment",
+            {"transaction_id": payment.pk},
+            max_attempts=self.max_attempts,
+            run_after=timezone.now() + delay,
+        )
+
+    def charge(self, payment_id: int) -> tuple[bool, str]:
+        """Decide the outcome of one settlement attempt."""
+
+        if self.random.random() < self.error_rate:
+            raise GatewayUnavailable("Simulated gateway timeout.")
+        if self.random.random() < self.failure_rate:
+            return False, "Declined by the simulated gateway."
+        return True, ""
+
+
+def get_gateway() -> PaymentGateway:
+    gateway = import_string(getattr(settings, "PAYMENT_GATEWAY", "billingapp.payments.InstantGateway"))
+    return gateway(**getattr(settings, "PAYMENT_GATEWAY_OPTIONS", {}))
+
+
+def start_payment(bill: Bill, paid_by=None, gateway: PaymentGateway | None = None) -> Transaction:
+    """Create a pending transaction for ``bill`` and submit it to the gateway."""
+
+    gateway = gateway or get_gateway()
+    with transaction.atomic():
+        bill = Bill.objects.select_for_update().get(pk=bill.pk)
+        if bill.status == Bill.STATUS_PAID:
+            raise PaymentError("This bill is already paid.")
+        stale_before = timezone.now() - timedelta(minutes=getattr(settings, "PAYMENT_PENDING_TIMEOUT", 30))
+        for pk, started in bill.transactions.filter(status=Transaction.STATUS_PENDING).values_list("pk", "payment_date"):
+            if started >= stale_before:
+                raise PaymentError("A payment for this bill is already being processed.")
+            settle(pk, succeeded=False, reason="Timed out waiting for the payment gateway.")
+        payment = Transaction.objects.create(
+            user_id=bill.user_id,
+            bill=bill,
+            amount=bill.amount,
+            method=gateway.method,
+            status=Transaction.STATUS_PENDING,
+            processed_by=paid_by,
+            reference=uuid.uuid4().hex,
+            **Transaction.bill_snapshot(bill.title, bill.bill_type, bill.due_date),
+        )
+        transaction.on_commit(lambda: gateway.submit(payment))
+    return payment
+
+
+def settle(payment_id: int, succeeded: bool, reason: str = "") -> Transaction | None:
+    """Record the gateway's outcome; returns ``None`` if the payment was already settled."""
+
+    bill_id = Transaction.objects.filter(pk=payment_id).values_list("bill_id", flat=True).first()
+    if bill_id is None:
+        return None
+    with transaction.atomic():
+        # Lock the bill before the payment, in the same order as start_payment,
+        # so a retried payment and its settlement cannot deadlock.
+        bill = Bill.objects.select_for_update().get(pk=bill_id)
+        payment = (
+            Transaction.objects.select_for_update()
+            .filter(pk=payment_id, status=Transaction.STATUS_PENDING)
+            .first()
+        )
+        if payment is None:
+            return None
+
+        now = timezone.now()
+        if succeeded and bill.status == Bill.STATUS_PAID:
+            succeeded, reason = False, "The bill was already paid."
+
+        if succeeded:
+            bill.status = Bill.STATUS_PAID
+            bill.paid_at = now
+            bill.save(update_fields=["status", "paid_at", "updated_at"])
+            payment.status = Transaction.STATUS_SUCCESS
+            kind = BillingEvent.KIND_BILL_PAID
+        else:
+            payment.status = Transaction.STATUS_FAILED
+            payment.failure_reason = reason[:200]
+            kind = BillingEvent.KIND_PAYMENT_FAILED
+        payment.settled_at = now
+        payment.save(update_fields=["status", "failure_reason", "settled_at", "updated_at"])
+
+        data = {"method": payment.method, "reference": payment.reference}
+        if reason:
+            data["reason"] = reason
+        record(kind, user=payment.user_id, bill=bill, actor=payment.processed_by_id, amount=payment.amount, **data)
+    return payment
@@ -0,0 +1,141 @@
+"""Due-date and overdue reminder emails.
+
+Unpaid bills that are due within a few days, or already overdue, are read with
+one range query on the ``(status, due_date)`` index, grouped into a single
+digest per customer and sent in chunks over one email connection. Every bill
+included in a digest is recorded in :class:`~billingapp.models.BillReminder`,
+so later runs skip it.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Bill, BillReminder
+
+
+@dataclass
+class Digest:
+    user: object
+    due_soon: list = field(default_factory=list)
+    overdue: list = field(default_factory=list)
+
+    @property
+    def bills(self) -> list:
+        return self.overdue + self.due_soon
+
+
+def reminder_kind(bill: Bill, today: date) -> str:
+    return BillReminder.KIND_OVERDUE if bill.due_date < today else BillReminder.KIND_DUE_SOON
+
+
+def pending_reminders(today: date, days: int):
+    """Unpaid bills due by ``today + days`` that have no reminder of their current kind yet."""
+
+    already_sent = BillReminder.objects.filter(bill=OuterRef("pk")).filter(
+        Q(kind=BillReminder.KIND_OVERDUE, bill__due_date__lt=today)
+        | Q(kind=BillReminder.KIND_DUE_SOON, bill__due_date__gte=today)
+    )
+    return (
+        Bill.objects.filter(status=Bill.STATUS_UNPAID, due_date__lte=today + timedelta(days=days))
+        .exclude(user__email="")
+        .filter(~Exists(already_sent))
+        .select_related("user", "user__profile")
+        .order_by("user_id", "due_date", "pk")
+    )
+
+
+def build_digests(bills, today: date):
+    """Group bills (ordered by user) into one :class:`Digest` per customer."""
+
+    for _user_id, user_bills in groupby(bills, key=lambda bill: bill.user_id):
+        user_bills = list(user_bills)
+        digest = Digest(user=user_bills[0].user)
+        for bill in user_bills:
+            if reminder_kind(bill, today) == BillReminder.KIND_OVERDUE:
+                digest.overdue.append(bill)
+            else:
+                digest.due_soon.append(bill)
+        yield digest
+
+
+def render_digest(digest: Digest, today: date) -> EmailMessage:
+    user = digest.user
+    profile = getattr(user, "profile", None)
+    context = {
+        "name": (profile.full_name if profile else "") or user.get_username(),
+        "due_soon": digest.due_soon,
+        "overdue": digest.overdue,
+        "today": today,
+        "total": sum(bill.amount for bill in digest.bills),
+        "portal_url": settings.SITE_URL.rstrip("/") + reverse("customerportal:dashboard"),
+    }
+    if digest.overdue:
+        subject = f"{len(digest.overdue)} overdue bill(s) on your account"
+    else:
+        subject = f"{len(digest.due_soon)} bill(s) due soon"
+    return EmailMessage(
+        subject=subject,
+        body=render_to_string("emails/bill_reminder.txt", context),
+        to=[user.email],
+    )
+
+
+def send_reminders(days: int = 3, chunk_size: int = 100, today: date | None = None, dry_run: bool = False) -> dict:
+    """Send reminder digests and return ``{"customers": ..., "bills": ...}`` counts.
+
+    Sent-log rows for a chunk are written in the same transaction that sends
+    it, so a failed send leaves those bills eligible for the next run.
+    """
+
+    today = today or timezone.localdate()
+    totals = {"customers": 0, "bills": 0}
+    batch: list[Digest] = []
+
+    connection = None if dry_run else get_connection()
+    if connection is not None:
+        connection.open()
+    try:
+        for digest in build_digests(pending_reminders(today, days).iterator(chunk_size=2000), today):
+            batch.append(digest)
+            if len(batch) >= chunk_size:
+                _send_batch(batch, today, connection)
+                _count(totals, batch)
+                batch = []
+        if batch:
+            _send_batch(batch, today, connection)
+            _count(totals, batch)
+    finally:
+        if connection is not None:
+            connection.close()
+    return totals
+
+
+def _count(totals: dict, batch: list[Digest]) -> None:
+    totals["customers"] += len(batch)
+    totals["bills"] += sum(len(digest.bills) for digest in batch)
+
+
+def _send_batch(batch: list[Digest], today: date, connection) -> None:
+    if connection is None:
+        return
+    with transaction.atomic():
+        BillReminder.objects.bulk_create(
+            [
+                BillReminder(bill=bill, kind=reminder_kind(bill, today))
+                for digest in batch
+                for bill in digest.bills
+            ],
+            ignore_conflicts=True,
+        )
+        connection.send_messages([render_digest(digest, today) for digest in batch])
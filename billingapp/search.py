@@ -0,0 +1,213 @@
+"""Indexed search over customers and bills.
+
+PostgreSQL: ``icontains`` filters are served by trigram GIN indexes on
+``UPPER(column)`` (the exact expression Django generates), and matches are
+ranked with trigram word similarity.
+
+SQLite: an FTS5 table, kept current by triggers, holds one row per customer
+(username, full name and phone), subscription (name) and bill (title). Row ids encode the
+source row so triggers update entries by rowid instead of scanning. Matches
+are restricted to the current organization inside the FTS query, so the
+``limit`` best matches are all usable.
+
+:func:`autocomplete_customers` serves the customer picker with username
+prefixes only: ``istartswith`` (the trigram index serves ``LIKE 'X%'``) on
+PostgreSQL, and on SQLite a prefix query on the FTS ``name`` column whose
+hits are anchored to the start of the username.
+
+The ``*_id_filter`` helpers used by Django admin searches return subqueries
+rather than id lists, so a changelist shows every match, not the best few.
+
+Other backends fall back to unindexed ``icontains``. The schema objects are
+created by migrations ``0005_search_indexes`` and ``0017_search_index_columns``.
+"""
+
+from __future__ import annotations
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+from .models import Bill, Subscription
+from .tenancy import scoped_customers
+
+
+FTS_TABLE = "billingapp_search_index"
+FTS_KIND_USER = 1
+FTS_KIND_SUBSCRIPTION = 2
+FTS_KIND_BILL = 3
+FTS_ROWID_STRIDE = 4
+
+# Shorter prefixes match too much of the table to be worth a round trip.
+AUTOCOMPLETE_MIN_LENGTH = 2
+
+
+def _normalise(query: str) -> str:
+    return " ".join(query.split())
+
+
+def _fts_expression(query: str, column: str | None = None) -> str:
+    """Turn free text into an FTS5 query matching every word as a prefix, optionally in one column."""
+
+    expression = " ".join(f'"{token}"*' for token in re.findall(r"\w+", query))
+    if column and expression:
+        return f"{column} : ({expression})"
+    return expression
+
+
+def _fts_ids(query: str, kind: int, limit: int, within, column: str | None = None) -> list[int]:
+    """Ids of the best ``limit`` matches of ``kind`` that are rows of the queryset ``within``."""
+
+    expression = _fts_expression(query, column)
+    if not expression:
+        return []
+    # A correlated EXISTS keeps other tenants' (and staff) rows out before the limit applies.
+    member_sql, member_params = (
+        within.filter(pk=RawSQL(f"{FTS_TABLE}.rowid / {FTS_ROWID_STRIDE}", ())).values("pk").query.sql_with_params()
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid / {FTS_ROWID_STRIDE} FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid %% {FTS_ROWID_STRIDE} = %s AND EXISTS ({member_sql}) "
+            "ORDER BY rank LIMIT %s",
+            [expression, kind, *member_params, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fts_matches(query: str, kind: int, within):
+    """Every row of the queryset ``within`` matching ``query``, unranked and uncapped."""
+
+    expression = _fts_expression(query)
+    if not expression:
+        return within.none()
+    return within.filter(
+        pk__in=RawSQL(
+            f"SELECT rowid / {FTS_ROWID_STRIDE} FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid %% {FTS_ROWID_STRIDE} = %s",
+            (expression, kind),
+        )
+    )
+
+
+def _customer_match(query: str) -> Q:
+    return Q(username__icontains=query) | Q(profile__full_name__icontains=query) | Q(profile__phone__icontains=query)
+
+
+def _in_rank_order(objects, ids: list[int]) -> list:
+    position = {pk: index for index, pk in enumerate(ids)}
+    return sorted(objects, key=lambda obj: position[obj.pk])
+
+
+def search_customers(query: str, limit: int = 20) -> list:
+    """Return non-staff users whose username, full name or phone match ``query``, best first."""
+
+    query = _normalise(query)
+    if not query:
+        return []
+    customers = scoped_customers().select_related("profile")
+
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return list(
+            customers.filter(_customer_match(query))
+            .annotate(
+                rank=Greatest(
+                    TrigramWordSimilarity(query, "username"),
+                    TrigramWordSimilarity(query, "profile__full_name"),
+                    TrigramWordSimilarity(query, "profile__phone"),
+                )
+            )
+            .order_by("-rank", "username")[:limit]
+        )
+
+    if connection.vendor == "sqlite":
+        ids = _fts_ids(query, FTS_KIND_USER, limit, scoped_customers())
+        return _in_rank_order(customers.filter(pk__in=ids), ids)
+
+    return list(customers.filter(_customer_match(query)).order_by("username")[:limit])
+
+
+def autocomplete_customers(query: str, limit: int = 10) -> list:
+    """Return non-staff users whose username starts with ``query``.
+
+    Queries shorter than ``AUTOCOMPLETE_MIN_LENGTH`` return nothing.
+    """
+
+    query = _normalise(query)
+    if len(query) < AUTOCOMPLETE_MIN_LENGTH:
+        return []
+    customers = scoped_customers().select_related("profile")
+
+    if connection.vendor == "sqlite":
+        # FTS matches the start of any word ("doe" finds "john.doe"); anchoring
+        # the candidates before the limit keeps the same results as PostgreSQL.
+        within = scoped_customers().filter(username__istartswith=query)
+        ids = _fts_ids(query, FTS_KIND_USER, limit, within, column="name")
+        return _in_rank_order(customers.filter(pk__in=ids), ids)
+
+    return list(customers.filter(username__istartswith=query).order_by("username")[:limit])
+
+
+def search_bills(query: str, limit: int = 20) -> list:
+    """Return bills whose title matches ``query``, best first."""
+
+    query = _normalise(query)
+    if not query:
+        return []
+    bills = Bill.scoped.select_related("user")
+
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return list(
+            bills.filter(title__icontains=query)
+            .annotate(rank=TrigramWordSimilarity(query, "title"))
+            .order_by("-rank", "-due_date")[:limit]
+        )
+
+    if connection.vendor == "sqlite":
+        ids = _fts_ids(query, FTS_KIND_BILL, limit, Bill.scoped.all())
+        return _in_rank_order(bills.filter(pk__in=ids), ids)
+
+    return list(bills.filter(title__icontains=query).order_by("-due_date")[:limit])
+
+
+def customer_id_filter(query: str, field: str = "user_id") -> Q:
+    """``Q`` restricting ``field`` to every matching customer, as a subquery."""
+
+    query = _normalise(query)
+    customers = scoped_customers()
+    if connection.vendor == "sqlite":
+        matches = _fts_matches(query, FTS_KIND_USER, customers)
+    else:
+        matches = customers.filter(_customer_match(query))
+    return Q(**{f"{field}__in": matches.values("pk")})
+
+
+def bill_id_filter(query: str, field: str = "pk") -> Q:
+    """``Q`` restricting ``field`` to every bill with a matching title, as a subquery."""
+
+    query = _normalise(query)
+    bills = Bill.scoped.all()
+    if connection.vendor == "sqlite":
+        matches = _fts_matches(query, FTS_KIND_BILL, bills)
+    else:
+        matches = bills.filter(title__icontains=query)
+    return Q(**{f"{field}__in": matches.values("pk")})
+
+
+def subscription_id_filter(query: str, field: str = "pk") -> Q:
+    """``Q`` restricting ``field`` to every subscription with a matching name, as a subquery."""
+
+    query = _normalise(query)
+    subscriptions = Subscription.scoped.all()
+    if connection.vendor == "sqlite":
+        matches = _fts_matches(query, FTS_KIND_SUBSCRIPTION, subscriptions)
+    else:
+        matches = subscriptions.filter(name__icontains=query)
+    return Q(**{f"{field}__in": matches.values("pk")})
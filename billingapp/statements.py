@@ -0,0 +1,244 @@
+"""Monthly customer statements.
+
+:func:`generate_statements` walks customers in primary-key chunks. Each chunk
+is read with one query per table (customers, the month's bills, the month's
+transactions, outstanding balances) and turned into plain dictionaries, which
+a process pool renders to HTML and plain text while the parent process reads
+the next chunk.
+
+Rendered documents are stored content-addressed under ``STATEMENTS_ROOT`` as
+``<digest[:2]>/<digest>.<ext>`` where ``digest`` is the SHA-256 of the file.
+Identical documents share one file, re-running a month only writes what
+changed, and downloads are served straight from disk by the digest recorded
+on :class:`~billingapp.models.Statement`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import os
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Sum
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import BILL_TYPE_CHOICES, Bill, Statement, Transaction
+from .money import Money
+from .tenancy import scoped_customers
+
+
+FORMATS = {
+    "html": ("statements/statement.html", "text/html; charset=utf-8"),
+    "txt": ("statements/statement.txt", "text/plain; charset=utf-8"),
+}
+
+User = get_user_model()
+
+
+def parse_month(value: str) -> date:
+    """``"2026-09"`` -> ``date(2026, 9, 1)``."""
+
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def previous_month(today: date | None = None) -> date:
+    today = today or timezone.localdate()
+    return (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def month_end(month: date) -> date:
+    """First day of the month after ``month``."""
+
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def statement_path(digest: str, fmt: str, root=None) -> Path:
+    return Path(root or settings.STATEMENTS_ROOT) / digest[:2] / f"{digest}.{fmt}"
+
+
+def store(content: str, fmt: str, root=None) -> str:
+    """Write ``content`` under its digest unless that file already exists."""
+
+    data = content.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = statement_path(digest, fmt, root)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        partial.write_bytes(data)
+        os.replace(partial, path)
+    return digest
+
+
+def build_contexts(user_ids, month: date, include_empty: bool = False) -> list[dict]:
+    """Template contexts for the given customers, read with one query per table."""
+
+    end = month_end(month)
+    period = (
+        timezone.make_aware(datetime.combine(month, time.min)),
+        timezone.make_aware(datetime.combine(end, time.min)),
+    )
+    statuses = dict(Bill.STATUS_CHOICES)
+    bill_types = dict(BILL_TYPE_CHOICES)
+
+    bills = defaultdict(list)
+    for row in (
+        Bill.objects.filter(user_id__in=user_ids, due_date__gte=month, due_date__lt=end)
+        .order_by("user_id", "due_date", "pk")
+        .values("user_id", "id", "title", "bill_type", "amount", "due_date", "status", "paid_at")
+    ):
+        row["status_label"] = statuses.get(row["status"], row["status"])
+        row["type_label"] = bill_types.get(row["bill_type"], row["bill_type"])
+        bills[row["user_id"]].append(row)
+
+    transactions = defaultdict(list)
+    for row in (
+        Transaction.objects.filter(user_id__in=user_ids, payment_date__gte=period[0], payment_date__lt=period[1])
+        .order_by("user_id", "payment_date", "pk")
+        .values("user_id", "id", "bill_title", "amount", "payment_date", "method", "status")
+    ):
+        transactions[row["user_id"]].append(row)
+
+    outstanding = dict(
+        Bill.objects.filter(user_id__in=user_ids, status=Bill.STATUS_UNPAID, due_date__lt=end)
+        .order_by()
+        .values("user_id")
+        .annotate(total=Sum("amount"))
+        .values_list("user_id", "total")
+    )
+
+    contexts = []
+    customers = User.objects.filter(pk__in=user_ids).order_by("pk").values(
+        "pk", "username", "email", "profile__full_name", "profile__address"
+    )
+    for customer in customers:
+        user_id = customer["pk"]
+        if not include_empty and not (bills[user_id] or transactions[user_id] or outstanding.get(user_id)):
+            continue
+        contexts.append(
+            {
+                "user_id": user_id,
+                "name": customer["profile__full_name"] or customer["username"],
+                "email": customer["email"],
+                "address": customer["profile__address"] or "",
+                "month": month,
+                "period_end": end - timedelta(days=1),
+                "bills": bills[user_id],
+                "transactions": transactions[user_id],
+                "total_billed": Money(sum(row["amount"] for row in bills[user_id])),
+                "total_paid": Money(
+                    sum(row["amount"] for row in transactions[user_id] if row["status"] == Transaction.STATUS_SUCCESS)
+                ),
+                "outstanding": Money(outstanding.get(user_id) or 0),
+            }
+        )
+    return contexts
+
+
+def render_statements(contexts: list[dict], root=None) -> list[tuple[str, str]]:
+    """Render and store each context; returns ``(html_digest, text_digest)`` pairs."""
+
+    return [
+        (
+            store(render_to_string(FORMATS["html"][0], context), "html", root),
+            store(render_to_string(FORMATS["txt"][0], context), "txt", root),
+        )
+        for context in contexts
+    ]
+
+
+def save_statements(contexts: list[dict], digests: list[tuple[str, str]]) -> int:
+    statements = [
+        Statement(
+            user_id=context["user_id"],
+            month=context["month"],
+            html_digest=html_digest,
+            text_digest=text_digest,
+            total_billed=context["total_billed"],
+            total_paid=context["total_paid"],
+            outstanding=context["outstanding"],
+        )
+        for context, (html_digest, text_digest) in zip(contexts, digests)
+    ]
+    Statement.objects.bulk_create(
+        statements,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=["user", "month"],
+        update_fields=["html_digest", "text_digest", "total_billed", "total_paid", "outstanding", "generated_at"],
+    )
+    return len(statements)
+
+
+def _customer_chunks(customers, chunk_size: int):
+    last_pk = 0
+    while True:
+        ids = list(customers.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+
+
+def generate_statements(month: date, customers=None, chunk_size: int = 1000, workers: int | None = None) -> dict:
+    """Render statements for every customer with activity in ``month``.
+
+    Returns ``{"customers": ..., "statements": ...}``. ``workers`` defaults to
+    ``STATEMENT_WORKERS`` (or the CPU count); ``0`` or ``1`` renders in
+    this process.
+    """
+
+    customers = scoped_customers() if customers is None else customers
+    if workers is None:
+        workers = getattr(settings, "STATEMENT_WORKERS", None) or os.cpu_count() or 1
+    totals = {"customers": 0, "statements": 0}
+
+    if workers <= 1:
+        for ids in _customer_chunks(customers, chunk_size):
+            contexts = build_contexts(ids, month)
+            totals["customers"] += len(ids)
+            totals["statements"] += save_statements(contexts, render_statements(contexts))
+        return totals
+
+    # Workers only render; they never touch the database, and settings
+    # overridden at runtime do not reach them, so the output root is passed in.
+    # The initializer must not import this module: apps are not loaded yet.
+    root = Path(settings.STATEMENTS_ROOT)
+    connections.close_all()
+    pending = deque()
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=django.setup
+    ) as pool:
+        for ids in _customer_chunks(customers, chunk_size):
+            contexts = build_contexts(ids, month)
+            totals["customers"] += len(ids)
+            pending.append((contexts, pool.submit(render_statements, contexts, root)))
+            # Bound the rendered-but-unsaved backlog so memory stays flat.
+            while len(pending) > workers * 2:
+                contexts, future = pending.popleft()
+                totals["statements"] += save_statements(contexts, future.result())
+        while pending:
+            contexts, future = pending.popleft()
+            totals["statements"] += save_statements(contexts, future.result())
+    return totals
+
+
+def statement_for(user, month: date) -> Statement:
+    """The stored statement for ``user`` and ``month``, rendered now if missing."""
+
+    statement = Statement.objects.filter(user=user, month=month).first()
+    if statement is not None and all(statement_path(statement.digest(fmt), fmt).exists() for fmt in FORMATS):
+        return statement
+
+    contexts = build_contexts([user.pk], month, include_empty=True)
+    save_statements(contexts, render_statements(contexts))
+    return Statement.objects.get(user=user, month=month)
@@ -0,0 +1,34 @@
+"""Background job handlers for the billing domain."""
+
+from django.contrib.auth import get_user_model
+
+from .bulkbills import assign_bills, segment_customers
+from .jobs import job_handler
+from .payments import GatewayUnavailable, get_gateway, settle
+from .utils import ensure_subscription_bills
+
+
+@job_handler("ensure_subscription_bills")
+def generate_subscription_bills(job, user_id=None):
+    user = get_user_model().objects.get(pk=user_id) if user_id is not None else None
+    return {"generated": ensure_subscription_bills(user)}
+
+
+@job_handler("assign_bills")
+def assign_bills_to_segment(job, batch, bill, segment, subscription_type="", customer_ids=None):
+    customers = segment_customers(segment, subscription_type, customer_ids)
+    return assign_bills(customers, bill, batch, created_by=job.created_by_id, progress=job.set_progress)
+
+
+@job_handler("settle_payment")
+def settle_payment(job, transaction_id):
+    try:
+        succeeded, reason = get_gateway().charge(transaction_id)
+    except Exception as exc:
+        # Let the queue retry with backoff; fail the payment on the last attempt
+        # so it does not stay pending after the job gives up.
+        if job.attempts < job.max_attempts:
+            raise
+        succeeded, reason = False, str(exc) if isinstance(exc, GatewayUnavailable) else "The payment could not be processed."
+    payment = settle(transaction_id, succeeded, reason)
+    return {"status": payment.status if payment else "already settled"}
@@ -0,0 +1,123 @@
+"""Per-request organization (tenant) resolution and scoping.
+
+:class:`TenantMiddleware` resolves the organization for each request, first
+from the host name (``Organization.domain``) and then from the signed-in
+user's profile, and makes it current for the rest of the request. Signed-in
+users get a 403 on the host name of an organization they do not belong to,
+unless they are superusers. Tenant data is read through the ``scoped``
+managers on ``Bill``, ``Subscription``, ``Transaction``, ``Profile`` and
+``Job``, which filter by the current organization;
+``objects`` stays unscoped for the Django admin, migrations and superusers.
+New rows pick up the current organization (or their customer's) on save.
+
+An organization with ``database`` set is served from that database alias by
+``billingplatform.routers.TenantRouter`` when the router is enabled.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import PermissionDenied
+from django.db import models
+
+
+_current: ContextVar = ContextVar("current_organization", default=None)
+
+
+def get_current_organization():
+    return _current.get()
+
+
+@contextmanager
+def use_organization(organization):
+    """Make ``organization`` (or ``None`` for all tenants) current within the block."""
+
+    token = _current.set(organization)
+    try:
+        yield organization
+    finally:
+        _current.reset(token)
+
+
+class TenantQuerySet(models.QuerySet):
+    def for_organization(self, organization):
+        return self.filter(organization=organization)
+
+
+class TenantManager(models.Manager):
+    """Rows of the current organization; every row when no organization is active."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        organization = get_current_organization()
+        if organization is None:
+            return queryset
+        return queryset.filter(organization=organization)
+
+
+def scoped_customers():
+    """Non-staff users belonging to the current organization."""
+
+    customers = get_user_model().objects.filter(is_staff=False)
+    organization = get_current_organization()
+    if organization is None:
+        return customers
+    return customers.filter(profile__organization=organization)
+
+
+def is_member(user, organization) -> bool:
+    from .models import Profile
+
+    # The profile lives on the organization's database when it has its own.
+    with use_organization(organization):
+        return Profile.objects.filter(user_id=user.pk, organization=organization).exists()
+
+
+def host_organization(request):
+    """The organization whose ``domain`` is the request's host name, if any."""
+
+    from .models import Organization
+
+    host = request.get_host().split(":")[0].lower()
+    return Organization.objects.using("default").filter(domain=host).first()
+
+
+def resolve_organization(request, organization=None):
+    """Check the signed-in user against the host's ``organization``, or find theirs.
+
+    Call it with ``organization`` current: a tenant with its own database keeps
+    its users there, so ``request.user`` must be loaded inside its context.
+    """
+
+    from .models import Organization
+
+    user = request.user
+    if organization is not None:
+        if user.is_authenticated and not user.is_superuser and not is_member(user, organization):
+            raise PermissionDenied("This account does not belong to this organization.")
+        return organization
+
+    if user.is_authenticated:
+        return Organization.objects.using("default").filter(profiles__user_id=user.pk).first()
+    return None
+
+
+class TenantMiddleware:
+    """Resolve ``request.organization`` and make it current for the request.
+
+    The host's organization is made current before ``request.user`` is first
+    read, so the user is loaded from the tenant's database when it has one.
+    Keep this middleware ahead of any other that reads ``request.user``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with use_organization(host_organization(request)) as organization:
+            request.organization = resolve_organization(request, organization)
+        with use_organization(request.organization):
+            return self.get_response(request)
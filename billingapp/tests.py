@@ -1,3 +1,966 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import ExpressionWrapper, F, Max, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from billingplatform.routers import TenantRouter
+from billingplatform.testing import STORAGES
+
+from .events import buffered_events, flush, record
+from .jobs import claim_next_job, enqueue, job_handler, requeue_stale_jobs, retry_delay, run_job
+from .latefees import apply_late_fees, np
+from .models import Bill, BillingEvent, BillReminder, Job, Organization, OutboxMessage, Profile, Statement, Subscription, Transaction
+from .money import Money, MoneyAvg, MoneyField
+from .pagination import EstimatedCountPaginator
+from .payments import InstantGateway, PaymentError, settle, start_payment
+from .reminders import send_reminders
+from .search import (
+    autocomplete_customers,
+    bill_id_filter,
+    customer_id_filter,
+    search_bills,
+    search_customers,
+    subscription_id_filter,
+)
+from .statements import generate_statements, statement_for, statement_path, store
+from .tenancy import scoped_customers, use_organization
+from .webhooks import Dispatcher
+
+
+User = get_user_model()
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = 0
+        handlers = mock.patch.dict("billingapp.jobs._handlers")
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+        @job_handler("flaky")
+        def flaky(job, fail_times):
+            self.calls += 1
+            if self.calls <= fail_times:
+                raise RuntimeError("gateway timeout")
+            return {"calls": self.calls}
+
+    def run_next(self):
+        Job.objects.filter(status=Job.STATUS_QUEUED).update(run_after=timezone.now())
+        job = claim_next_job()
+        run_job(job)
+        job.refresh_from_db()
+        return job
+
+    def test_failed_attempts_are_retried_with_backoff(self):
+        enqueue("flaky", {"fail_times": 1}, max_attempts=2)
+
+        job = claim_next_job()
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_QUEUED, 1))
+        self.assertIn("gateway timeout", job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + retry_delay(1) - timedelta(seconds=5))
+        self.assertIsNone(claim_next_job())
+
+        job = self.run_next()
+        self.assertEqual((job.status, job.attempts, job.result), (Job.STATUS_SUCCEEDED, 2, {"calls": 2}))
+
+    def test_jobs_fail_after_their_last_attempt(self):
+        enqueue("flaky", {"fail_times": 5}, max_attempts=2)
+
+        self.run_next()
+        job = self.run_next()
+
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_stale_jobs_are_requeued_until_their_attempts_run_out(self):
+        stale = timezone.now() - timedelta(hours=1)
+        retry = Job.objects.create(name="flaky", status=Job.STATUS_RUNNING, attempts=1, max_attempts=3)
+        spent = Job.objects.create(name="flaky", status=Job.STATUS_RUNNING, attempts=3, max_attempts=3)
+        running = Job.objects.create(name="flaky", status=Job.STATUS_RUNNING, attempts=3, max_attempts=3)
+        Job.objects.filter(pk__in=[retry.pk, spent.pk]).update(updated_at=stale)
+
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=30)), (1, 1))
+
+        statuses = dict(Job.objects.values_list("pk", "status"))
+        self.assertEqual(
+            statuses,
+            {retry.pk: Job.STATUS_QUEUED, spent.pk: Job.STATUS_FAILED, running.pk: Job.STATUS_RUNNING},
+        )
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=30)), (0, 0))
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    def setUp(self):
+        handlers = mock.patch.dict("billingapp.jobs._handlers")
+        handlers.start()
+        self.addCleanup(handlers.stop)
+        self.recovered = []
+
+        @job_handler("slow")
+        def slow(job):
+            # Pretend the job started long ago, then outlive several heartbeats.
+            Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+            time.sleep(0.3)
+            self.recovered.append(requeue_stale_jobs(timedelta(minutes=30)))
+
+    @mock.patch("billingapp.jobs.HEARTBEAT_SECONDS", 0.05)
+    def test_running_jobs_are_not_reclaimed(self):
+        enqueue("slow")
+
+        job = claim_next_job()
+        run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(self.recovered, [(0, 0)])
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_SUCCEEDED, 1))
+
+
+class PurgeSessionsTests(TestCase):
+    def add_sessions(self, count, expire_date):
+        Session.objects.bulk_create(
+            Session(session_key=f"{expire_date:%Y%m%d%H%M%S}{i}", session_data="", expire_date=expire_date)
+            for i in range(count)
+        )
+
+    def test_expired_sessions_are_deleted_in_batches(self):
+        self.add_sessions(5, timezone.now() - timedelta(days=1))
+        self.add_sessions(2, timezone.now() + timedelta(days=1))
+        out = StringIO()
+
+        # Three batches of at most two rows, each a select and a delete, then the empty select.
+        with self.assertNumQueries(7):
+            call_command("purge_sessions", batch_size=2, stdout=out)
+
+        self.assertIn("Purged 5 expired session(s).", out.getvalue())
+        self.assertEqual(Session.objects.count(), 2)
+        self.assertFalse(Session.objects.filter(expire_date__lt=timezone.now()).exists())
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_engines_without_a_session_table_are_skipped(self):
+        self.add_sessions(1, timezone.now() - timedelta(days=1))
+        out = StringIO()
+
+        call_command("purge_sessions", stdout=out)
+
+        self.assertIn("does not store sessions in the database; nothing to purge.", out.getvalue())
+        self.assertEqual(Session.objects.count(), 1)
+
+
+class ProfileSignalTests(TestCase):
+    def test_profiles_are_created_with_the_user(self):
+        user = User.objects.create_user("customer", first_name="Ada", last_name="Lovelace")
+        self.assertEqual(Profile.objects.get(user=user).full_name, "Ada Lovelace")
+
+    def test_login_saves_only_last_login_without_a_profile_query(self):
+        user = User.objects.create_user("customer", password="secret")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.client.login(username="customer", password="secret"))
+
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_login)
+        updates = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "auth_user"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('SET "last_login"', updates[0])
+        self.assertFalse([q for q in queries if "billingapp_profile" in q["sql"]])
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class ReminderTests(TestCase):
+    today = date(2026, 9, 15)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.late = User.objects.create_user("late", email="late@example.com")
+        cls.prompt = User.objects.create_user("prompt", email="prompt@example.com")
+        cls.silent = User.objects.create_user("silent")
+        cls.overdue = Bill.objects.create(user=cls.late, title="Rent", amount=100, due_date=date(2026, 9, 1))
+        cls.due_soon = Bill.objects.create(user=cls.late, title="Water", amount=20, due_date=date(2026, 9, 17))
+        Bill.objects.create(user=cls.late, title="Later", amount=5, due_date=date(2026, 10, 1))
+        Bill.objects.create(user=cls.late, title="Settled", amount=5, due_date=date(2026, 9, 1)).mark_paid()
+        Bill.objects.create(user=cls.prompt, title="Power", amount=30, due_date=date(2026, 9, 16))
+        Bill.objects.create(user=cls.silent, title="Gas", amount=10, due_date=date(2026, 9, 1))
+
+    def test_one_digest_per_customer(self):
+        totals = send_reminders(days=3, chunk_size=1, today=self.today)
+
+        self.assertEqual(totals, {"customers": 2, "bills": 3})
+        digests = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(set(digests), {"late@example.com", "prompt@example.com"})
+        late = digests["late@example.com"]
+        self.assertEqual(late.subject, "1 overdue bill(s) on your account")
+        self.assertIn("Rent", late.body)
+        self.assertIn("Water", late.body)
+        self.assertNotIn("Later", late.body)
+        self.assertNotIn("Settled", late.body)
+        self.assertEqual(digests["prompt@example.com"].subject, "1 bill(s) due soon")
+
+    def test_sent_log_prevents_duplicates(self):
+        send_reminders(today=self.today)
+        self.assertEqual(BillReminder.objects.count(), 3)
+
+        self.assertEqual(send_reminders(today=self.today), {"customers": 0, "bills": 0})
+        self.assertEqual(len(mail.outbox), 2)
+
+        # A due-soon bill that becomes overdue gets one overdue reminder.
+        totals = send_reminders(today=date(2026, 9, 20))
+        self.assertEqual(totals, {"customers": 2, "bills": 2})
+        self.assertEqual(
+            set(BillReminder.objects.filter(bill=self.due_soon).values_list("kind", flat=True)),
+            {BillReminder.KIND_DUE_SOON, BillReminder.KIND_OVERDUE},
+        )
+        self.assertEqual(send_reminders(today=date(2026, 9, 20)), {"customers": 0, "bills": 0})
+
+    def test_dry_run_and_failed_sends_log_nothing(self):
+        self.assertEqual(send_reminders(today=self.today, dry_run=True), {"customers": 2, "bills": 3})
+
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=OSError("down")):
+            with self.assertRaises(OSError):
+                send_reminders(today=self.today)
+
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(BillReminder.objects.exists())
+
+
+class StatementTests(TestCase):
+    month = date(2026, 8, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = [User.objects.create_user(f"customer{number}") for number in range(5)]
+        for number, customer in enumerate(cls.customers[:4]):
+            Bill.objects.create(user=customer, title="Electricity", amount=100 + number, due_date=date(2026, 8, 10))
+            paid = Bill.objects.create(user=customer, title="Fees", amount=50, due_date=date(2026, 8, 20), bill_type="fees")
+            paid.mark_paid(paid_by=customer)
+        Bill.objects.create(user=cls.customers[0], title="Next month", amount=70, due_date=date(2026, 9, 5))
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(STATEMENTS_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_customers_without_activity_get_no_statement(self):
+        totals = generate_statements(self.month, chunk_size=2, workers=0)
+
+        self.assertEqual(totals, {"customers": 5, "statements": 4})
+        statement = Statement.objects.get(user=self.customers[1], month=self.month)
+        self.assertEqual((statement.total_billed, statement.outstanding), (151, 101))
+        text = statement_path(statement.text_digest, "txt").read_text()
+        self.assertIn("Electricity", text)
+        self.assertNotIn("Next month", text)
+
+    def test_process_pool_renders_the_same_documents(self):
+        generate_statements(self.month, workers=0)
+        in_process = dict(Statement.objects.values_list("user_id", "html_digest"))
+
+        generate_statements(self.month, chunk_size=2, workers=2)
+
+        self.assertEqual(dict(Statement.objects.values_list("user_id", "html_digest")), in_process)
+        self.assertEqual(Statement.objects.count(), 4)
+
+    def test_output_is_content_addressed(self):
+        digest = store("same statement", "txt")
+
+        self.assertEqual(store("same statement", "txt"), digest)
+        self.assertEqual(statement_path(digest, "txt").read_text(), "same statement")
+        self.assertEqual(len(list(statement_path(digest, "txt").parent.iterdir())), 1)
+
+    def test_statement_for_reuses_stored_output(self):
+        statement = statement_for(self.customers[0], self.month)
+        path = statement_path(statement.html_digest, "html")
+        modified = path.stat().st_mtime_ns
+
+        again = statement_for(self.customers[0], self.month)
+
+        self.assertEqual(again.pk, statement.pk)
+        self.assertEqual(path.stat().st_mtime_ns, modified)
+
+
+@override_settings(PAYMENT_GATEWAY="billingapp.payments.SimulatedGateway")
+class PaymentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user("payer")
+        cls.bill = Bill.objects.create(user=cls.customer, title="Water", amount=40, due_date=date(2026, 8, 10))
+
+    def pay(self, **options):
+        options = {"latency": (0, 0), "failure_rate": 0, "error_rate": 0, "max_attempts": 2, "seed": 7, **options}
+        with self.settings(PAYMENT_GATEWAY_OPTIONS=options):
+            with self.captureOnCommitCallbacks(execute=True):
+                payment = start_payment(self.bill, paid_by=self.customer)
+            self.assertEqual(payment.status, Transaction.STATUS_PENDING)
+            self.assertEqual(Job.objects.get().name, "settle_payment")
+            self.settle_queued()
+        payment.refresh_from_db()
+        self.bill.refresh_from_db()
+        return payment
+
+    def settle_queued(self):
+        Job.objects.filter(status=Job.STATUS_QUEUED).update(run_after=timezone.now())
+        job = claim_next_job()
+        with self.captureOnCommitCallbacks(execute=True):
+            run_job(job)
+
+    def test_payment_settles_in_the_background(self):
+        payment = self.pay()
+
+        self.assertEqual(payment.status, Transaction.STATUS_SUCCESS)
+        self.assertIsNotNone(payment.settled_at)
+        self.assertEqual(self.bill.status, Bill.STATUS_PAID)
+        self.assertTrue(BillingEvent.objects.filter(kind=BillingEvent.KIND_BILL_PAID, bill=self.bill).exists())
+
+    def test_declined_payment_leaves_the_bill_unpaid(self):
+        payment = self.pay(failure_rate=1)
+
+        self.assertEqual(payment.status, Transaction.STATUS_FAILED)
+        self.assertEqual(self.bill.status, Bill.STATUS_UNPAID)
+        self.assertTrue(BillingEvent.objects.filter(kind=BillingEvent.KIND_PAYMENT_FAILED, bill=self.bill).exists())
+
+    def test_transient_errors_are_retried_then_failed(self):
+        payment = self.pay(error_rate=1)
+
+        job = Job.objects.get()
+        self.assertEqual((job.status, payment.status), (Job.STATUS_QUEUED, Transaction.STATUS_PENDING))
+        self.assertGreater(job.run_after, timezone.now())
+
+        with self.settings(PAYMENT_GATEWAY_OPTIONS={"error_rate": 1}):
+            self.settle_queued()
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Transaction.STATUS_FAILED)
+        self.assertEqual(payment.failure_reason, "Simulated gateway timeout.")
+
+    def test_one_pending_payment_per_bill(self):
+        start_payment(self.bill, paid_by=self.customer)
+
+        with self.assertRaises(PaymentError):
+            start_payment(self.bill, paid_by=self.customer)
+
+    def test_settlement_that_keeps_failing_fails_the_payment(self):
+        with mock.patch("billingapp.payments.SimulatedGateway.charge", side_effect=RuntimeError("gateway bug")):
+            payment = self.pay()
+            self.settle_queued()
+
+        payment.refresh_from_db()
+        self.assertEqual((payment.status, payment.failure_reason), (Transaction.STATUS_FAILED, "The payment could not be processed."))
+        self.assertEqual(start_payment(self.bill).status, Transaction.STATUS_PENDING)
+
+    def test_queued_settlement_runs_after_switching_to_the_instant_gateway(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = start_payment(self.bill, paid_by=self.customer)
+
+        with self.settings(PAYMENT_GATEWAY="billingapp.payments.InstantGateway", PAYMENT_GATEWAY_OPTIONS={}):
+            self.settle_queued()
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Transaction.STATUS_SUCCESS)
+
+    def test_settlement_locks_the_bill_before_the_payment(self):
+        payment = start_payment(self.bill, paid_by=self.customer)
+
+        with CaptureQueriesContext(connection) as queries:
+            settle(payment.pk, succeeded=True)
+
+        selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+        bill_lock = next(i for i, sql in enumerate(selects) if 'FROM "billingapp_bill"' in sql)
+        payment_lock = next(
+            i for i, sql in enumerate(selects) if 'FROM "billingapp_transaction"' in sql and '"status" =' in sql
+        )
+        self.assertLess(bill_lock, payment_lock)
+
+    @override_settings(PAYMENT_PENDING_TIMEOUT=30)
+    def test_stale_pending_payment_does_not_lock_the_bill(self):
+        stale = start_payment(self.bill, paid_by=self.customer)
+        Transaction.objects.filter(pk=stale.pk).update(payment_date=timezone.now() - timedelta(minutes=31))
+
+        payment = start_payment(self.bill, paid_by=self.customer)
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, Transaction.STATUS_FAILED)
+        self.assertEqual(payment.status, Transaction.STATUS_PENDING)
+
+    def test_instant_gateway_settles_during_the_request(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = start_payment(self.bill, gateway=InstantGateway())
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Transaction.STATUS_SUCCESS)
+
+
+class BillingEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user("customer")
+        cls.bill = Bill.objects.create(user=cls.customer, title="Water", amount=40, due_date=date(2026, 9, 1))
+        BillingEvent.objects.all().delete()
+
+    def record_paid(self):
+        record(BillingEvent.KIND_BILL_PAID, user=self.customer, bill=self.bill, amount=self.bill.amount)
+
+    def test_buffered_events_are_written_in_one_insert(self):
+        with buffered_events():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.record_paid()
+                with buffered_events():
+                    self.record_paid()
+                self.record_paid()
+            self.assertFalse(BillingEvent.objects.exists())
+
+            with self.assertNumQueries(1):
+                self.assertEqual(flush(), 3)
+        self.assertEqual(BillingEvent.objects.filter(bill=self.bill).count(), 3)
+
+    def test_events_of_rolled_back_changes_are_dropped(self):
+        with buffered_events(), self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.record_paid()
+                raise RuntimeError("rolled back")
+            self.record_paid()
+
+        self.assertEqual(BillingEvent.objects.count(), 1)
+
+    def test_commits_after_the_buffered_block_write_directly(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with buffered_events():
+                self.record_paid()
+            self.assertFalse(BillingEvent.objects.exists())
+
+        self.assertEqual(BillingEvent.objects.count(), 1)
+
+    def test_events_outlive_the_customer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.record_paid()
+
+        self.customer.delete()
+
+        event = BillingEvent.objects.get()
+        self.assertEqual((event.user_id, event.bill_id, event.amount), (None, None, Money(40)))
+        with self.assertRaises(ValueError):
+            event.save()
+
+
+class BulkQuerySetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", is_staff=True)
+        cls.customers = [User.objects.create_user(f"customer{i}") for i in range(3)]
+        for customer in cls.customers:
+            Bill.objects.create(user=customer, title="Water", amount="12.50", due_date=date(2026, 9, 1))
+            Subscription.objects.create(user=customer, name="Fibre", amount=30, next_renewal_date=date(2020, 1, 1))
+        cls.paid = Bill.objects.create(user=cls.customers[0], title="Power", amount=20, due_date=date(2026, 9, 1))
+        cls.paid.mark_paid()
+
+    def test_mark_paid_pays_unpaid_bills_in_chunks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Bill.objects.mark_paid(paid_by=self.admin, method="Cash", chunk_size=2), 3)
+
+        self.assertFalse(Bill.objects.filter(status=Bill.STATUS_UNPAID).exists())
+        payments = Transaction.objects.exclude(bill=self.paid)
+        self.assertEqual(payments.count(), 3)
+        for payment in payments:
+            self.assertEqual(
+                (payment.status, payment.method, payment.amount, payment.processed_by_id, payment.bill_title),
+                (Transaction.STATUS_SUCCESS, "Cash", Money("12.50"), self.admin.pk, "Water"),
+            )
+            self.assertEqual(payment.user_id, payment.bill.user_id)
+        events = BillingEvent.objects.filter(kind=BillingEvent.KIND_BILL_PAID, actor=self.admin)
+        self.assertEqual(sorted(events.values_list("user_id", flat=True)), sorted(c.pk for c in self.customers))
+
+    def test_mark_paid_is_idempotent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Bill.objects.mark_paid()
+        transactions, events = Transaction.objects.count(), BillingEvent.objects.count()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Bill.objects.mark_paid(), 0)
+
+        self.assertEqual((Transaction.objects.count(), BillingEvent.objects.count()), (transactions, events))
+        self.paid.refresh_from_db()
+        self.assertEqual(self.paid.transactions.count(), 1)
+
+    def test_set_active_changes_only_subscriptions_that_differ(self):
+        Subscription.objects.filter(user=self.customers[0]).update(active=False)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Subscription.objects.set_active(False, actor=self.admin), 2)
+            self.assertEqual(Subscription.objects.set_active(False, actor=self.admin), 0)
+
+        self.assertFalse(Subscription.objects.filter(active=True).exists())
+        paused = BillingEvent.objects.filter(kind=BillingEvent.KIND_SUBSCRIPTION_PAUSED, actor=self.admin)
+        self.assertEqual(sorted(paused.values_list("user_id", flat=True)), [c.pk for c in self.customers[1:]])
+
+    def test_resumed_subscriptions_do_not_renew_in_the_past(self):
+        Subscription.objects.update(active=False)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Subscription.objects.set_active(True), 3)
+
+        today = timezone.now().date()
+        self.assertEqual(set(Subscription.objects.values_list("next_renewal_date", "active")), {(today, True)})
+        self.assertEqual(BillingEvent.objects.filter(kind=BillingEvent.KIND_SUBSCRIPTION_RESUMED).count(), 3)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer = User.objects.create_user("customer")
+        for i in range(3):
+            Bill.objects.create(user=customer, title=f"Bill {i}", amount=10, due_date=date(2026, 9, 1))
+
+    def test_large_estimates_replace_the_count(self):
+        with mock.patch("billingapp.pagination.estimate_count", return_value=50_000):
+            paginator = EstimatedCountPaginator(Bill.objects.order_by("pk"), 2)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 50_000)
+
+    def test_small_estimates_are_counted_exactly(self):
+        with mock.patch("billingapp.pagination.estimate_count", return_value=9_999):
+            paginator = EstimatedCountPaginator(Bill.objects.order_by("pk"), 2)
+            self.assertEqual((paginator.count, paginator.num_pages), (3, 2))
+
+    def test_backends_without_estimates_and_lists_are_counted_exactly(self):
+        self.assertEqual(EstimatedCountPaginator(Bill.objects.order_by("pk"), 2).count, 3)
+        with mock.patch("billingapp.pagination.estimate_count") as estimate:
+            self.assertEqual(EstimatedCountPaginator([1, 2], 2).count, 2)
+        estimate.assert_not_called()
+
+
+@skipIf(np is None, "NumPy is not installed")
+@override_settings(
+    LATE_FEE_RULES={
+        "default": {"grace_days": 5, "flat": "10.00", "percent": 10},
+        "electricity": {"monthly_percent": 10, "cap": "50.00"},
+    }
+)
+class LateFeeTests(TestCase):
+    today = date(2026, 9, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = User.objects.create_user("late")
+        cls.in_grace = Bill.objects.create(user=customer, title="Rent", amount=100, due_date=date(2026, 9, 28), bill_type="other")
+        cls.fees = Bill.objects.create(user=customer, title="Tuition", amount=100, due_date=date(2026, 9, 20), bill_type="fees")
+        cls.power = Bill.objects.create(user=customer, title="Power", amount=100, due_date=date(2026, 8, 1), bill_type="electricity")
+        cls.capped = Bill.objects.create(user=customer, title="Meter", amount=1000, due_date=date(2026, 7, 1), bill_type="electricity")
+        paid = Bill.objects.create(user=customer, title="Old", amount=100, due_date=date(2026, 1, 1), bill_type="fees")
+        paid.mark_paid()
+
+    def charged(self):
+        return dict(Bill.objects.filter(late_fee_for__isnull=False).values_list("late_fee_for_id", "amount"))
+
+    def test_dry_run_previews_without_writing(self):
+        totals = apply_late_fees(self.today, chunk_size=2, dry_run=True)
+
+        self.assertEqual(totals, {"bills": 4, "charged": 3, "created": 3, "updated": 0, "total": 91})
+        self.assertEqual(self.charged(), {})
+
+    def test_rules_by_bill_type(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_late_fees(self.today, chunk_size=2)
+
+        self.assertEqual(self.charged(), {self.fees.pk: 20, self.power.pk: 21, self.capped.pk: 50})
+        fee = Bill.objects.get(late_fee_for=self.power)
+        self.assertEqual((fee.user_id, fee.status, fee.due_date), (self.power.user_id, Bill.STATUS_UNPAID, self.today))
+        self.assertEqual(BillingEvent.objects.filter(kind=BillingEvent.KIND_BILL_CREATED, bill=fee).count(), 1)
+
+    def test_fees_compound_on_later_runs_without_stacking(self):
+        apply_late_fees(self.today)
+        Bill.objects.get(late_fee_for=self.fees).mark_paid()
+
+        totals = apply_late_fees(date(2026, 10, 31))
+
+        self.assertEqual((totals["created"], totals["updated"]), (1, 1))
+        self.assertEqual(self.charged(), {self.in_grace.pk: 20, self.fees.pk: 20, self.power.pk: Money("33.10"), self.capped.pk: 50})
+
+
+class StubReceiver(BaseHTTPRequestHandler):
+    status = 200
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append((dict(self.headers), body))
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubReceiver)
+        self.server.received, self.server.status = [], 200
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        url = f"http://127.0.0.1:{self.server.server_port}/hooks"
+        settings_override = override_settings(
+            WEBHOOK_ENDPOINTS={
+                "erp": {"url": url, "secret": "s3cret", "batch_size": 1},
+                "payments": {"url": url, "events": ["bill_paid"]},
+            }
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.customer = User.objects.create_user("hooked")
+
+    def deliver(self):
+        return Dispatcher(workers=2).run(burst=True, poll_interval=0.01)
+
+    def received(self, endpoint):
+        bodies = [json.loads(body) for _headers, body in self.server.received]
+        return [event["type"] for body in bodies if body["endpoint"] == endpoint for event in body["events"]]
+
+    def test_events_are_delivered_in_order_and_signed(self):
+        bill = Bill.objects.create(user=self.customer, title="Gas", amount=30, due_date=date(2026, 9, 1))
+        bill.mark_paid()
+
+        totals = self.deliver()
+
+        self.assertEqual(totals, {"delivered": 3, "retried": 0, "failed": 0})
+        self.assertEqual(self.received("erp"), ["bill_created", "bill_paid"])
+        self.assertEqual(self.received("payments"), ["bill_paid"])
+        headers, body = self.server.received[0]
+        self.assertEqual(headers["X-OPBMS-Signature"], "sha256=" + hmac.new(b"s3cret", body, hashlib.sha256).hexdigest())
+        self.assertFalse(OutboxMessage.objects.exclude(status=OutboxMessage.STATUS_DELIVERED).exists())
+
+    def test_failed_delivery_is_retried_before_later_messages(self):
+        self.server.status = 500
+        Bill.objects.create(user=self.customer, title="Gas", amount=30, due_date=date(2026, 9, 1)).mark_paid()
+
+        totals = self.deliver()
+
+        # The failed first message holds back the customer's later ones.
+        self.assertEqual(self.received("erp"), ["bill_created"])
+        self.assertEqual(totals["delivered"], 0)
+        first, second = OutboxMessage.objects.filter(endpoint="erp")
+        self.assertEqual((first.status, first.attempts, first.last_error), (OutboxMessage.STATUS_PENDING, 1, "HTTP 500"))
+        self.assertGreater(first.next_attempt_at, timezone.now())
+        self.assertEqual(second.attempts, 0)
+
+    def test_rolled_back_changes_queue_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Bill.objects.create(user=self.customer, title="Gas", amount=30, due_date=date(2026, 9, 1))
+            raise RuntimeError
+
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_bulk_updates_queue_messages_with_one_insert(self):
+        for number in range(3):
+            Bill.objects.create(user=self.customer, title=f"Bill {number}", amount=10, due_date=date(2026, 9, 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            Bill.objects.all().mark_paid()
+
+        inserts = [query for query in queries if query["sql"].startswith('INSERT INTO "billingapp_outboxmessage"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(OutboxMessage.objects.filter(kind=BillingEvent.KIND_BILL_PAID).count(), 6)
+
+
+@override_settings(STORAGES=STORAGES)
+class TenancyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org_a = Organization.objects.create(name="A", slug="a", domain="a.example.com")
+        cls.org_b = Organization.objects.create(name="B", slug="b", domain="b.example.com")
+        cls.staff_a = User.objects.create_user("staff-a", is_staff=True)
+        Profile.objects.update_or_create(user=cls.staff_a, defaults={"organization": cls.org_a})
+        cls.customers = {}
+        for organization in (cls.org_a, cls.org_b):
+            customer = User.objects.create_user(f"customer-{organization.slug}")
+            Profile.objects.update_or_create(user=customer, defaults={"organization": organization})
+            Bill.objects.create(user=customer, title=f"Rent {organization.slug}", amount=10, due_date=date(2026, 9, 1))
+            cls.customers[organization.slug] = customer
+
+    def test_scoped_managers_filter_by_the_current_organization(self):
+        with use_organization(self.org_a):
+            self.assertEqual([bill.user for bill in Bill.scoped.all()], [self.customers["a"]])
+            self.assertEqual(list(scoped_customers()), [self.customers["a"]])
+            self.assertEqual(Bill.objects.count(), 2)
+            self.assertEqual(Bill.objects.filter(bill_id_filter("Rent")).count(), 1)
+            self.assertEqual(Bill.objects.filter(customer_id_filter("customer")).count(), 1)
+        with use_organization(None):
+            self.assertEqual(Bill.scoped.count(), 2)
+
+    def test_new_rows_pick_up_their_customers_organization(self):
+        bill = Bill.objects.create(user=self.customers["b"], title="Water", amount=5, due_date=date(2026, 9, 1))
+
+        self.assertEqual(bill.organization, self.org_b)
+
+    def test_staff_cannot_use_another_organizations_host(self):
+        self.client.force_login(self.staff_a)
+        customer_b = self.customers["b"]
+
+        response = self.client.get(reverse("adminportal:customer_list"), HTTP_HOST="b.example.com")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse("adminportal:customer_detail", args=[customer_b.pk]), HTTP_HOST="b.example.com")
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(reverse("adminportal:customer_list"), HTTP_HOST="a.example.com")
+        self.assertContains(response, "customer-a")
+        self.assertNotContains(response, "customer-b")
+
+    def test_superusers_may_use_any_organizations_host(self):
+        self.client.force_login(User.objects.create_superuser("root", is_staff=True))
+
+        response = self.client.get(reverse("adminportal:customer_list"), HTTP_HOST="b.example.com")
+
+        self.assertContains(response, "customer-b")
+        self.assertNotContains(response, "customer-a")
+
+    def test_jobs_page_lists_only_the_organizations_jobs(self):
+        Job.objects.create(name="ensure_subscription_bills", organization=self.org_a)
+        Job.objects.create(name="assign_bills", organization=self.org_b)
+        self.client.force_login(self.staff_a)
+
+        response = self.client.get(reverse("adminportal:job_list"))
+
+        self.assertContains(response, "ensure_subscription_bills")
+        self.assertNotContains(response, "assign_bills")
+
+
+@override_settings(DATABASE_ROUTERS=["billingplatform.routers.TenantRouter"], STORAGES=STORAGES)
+class DedicatedDatabaseTenantTests(TestCase):
+    """Log in end to end as a customer of a tenant on its own (in-memory SQLite) database."""
+
+    @classmethod
+    def setUpClass(cls):
+        # The alias is added here, after the runner has set up the test databases.
+        cls.databases = {"default", "tenant_b"}
+        connections.settings["tenant_b"] = connections.configure_settings(
+            {"default": connections.settings["default"], "tenant_b": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+        )["tenant_b"]
+        call_command("migrate", database="tenant_b", verbosity=0)
+        router_settings = mock.patch("billingplatform.routers.settings", SimpleNamespace(DATABASES=connections.settings))
+        router_settings.start()
+        cls.addClassCleanup(router_settings.stop)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["tenant_b"].close()
+        del connections["tenant_b"]
+        del connections.settings["tenant_b"]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.org_b = Organization.objects.create(name="B", slug="b", domain="b.example.com", database="tenant_b")
+        with use_organization(cls.org_b):
+            cls.customer = User.objects.create_user("customer-b", password="secret")
+            Profile.objects.filter(user=cls.customer).update(organization=cls.org_b)
+            Bill.objects.create(user=cls.customer, title="Tenant rent", amount=10, due_date=date(2026, 9, 1))
+
+    def test_customers_stay_logged_in_on_their_tenants_host(self):
+        self.assertFalse(User.objects.using("default").filter(username="customer-b").exists())
+
+        response = self.client.post(
+            reverse("login"), {"username": "customer-b", "password": "secret"}, HTTP_HOST="b.example.com"
+        )
+        self.assertRedirects(response, reverse("customerportal:dashboard"), fetch_redirect_response=False)
+
+        response = self.client.get(reverse("customerportal:dashboard"), HTTP_HOST="b.example.com")
+        self.assertContains(response, "Tenant rent")
+
+
+@mock.patch("billingplatform.routers.settings", SimpleNamespace(DATABASES={"default": {}, "tenant_b": {}}))
+class TenantRouterTests(SimpleTestCase):
+    router = TenantRouter()
+
+    def test_tenant_models_follow_the_current_organization(self):
+        with use_organization(Organization(database="tenant_b")):
+            self.assertEqual(self.router.db_for_read(Bill), "tenant_b")
+            self.assertEqual(self.router.db_for_write(Subscription), "tenant_b")
+            self.assertEqual(self.router.db_for_read(Job), "default")
+            self.assertEqual(self.router.db_for_write(Organization), "default")
+
+    def test_shared_database_tenants_use_the_default_routing(self):
+        for organization in (None, Organization(database=""), Organization(database="missing")):
+            with self.subTest(organization=organization), use_organization(organization):
+                self.assertIsNone(self.router.db_for_read(Bill))
+
+    def test_relations_stay_within_one_database(self):
+        bill, other = Bill(), Bill()
+        bill._state.db, other._state.db = "default", "tenant_b"
+
+        self.assertFalse(self.router.allow_relation(bill, other))
+        self.assertTrue(self.router.allow_relation(other, Organization()))
+
+
+@skipUnless(connection.vendor == "sqlite", "The FTS5 search index is SQLite-only")
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user("jdoe")
+        Profile.objects.filter(user=cls.customer).update(full_name="Jane Doe", phone="555-0100")
+
+    def customers(self, query):
+        return [customer.username for customer in search_customers(query)]
+
+    def test_customer_rows_follow_user_and_profile_changes(self):
+        self.assertEqual(self.customers("jane"), ["jdoe"])
+        self.assertEqual(self.customers("555"), ["jdoe"])
+
+        profile = self.customer.profile
+        profile.full_name = "Janet Roe"
+        profile.save()
+        self.customer.username = "jroe"
+        self.customer.save()
+
+        self.assertEqual(self.customers("doe"), [])
+        self.assertEqual(self.customers("roe"), ["jroe"])
+        self.assertEqual(self.customers("jro"), ["jroe"])
+
+        self.customer.delete()
+        self.assertEqual(self.customers("janet"), [])
+
+    def test_bill_titles_follow_renames_and_deletes(self):
+        bill = Bill.objects.create(user=self.customer, title="Water", amount=10, due_date=date(2026, 9, 1))
+        bill.title = "Sewage"
+        bill.save()
+
+        self.assertEqual(search_bills("water"), [])
+        self.assertEqual(search_bills("sew"), [bill])
+        bill.delete()
+        self.assertEqual(search_bills("sewage"), [])
+
+    def test_results_are_ranked_and_match_every_word(self):
+        due = date(2026, 9, 1)
+        long = Bill.objects.create(user=self.customer, title="Electricity and water and gas for the hostel", amount=10, due_date=due)
+        short = Bill.objects.create(user=self.customer, title="Water", amount=10, due_date=due)
+        Bill.objects.create(user=self.customer, title="Gas", amount=10, due_date=due)
+
+        self.assertEqual(search_bills("water"), [short, long])
+        self.assertEqual(search_bills("water gas"), [long])
+
+    def test_other_organizations_do_not_crowd_out_matches(self):
+        ours, theirs = (Organization.objects.create(name=slug, slug=slug) for slug in ("ours", "theirs"))
+        Profile.objects.filter(user=self.customer).update(organization=ours)
+        for number in range(25):
+            other = User.objects.create_user(f"jane{number}")
+            Profile.objects.filter(user=other).update(organization=theirs, full_name="Jane Doe")
+            Bill.objects.create(user=other, title="Water", amount=10, due_date=date(2026, 9, 1))
+        User.objects.create_user("jane-staff", is_staff=True)
+        bill = Bill.objects.create(user=self.customer, title="Water", amount=10, due_date=date(2026, 9, 1))
+
+        with use_organization(ours):
+            self.assertEqual(self.customers("jane"), ["jdoe"])
+            self.assertEqual(search_bills("water", limit=5), [bill])
+            self.assertEqual([customer.username for customer in autocomplete_customers("jd")], ["jdoe"])
+        self.assertEqual(len(search_customers("jane", limit=30)), 26)
+
+    def test_autocomplete_matches_username_prefixes_only(self):
+        User.objects.create_user("john.doe")
+        User.objects.create_user("doe.john")
+
+        self.assertEqual([customer.username for customer in autocomplete_customers("doe")], ["doe.john"])
+        self.assertEqual([customer.username for customer in autocomplete_customers("john.d")], ["john.doe"])
+
+    def test_admin_filters_match_every_row(self):
+        due = date(2026, 9, 1)
+        Bill.objects.bulk_create(Bill(user=self.customer, title="Water", amount=10, due_date=due) for _ in range(1005))
+        Bill.objects.create(user=self.customer, title="Gas", amount=10, due_date=due)
+        Subscription.objects.create(user=self.customer, name="Water plan", amount=10, next_renewal_date=due)
+
+        self.assertEqual(Bill.objects.filter(bill_id_filter("water")).count(), 1005)
+        self.assertEqual(Bill.objects.filter(customer_id_filter("jane")).count(), 1006)
+        self.assertEqual(Subscription.objects.filter(subscription_id_filter("water")).count(), 1)
+        self.assertFalse(Bill.objects.filter(bill_id_filter("  ")).exists())
+
+
+class MoneyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user("customer", password="secret")
+        for amount in ("10.50", "10.51"):
+            Bill.objects.create(user=cls.customer, title="Power", amount=amount, due_date=date(2026, 9, 1))
+
+    def test_money_rejects_fractions_of_a_cent(self):
+        self.assertEqual(Money("10.5"), Decimal("10.50"))
+        self.assertEqual(Money(10.1), Decimal("10.10"))
+        with self.assertRaises(ValueError):
+            Money("10.505")
+        self.assertEqual(Money.rounded("10.505"), Decimal("10.51"))
+
+    def test_field_stores_minor_units(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT amount FROM billingapp_bill ORDER BY id")
+            self.assertEqual([row[0] for row in cursor.fetchall()], [1050, 1051])
+        self.assertEqual(Bill.objects.order_by("id").first().amount, Money("10.50"))
+
+    def test_field_rejects_fractions_of_a_cent(self):
+        bill = Bill(user=self.customer, title="Water", amount="1.005", due_date=date(2026, 9, 1))
+        with self.assertRaises(ValidationError) as caught:
+            bill.full_clean()
+        self.assertEqual(caught.exception.error_dict["amount"][0].code, "decimal_places")
+
+    def test_aggregates_and_expressions(self):
+        totals = Bill.objects.aggregate(
+            total=Sum("amount"),
+            highest=Max("amount"),
+            average=MoneyAvg("amount"),
+        )
+        self.assertEqual(totals, {"total": Money("21.01"), "highest": Money("10.51"), "average": Money("10.51")})
+        self.assertIsInstance(totals["total"], Money)
+
+        doubled = Bill.objects.annotate(double=ExpressionWrapper(F("amount") * 2, output_field=MoneyField()))
+        self.assertEqual(sorted(bill.double for bill in doubled), [Money("21.00"), Money("21.02")])
+
+
+class MoneyMigrationTests(TransactionTestCase):
+    before = [("billingapp", "0007_bill_reminders")]
+    after = [("billingapp", "0008_money_minor_units")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.leaves = self.executor.loader.graph.leaf_nodes()
+
+    def tearDown(self):
+        self.migrate(self.leaves)
+
+    def migrate(self, targets):
+        self.executor.loader.build_graph()
+        self.executor.migrate(targets)
+        return self.executor.loader.project_state(targets).apps
+
+    def test_amounts_convert_both_ways(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model("auth", "User").objects.create(username="customer")
+        apps.get_model("billingapp", "Bill").objects.create(
+            user=user, title="Power", amount=Decimal("10.55"), due_date=date(2026, 9, 1)
+        )
+
+        apps = self.migrate(self.after)
+        self.assertEqual(list(apps.get_model("billingapp", "Bill").objects.values_list("amount", flat=True)), [Money("10.55")])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT amount FROM billingapp_bill")
+            self.assertEqual(cursor.fetchone()[0], 1055)
+
+        apps = self.migrate(self.before)
+        self.assertEqual(list(apps.get_model("billingapp", "Bill").objects.values_list("amount", flat=True)), [Decimal("10.55")])
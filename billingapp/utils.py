@@ -4,15 +4,22 @@ from datetime import date
 
 from django.db import transaction
 
+from .events import buffered_events
 from .models import Bill, Subscription
+from .outbox import batched_outbox
 
 
-@transaction.atomic
 def ensure_subscription_bills(user=None) -> int:
     """Generate bills for due subscriptions. Returns count of bills created."""
 
+    # Renewal events are written in one batch after the transaction commits.
+    with buffered_events(), transaction.atomic(), batched_outbox():
+        return _generate_subscription_bills(user)
+
+
+def _generate_subscription_bills(user=None) -> int:
     today = date.today()
-    subscriptions = Subscription.objects.filter(active=True)
+    subscriptions = Subscription.scoped.filter(active=True, next_renewal_date__lte=today)
     if user is not None:
         subscriptions = subscriptions.filter(user=user)
 
@@ -0,0 +1,262 @@
+"""Deliver outbox messages to webhook endpoints.
+
+``manage.py dispatch_webhooks`` runs a :class:`Dispatcher`. It reads due
+messages for each endpoint in ``WEBHOOK_ENDPOINTS`` oldest first and POSTs up
+to ``batch_size`` of them as one JSON document::
+
+    {"endpoint": "accounting", "events": [{"id": "<uuid>", "type": "bill_paid", ...}, ...]}
+
+A ``2xx`` answer delivers the whole batch. Otherwise every message in it is
+retried with the job queue's exponential backoff and marked ``failed`` after
+``max_attempts``. A ``429``/``503`` with ``Retry-After`` pauses the endpoint
+for that long without spending an attempt.
+
+Ordering: messages for one customer are delivered in the order they were
+written. A batch never includes a customer whose earlier message is waiting
+for a retry or is still in flight. Run one dispatcher per database, or split
+customers between processes with ``--shard``.
+
+Backpressure: HTTP requests run on a small thread pool over keep-alive
+connections, and a new batch is read only when a sender is free, so a slow
+endpoint slows reads instead of growing memory. Database access stays on the
+dispatcher's main thread. Receivers should use the event ``id`` to ignore
+redeliveries.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from .jobs import retry_delay
+from .models import OutboxMessage
+
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "OPBMS-Webhooks/1.0"
+SIGNATURE_HEADER = "X-OPBMS-Signature"
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    name: str
+    url: str
+    secret: str = ""
+    events: tuple | None = None
+    batch_size: int = 100
+    timeout: float = 10.0
+    max_attempts: int = 10
+
+
+def configured_endpoints() -> list[Endpoint]:
+    return [
+        Endpoint(name=name, **{**options, "events": tuple(options["events"]) if options.get("events") else None})
+        for name, options in getattr(settings, "WEBHOOK_ENDPOINTS", {}).items()
+    ]
+
+
+def sign(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class DeliveryFailed(Exception):
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConnectionPool:
+    """One keep-alive HTTP connection per host and sender thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _connection(self, scheme: str, netloc: str, timeout: float, fresh: bool = False):
+        connections = self._local.__dict__.setdefault("connections", {})
+        key = (scheme, netloc)
+        if fresh and key in connections:
+            connections.pop(key).close()
+        if key not in connections:
+            factory = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            connection = factory(netloc, timeout=timeout)
+            connections[key] = connection
+            with self._lock:
+                self._all.append(connection)
+        return connections[key]
+
+    def post(self, url: str, body: bytes, headers: dict, timeout: float) -> tuple[int, dict, bytes]:
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        for fresh in (False, True):
+            connection = self._connection(parts.scheme, parts.netloc, timeout, fresh=fresh)
+            try:
+                connection.request("POST", path, body=body, headers=headers)
+                response = connection.getresponse()
+                return response.status, dict(response.getheaders()), response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The server closed an idle keep-alive connection; reconnect once.
+                if fresh:
+                    raise
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._all:
+                connection.close()
+            self._all.clear()
+
+
+def _retry_after(headers: dict) -> float | None:
+    value = {key.lower(): item for key, item in headers.items()}.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def send_batch(pool: ConnectionPool, endpoint: Endpoint, events: list[dict]) -> None:
+    """POST ``events`` to ``endpoint``; raises :class:`DeliveryFailed` unless it answers 2xx."""
+
+    body = json.dumps({"endpoint": endpoint.name, "events": events}, cls=DjangoJSONEncoder).encode()
+    headers = {"Content-Type": "application/json", "User-Agent": USER_AGENT}
+    if endpoint.secret:
+        headers[SIGNATURE_HEADER] = sign(endpoint.secret, body)
+    try:
+        status, response_headers, _content = pool.post(endpoint.url, body, headers, endpoint.timeout)
+    except (OSError, http.client.HTTPException) as exc:
+        raise DeliveryFailed(f"{type(exc).__name__}: {exc}")
+    if not 200 <= status < 300:
+        retry_after = _retry_after(response_headers) if status in (429, 503) else None
+        raise DeliveryFailed(f"HTTP {status}", retry_after=retry_after)
+
+
+def message_body(message: OutboxMessage) -> dict:
+    return {"id": str(message.event_id), **message.payload}
+
+
+class Dispatcher:
+    def __init__(self, using: str = "default", workers: int = 4, shard: tuple[int, int] = (0, 1), endpoints=None):
+        self.using = using
+        self.workers = max(1, workers)
+        self.shard, self.shards = shard
+        self.endpoints = configured_endpoints() if endpoints is None else endpoints
+        self.pool = ConnectionPool()
+        self.paused_until: dict[str, float] = {}
+        self.totals = {"delivered": 0, "retried": 0, "failed": 0}
+
+    def due_batch(self, endpoint: Endpoint, busy_customers: set[int]) -> list[OutboxMessage]:
+        now = timezone.now()
+        messages = OutboxMessage.objects.using(self.using).filter(endpoint=endpoint.name)
+        waiting = messages.filter(
+            customer_id=OuterRef("customer_id"),
+            status=OutboxMessage.STATUS_PENDING,
+            next_attempt_at__gt=now,
+            pk__lt=OuterRef("pk"),
+        )
+        due = (
+            messages.filter(status=OutboxMessage.STATUS_PENDING, next_attempt_at__lte=now)
+            .exclude(customer_id__in=busy_customers)
+            .filter(~Exists(waiting))
+        )
+        if self.shards > 1:
+            due = due.annotate(shard=Mod("customer_id", self.shards)).filter(shard=self.shard)
+        return list(due.order_by("pk")[: endpoint.batch_size])
+
+    def run(self, stop_event: threading.Event | None = None, burst: bool = False, poll_interval: float = 1.0) -> dict:
+        """Deliver until ``stop_event`` is set, or until nothing is due in ``burst`` mode."""
+
+        stop_event = stop_event or threading.Event()
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="webhook") as senders:
+            try:
+                while not stop_event.is_set():
+                    close_old_connections()
+                    self._fill(senders, in_flight)
+                    if not in_flight:
+                        if burst and not self._paused():
+                            break
+                        stop_event.wait(poll_interval)
+                        continue
+                    done, _pending = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        endpoint, batch = in_flight.pop(future)
+                        self._settle(endpoint, batch, future.exception())
+            finally:
+                for future, (endpoint, batch) in list(in_flight.items()):
+                    self._settle(endpoint, batch, future.exception())
+                self.pool.close()
+        return self.totals
+
+    def _paused(self) -> bool:
+        return any(until > time.monotonic() for until in self.paused_until.values())
+
+    def _fill(self, senders: ThreadPoolExecutor, in_flight: dict) -> None:
+        # Backpressure: only read as many batches as there are free senders.
+        for endpoint in self.endpoints:
+            if len(in_flight) >= self.workers:
+                return
+            if self.paused_until.get(endpoint.name, 0) > time.monotonic():
+                continue
+            busy = {
+                message.customer_id
+                for active_endpoint, batch in in_flight.values()
+                if active_endpoint.name == endpoint.name
+                for message in batch
+            }
+            batch = self.due_batch(endpoint, busy)
+            if batch:
+                events = [message_body(message) for message in batch]
+                in_flight[senders.submit(send_batch, self.pool, endpoint, events)] = (endpoint, batch)
+
+    def _settle(self, endpoint: Endpoint, batch: list[OutboxMessage], error: BaseException | None) -> None:
+        now = timezone.now()
+        messages = OutboxMessage.objects.using(self.using)
+        ids = [message.pk for message in batch]
+        if error is None:
+            messages.filter(pk__in=ids).update(
+                status=OutboxMessage.STATUS_DELIVERED, delivered_at=now, attempts=F("attempts") + 1, last_error=""
+            )
+            self.totals["delivered"] += len(ids)
+            return
+
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            # The receiver asked us to slow down: pause the endpoint, keep the attempt.
+            self.paused_until[endpoint.name] = time.monotonic() + retry_after
+            messages.filter(pk__in=ids).update(next_attempt_at=now + timedelta(seconds=retry_after), last_error=str(error))
+            self.totals["retried"] += len(ids)
+            return
+
+        logger.warning("Webhook delivery to %s failed for %s message(s): %s", endpoint.name, len(ids), error)
+        attempts = batch[0].attempts + 1
+        failed = [message.pk for message in batch if message.attempts + 1 >= endpoint.max_attempts]
+        retried = [message.pk for message in batch if message.attempts + 1 < endpoint.max_attempts]
+        messages.filter(pk__in=failed).update(
+            status=OutboxMessage.STATUS_FAILED, attempts=F("attempts") + 1, last_error=str(error)
+        )
+        messages.filter(pk__in=retried).update(
+            attempts=F("attempts") + 1, next_attempt_at=now + retry_delay(attempts), last_error=str(error)
+        )
+        self.totals["retried"] += len(retried)
+        self.totals["failed"] += len(failed)
@@ -0,0 +1,44 @@
+"""Password hashers whose work factor is read from settings.
+
+Each class keeps Django's algorithm identifier, so existing hashes still verify
+and are transparently re-encoded on the next successful login whenever the
+configured work factor changes.
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return getattr(settings, "PBKDF2_ITERATIONS", None) or PBKDF2PasswordHasher.iterations
+
+
+class TunableArgon2PasswordHasher(Argon2PasswordHasher):
+    """Memory-hard hasher; requires the ``argon2-cffi`` package."""
+
+    @property
+    def time_cost(self):
+        return getattr(settings, "ARGON2_TIME_COST", None) or Argon2PasswordHasher.time_cost
+
+    @property
+    def memory_cost(self):
+        return getattr(settings, "ARGON2_MEMORY_COST", None) or Argon2PasswordHasher.memory_cost
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "ARGON2_PARALLELISM", None) or Argon2PasswordHasher.parallelism
+
+
+class TunableScryptPasswordHasher(ScryptPasswordHasher):
+    """Memory-hard hasher built on :func:`hashlib.scrypt`; no extra dependency."""
+
+    @property
+    def work_factor(self):
+        return getattr(settings, "SCRYPT_WORK_FACTOR", None) or ScryptPasswordHasher.work_factor
+
+    @property
+    def maxmem(self):
+        # scrypt needs roughly 128 * r * N bytes; leave headroom above OpenSSL's 32 MiB default.
+        return max(2 * 128 * self.block_size * self.work_factor, 32 * 1024 * 1024)
@@ -0,0 +1,223 @@
+"""On-demand sampling profiler for single requests and management commands.
+
+A staff user profiles one request by adding ``?_profile=1`` to its URL or
+sending an ``X-OPBMS-Profile: 1`` header. Background work is profiled with
+``manage.py profile``::
+
+    python manage.py profile send_bill_reminders
+    python manage.py profile --call billingapp.utils.ensure_subscription_bills
+
+While a profile runs, a helper thread reads the profiled thread's stack every
+``PROFILING_INTERVAL`` seconds, so the code under test runs unmodified (no
+tracing hooks). Each profile is written to ``PROFILES_ROOT`` as
+``<id>.collapsed`` (one ``frame;frame;frame count`` line per distinct stack),
+which flamegraph.pl and https://www.speedscope.app open directly, next to an
+``<id>.json`` summary that the admin portal's *Profiles* page lists. A request
+profile records the request's organization; staff only see their own
+organization's profiles, and only superusers see every tenant's and those of
+management commands.
+
+:class:`ProfilingMiddleware` removes itself unless ``PROFILING_ENABLED`` is on.
+When it is on, requests without the switch cost two dictionary lookups and
+never touch ``request.user``. The middleware sits after authentication and
+tenant resolution, so the session, auth and tenant middleware are outside the
+profile. For a streaming response
+only the code that runs before streaming starts is profiled.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+
+PROFILE_PARAM = "_profile"
+PROFILE_HEADER = "X-OPBMS-Profile"
+
+_PROFILE_ID = re.compile(r"^\d{8}T\d{6}-[0-9a-f]{8}$")
+
+
+@dataclass
+class Profile:
+    id: str
+    label: str
+    kind: str
+    started_at: str
+    user: str = ""
+    organization: int | None = None
+    duration_ms: float = 0.0
+    samples: int = 0
+    stacks: Counter = field(default_factory=Counter, repr=False)
+
+
+def profiles_root() -> Path:
+    return Path(settings.PROFILES_ROOT)
+
+
+def profile_path(profile_id: str, extension: str = "collapsed") -> Path:
+    if not _PROFILE_ID.match(profile_id):
+        raise ValueError(f"Not a profile id: {profile_id!r}")
+    return profiles_root() / f"{profile_id}.{extension}"
+
+
+class Sampler(threading.Thread):
+    """Sample the stack of ``thread_id`` every ``interval`` seconds until stopped."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._finished = threading.Event()
+        self._labels: dict = {}
+
+    def run(self) -> None:
+        while not self._finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._finished.set()
+        self.join()
+        return self.stacks
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+        if marker in filename:
+            return filename.rsplit(marker, 1)[1]
+    base = str(settings.BASE_DIR) + os.sep
+    return filename[len(base):] if filename.startswith(base) else filename
+
+
+@contextmanager
+def sample(label: str, kind: str, user: str = "", organization: int | None = None):
+    """Profile the block and save the result; yields the :class:`Profile`.
+
+    ``organization`` is the id of the tenant the profiled request belongs to.
+    """
+
+    now = timezone.now()
+    profile = Profile(
+        id=f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}",
+        label=label,
+        kind=kind,
+        started_at=now.isoformat(),
+        user=user,
+        organization=organization,
+    )
+    sampler = Sampler(threading.get_ident(), getattr(settings, "PROFILING_INTERVAL", 0.005))
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield profile
+    finally:
+        profile.stacks = sampler.stop()
+        profile.duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        profile.samples = sum(profile.stacks.values())
+        save(profile)
+
+
+def save(profile: Profile) -> None:
+    root = profiles_root()
+    root.mkdir(parents=True, exist_ok=True)
+    collapsed = "".join(f"{';'.join(stack)} {count}\n" for stack, count in profile.stacks.most_common())
+    profile_path(profile.id).write_text(collapsed)
+    summary = {key: value for key, value in asdict(profile).items() if key != "stacks"}
+    # The summary is written last: the Profiles page only lists complete profiles.
+    profile_path(profile.id, "json").write_text(json.dumps(summary))
+    _prune(root, getattr(settings, "PROFILES_KEEP", 200))
+
+
+def _prune(root: Path, keep: int) -> None:
+    for summary in sorted(root.glob("*.json"), reverse=True)[keep:]:
+        summary.with_suffix(".collapsed").unlink(missing_ok=True)
+        summary.unlink(missing_ok=True)
+
+
+def recent_profiles(limit: int = 50, organization=None) -> list[dict]:
+    """Summaries of the newest profiles, newest first; only ``organization``'s when given."""
+
+    root = profiles_root()
+    if not root.is_dir():
+        return []
+    summaries = []
+    for path in sorted(root.glob("*.json"), reverse=True):
+        summary = _read_summary(path)
+        if summary is None or not _belongs_to(summary, organization):
+            continue
+        summaries.append(summary)
+        if len(summaries) >= limit:
+            break
+    return summaries
+
+
+def profile_summary(profile_id: str, organization=None) -> dict | None:
+    """The summary of one profile, or ``None`` if it is missing or another organization's."""
+
+    summary = _read_summary(profile_path(profile_id, "json"))
+    if summary is None or not _belongs_to(summary, organization):
+        return None
+    return summary
+
+
+def _read_summary(path: Path) -> dict | None:
+    try:
+        summary = json.loads(path.read_text())
+        summary["started_at"] = datetime.fromisoformat(summary["started_at"])
+    except (OSError, KeyError, ValueError):
+        return None
+    return summary
+
+
+def _belongs_to(summary: dict, organization) -> bool:
+    return organization is None or summary.get("organization") == organization.pk
+
+
+class ProfilingMiddleware:
+    """Profile requests from staff users who ask for it."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (PROFILE_PARAM in request.GET or PROFILE_HEADER in request.headers) or not request.user.is_staff:
+            return self.get_response(request)
+
+        organization = getattr(request, "organization", None)
+        with sample(
+            f"{request.method} {request.get_full_path()}",
+            "request",
+            user=request.user.get_username(),
+            organization=organization.pk if organization else None,
+        ) as profile:
+            response = self.get_response(request)
+        response["X-OPBMS-Profile-Id"] = profile.id
+        return response
@@ -0,0 +1,149 @@
+"""Declarative per-view query budgets.
+
+Views declare how many SQL queries a request may issue::
+
+    @query_budget(8)
+    @login_required
+    def dashboard(request): ...
+
+``settings.QUERY_BUDGETS`` maps URL names to budgets and overrides the
+decorator, so views from other apps can be budgeted without touching them::
+
+    QUERY_BUDGETS = {"adminportal:dashboard": 15}
+
+A budget covers the whole request, middleware included. When
+``QUERY_BUDGET_CHECKS`` is on (the default under ``DEBUG``)
+:class:`QueryBudgetMiddleware` counts every query and logs a warning listing
+the SQL fingerprints of requests that go over budget; with
+``QUERY_BUDGET_STRICT`` it raises :class:`QueryBudgetExceeded` instead, which
+is how the test suite enforces the budgets. With checks off the middleware
+removes itself and the decorator only sets an attribute.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit: int):
+    """Allow a view at most ``limit`` queries per request."""
+
+    if limit < 0:
+        raise ValueError("A query budget cannot be negative.")
+
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+
+    return decorator
+
+
+def budget_for(match) -> int | None:
+    """Return the budget for a resolved URL, or ``None`` when it has none."""
+
+    if match is None:
+        return None
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    if match.view_name in budgets:
+        return budgets[match.view_name]
+    return getattr(match.func, "query_budget", None)
+
+
+def unbudgeted_views(modules, urlconf=None) -> list[str]:
+    """URL names routed to views defined in ``modules`` that declare no budget."""
+
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    return sorted(
+        view_name
+        for view_name, callback in _url_views(get_resolver(urlconf).url_patterns)
+        if callback.__module__ in modules
+        and view_name not in budgets
+        and getattr(callback, "query_budget", None) is None
+    )
+
+
+def _url_views(patterns, namespace=""):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = f"{namespace}{pattern.namespace}:" if pattern.namespace else namespace
+            yield from _url_views(pattern.url_patterns, prefix)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield f"{namespace}{pattern.name}", pattern.callback
+
+
+def fingerprint(sql: str) -> str:
+    """Reduce SQL to its shape so repeated queries with different values group together."""
+
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that remembers the SQL of every query it sees."""
+
+    def __init__(self):
+        self.queries: list[str] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def fingerprints(self) -> Counter:
+        return Counter(fingerprint(sql) for sql in self.queries)
+
+
+class QueryBudgetMiddleware:
+    """Count queries per request and report views that exceed their budget."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_BUDGET_CHECKS", settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.strict = getattr(settings, "QUERY_BUDGET_STRICT", False)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        budget = budget_for(request.resolver_match)
+        if budget is not None and len(recorder) > budget:
+            self._report(request, budget, recorder)
+        return response
+
+    def _report(self, request, budget: int, recorder: QueryRecorder) -> None:
+        lines = "\n".join(f"  {count} x {sql}" for sql, count in recorder.fingerprints().most_common())
+        message = (
+            f"{request.method} {request.path} ({request.resolver_match.view_name}) ran "
+            f"{len(recorder)} queries; its budget is {budget}.\n{lines}"
+        )
+        if self.strict:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
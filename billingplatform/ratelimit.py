@@ -0,0 +1,229 @@
+"""Rate limiting keyed by URL name, user and client IP.
+
+Limits are declared in ``settings.RATE_LIMITS``::
+
+    RATE_LIMITS = {
+        "login": {"ip": "10/m"},
+        "customerportal:pay_bill": {"user": "5/m", "ip": "30/m"},
+    }
+
+Each rate is ``"<requests>/<s|m|h|d>"``. Checks run in ``process_view``
+before the view (and the ORM) is touched. A request is counted against every
+scope of its URL name only when all of them allow it, so a request rejected
+by the IP limit does not use up the user's allowance.
+
+:class:`CacheBackend` counts requests per period in a shared Django cache with
+atomic ``add``/``incr`` and weights the previous period's count by how much
+of it still overlaps the sliding window, so concurrent workers cannot let
+more than the limit through. :class:`InMemoryBackend` keeps exact token
+buckets (the bucket holds ``requests`` tokens and refills continuously over
+the period) in each process.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+SCOPES = {"user", "ip"}
+
+_rejections: Counter = Counter()
+_rejections_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Rate:
+    capacity: int
+    period: int
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        count, _, unit = value.partition("/")
+        try:
+            capacity = int(count)
+            period = PERIODS[unit.strip().lower()[:1]]
+        except (KeyError, ValueError):
+            raise ValueError(f"Invalid rate limit {value!r}; expected e.g. '10/m'.") from None
+        if capacity < 1:
+            raise ValueError(f"Invalid rate limit {value!r}; the request count must be positive.")
+        return cls(capacity, period)
+
+
+class InMemoryBackend:
+    """Per-process buckets; exact, but each worker process counts separately."""
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, limits: list[tuple[str, Rate]], now: float) -> tuple[int, float] | None:
+        """Take one token from every bucket, or from none.
+
+        Returns ``None`` when allowed, otherwise the index of a limit that
+        rejected the request and the seconds until it would allow one.
+        """
+
+        with self._lock:
+            buckets = []
+            for index, (key, rate) in enumerate(limits):
+                tokens, stamp = self._buckets.get(key, (rate.capacity, now))
+                tokens = min(rate.capacity, tokens + (now - stamp) * rate.refill_per_second)
+                if tokens < 1:
+                    return index, (1 - tokens) / rate.refill_per_second
+                buckets.append(tokens)
+            for (key, rate), tokens in zip(limits, buckets):
+                self._buckets.pop(key, None)
+                self._buckets[key] = (tokens - 1, now)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return None
+
+
+class CacheBackend:
+    """Sliding-window counters stored in a Django cache shared by every worker."""
+
+    def __init__(self, alias: str = "default"):
+        self.cache = caches[alias]
+
+    def acquire(self, limits: list[tuple[str, Rate]], now: float) -> tuple[int, float] | None:
+        """Count the request against every limit, or against none; see :meth:`InMemoryBackend.acquire`."""
+
+        windows = []
+        for key, rate in limits:
+            window, elapsed = divmod(now, rate.period)
+            windows.append((f"{key}:{int(window)}", f"{key}:{int(window) - 1}", elapsed))
+        counts = self.cache.get_many([name for current, previous, _ in windows for name in (current, previous)])
+
+        # Reject without counting while any limit is already reached.
+        for index, ((key, rate), (current, previous, elapsed)) in enumerate(zip(limits, windows)):
+            wait = _window_wait(counts.get(previous, 0), counts.get(current, 0), rate, elapsed)
+            if wait > 0:
+                return index, wait
+
+        counted = []
+        for index, ((key, rate), (current, previous, elapsed)) in enumerate(zip(limits, windows)):
+            self.cache.add(current, 0, timeout=rate.period * 2)
+            try:
+                count = self.cache.incr(current)
+            except ValueError:
+                # The counter expired between add and incr.
+                self.cache.add(current, 1, timeout=rate.period * 2)
+                count = 1
+            counted.append(current)
+            wait = _window_wait(counts.get(previous, 0), count - 1, rate, elapsed)
+            if wait > 0:
+                # A concurrent request took the last slot; give back what this one counted.
+                for name in counted:
+                    try:
+                        self.cache.decr(name)
+                    except ValueError:
+                        pass
+                return index, wait
+        return None
+
+
+def _window_wait(previous: int, current: int, rate: Rate, elapsed: float) -> float:
+    """Seconds until one more request fits; 0 when it fits now.
+
+    The estimated count is ``current`` plus ``previous`` scaled by the share
+    of the previous period still inside the sliding window.
+    """
+
+    room = rate.capacity - 1 - current
+    if room < 0:
+        return rate.period - elapsed
+    if previous * (rate.period - elapsed) <= room * rate.period:
+        return 0.0
+    return max(rate.period - elapsed - room * rate.period / previous, 1e-3)
+
+
+def client_ip(request) -> str:
+    if getattr(settings, "RATE_LIMIT_TRUST_X_FORWARDED_FOR", False):
+        forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def rejection_counts() -> dict[str, int]:
+    """Return rejected requests per ``"<url name>:<scope>"`` since process start."""
+
+    with _rejections_lock:
+        return dict(_rejections)
+
+
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.methods = {method.upper() for method in getattr(settings, "RATE_LIMIT_METHODS", ("POST",))}
+        self.limits = {}
+        for view_name, scopes in getattr(settings, "RATE_LIMITS", {}).items():
+            unknown = set(scopes) - SCOPES
+            if unknown:
+                raise ImproperlyConfigured(f"RATE_LIMITS[{view_name!r}] has unknown scope(s): {', '.join(sorted(unknown))}.")
+            self.limits[view_name] = {scope: Rate.parse(rate) for scope, rate in scopes.items()}
+        backend = getattr(settings, "RATE_LIMIT_BACKEND", "billingplatform.ratelimit.CacheBackend")
+        self.backend = import_string(backend)()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in self.methods:
+            return None
+        match = request.resolver_match
+        scopes = self.limits.get(match.view_name) if match else None
+        if not scopes:
+            return None
+
+        checks = []
+        for scope, rate in scopes.items():
+            if scope == "user":
+                if not request.user.is_authenticated:
+                    continue
+                identity = request.user.pk
+            else:
+                identity = client_ip(request)
+            checks.append((scope, identity, f"ratelimit:{match.view_name}:{scope}:{identity}", rate))
+        if not checks:
+            return None
+
+        rejected = self.backend.acquire([(key, rate) for _, _, key, rate in checks], time.time())
+        if rejected is None:
+            return None
+        index, wait = rejected
+        scope, identity, _, _ = checks[index]
+        return self._reject(match.view_name, scope, identity, wait)
+
+    def _reject(self, view_name: str, scope: str, identity, wait: float) -> HttpResponse:
+        with _rejections_lock:
+            _rejections[f"{view_name}:{scope}"] += 1
+        logger.warning("Rate limit exceeded for %s (%s=%s)", view_name, scope, identity)
+
+        retry_after = max(1, math.ceil(wait))
+        response = HttpResponse(
+            f"Too many requests. Please try again in {retry_after} second(s).",
+            status=429,
+            content_type="text/plain; charset=utf-8",
+        )
+        response.headers["Retry-After"] = str(retry_after)
+        return response
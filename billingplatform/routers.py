@@ -0,0 +1,52 @@
+"""Optional database router placing large tenants on their own database.
+
+Enable it with ``DATABASE_ROUTERS = ['billingplatform.routers.TenantRouter']``
+and add the tenant's alias to ``DATABASES``. While an organization with
+``Organization.database`` set is current (see ``billingapp.tenancy``), every
+model except the few in ``SHARED_MODELS`` is read from and written to that
+database, so its customers and billing rows never share tables or indexes
+with other tenants. Such tenants must be resolved by domain, because
+their users live in the tenant database. Run ``migrate --database <alias>``
+for each tenant database.
+"""
+
+from django.conf import settings
+
+from billingapp.tenancy import get_current_organization
+
+
+# Always on "default": organizations are needed to pick a database, sessions
+# are saved after the request's tenant context ends, and workers claim jobs
+# without a tenant.
+SHARED_MODELS = {
+    ("billingapp", "organization"),
+    ("billingapp", "job"),
+    ("sessions", "session"),
+}
+
+
+def _is_shared(model_or_obj) -> bool:
+    meta = model_or_obj._meta
+    return (meta.app_label, meta.model_name) in SHARED_MODELS
+
+
+class TenantRouter:
+    def _tenant_database(self, model):
+        if _is_shared(model):
+            return "default"
+        organization = get_current_organization()
+        if organization is not None and organization.database in settings.DATABASES:
+            return organization.database
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._tenant_database(model)
+
+    def db_for_write(self, model, **hints):
+        return self._tenant_database(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Tenant rows may point at organizations, which only live on "default".
+        if _is_shared(obj1) or _is_shared(obj2):
+            return True
+        return obj1._state.db == obj2._state.db
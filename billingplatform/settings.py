@@ -1,5 +1,6 @@
 """Django settings for the billingplatform project."""
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,10 +36,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'billingplatform.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'billingapp.tenancy.TenantMiddleware',
+    'billingplatform.profiling.ProfilingMiddleware',
+    'billingplatform.ratelimit.RateLimitMiddleware',
+    'billingapp.events.BillingEventMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,6 +67,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'billingplatform.wsgi.application'
+ASGI_APPLICATION = 'billingplatform.asgi.application'
 
 
 # Database
@@ -89,6 +96,141 @@ DATABASES = {
 # }
 
 
+# Cache and sessions
+# Sessions default to the cached_db backend so authenticated requests read the
+# session from the cache instead of the database. Set OPBMS_SESSION_ENGINE to
+# 'django.contrib.sessions.backends.cache' or '...signed_cookies' to take the
+# session table out of the login path entirely; use a shared cache
+# (OPBMS_REDIS_URL) when running more than one process.
+
+if os.environ.get('OPBMS_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['OPBMS_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+SESSION_ENGINE = os.environ.get('OPBMS_SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+
+# Rate limiting
+# Limits per URL name; scopes are 'user' (authenticated user) and 'ip'.
+# The cache backend shares its counters across processes when CACHES is shared;
+# 'billingplatform.ratelimit.InMemoryBackend' keeps token buckets per process.
+
+RATE_LIMITS = {
+    'login': {'ip': '20/m'},
+    'customerportal:pay_bill': {'user': '10/m', 'ip': '60/m'},
+}
+RATE_LIMIT_METHODS = ('POST',)
+RATE_LIMIT_BACKEND = 'billingplatform.ratelimit.CacheBackend'
+RATE_LIMIT_TRUST_X_FORWARDED_FOR = False
+
+
+# Late fees
+# `manage.py apply_late_fees` (run daily; needs NumPy) charges one fee bill per
+# unpaid bill that is more than `grace_days` overdue:
+# flat + percent of the amount, compounded by `monthly_percent` for every
+# further 30 days, limited to `cap`. Keys are bill types; 'default' covers the rest.
+
+LATE_FEE_RULES = {
+    'default': {'grace_days': 7, 'flat': '50.00', 'percent': 0, 'monthly_percent': 2, 'cap': None},
+    'electricity': {'grace_days': 3, 'flat': '25.00', 'percent': 1.5, 'monthly_percent': 2, 'cap': '1000.00'},
+}
+
+
+# Payments
+# PAYMENT_GATEWAY settles customer payments. The simulated gateway settles them
+# in background jobs (run `manage.py run_worker`) after a random latency, with
+# declines and retried transient errors; 'billingapp.payments.InstantGateway'
+# approves payments during the request. Payments still pending after
+# PAYMENT_PENDING_TIMEOUT minutes are failed when the bill is paid again.
+
+PAYMENT_GATEWAY = os.environ.get('OPBMS_PAYMENT_GATEWAY', 'billingapp.payments.SimulatedGateway')
+PAYMENT_GATEWAY_OPTIONS = {
+    'latency': (0.5, 3.0),
+    'failure_rate': 0.05,
+    'error_rate': 0.02,
+    'max_attempts': 4,
+}
+PAYMENT_PENDING_TIMEOUT = 30
+
+
+# Webhooks
+# Billing events are written to a transactional outbox for every endpoint below
+# and POSTed in batches by `manage.py dispatch_webhooks`, signed with
+# `X-OPBMS-Signature: sha256=<HMAC of the body>` when a secret is set.
+# Optional keys: 'events' (kinds to send; default all), 'batch_size' (100),
+# 'timeout' (10 seconds) and 'max_attempts' (10). Example:
+#     'accounting': {'url': 'https://erp.example.com/hooks/billing',
+#                    'secret': os.environ['OPBMS_ACCOUNTING_SECRET'],
+#                    'events': ['bill_created', 'bill_paid']},
+
+WEBHOOK_ENDPOINTS = {}
+
+
+# Profiling
+# Staff add `?_profile=1` (or an `X-OPBMS-Profile: 1` header) to a request to
+# sample it; `manage.py profile` samples a command or function. Profiles are
+# saved under PROFILES_ROOT as collapsed stacks (open them in speedscope or
+# flamegraph.pl) and listed on the admin portal's Profiles page.
+# Set OPBMS_PROFILING=0 to remove the middleware entirely.
+
+PROFILING_ENABLED = os.environ.get('OPBMS_PROFILING', '1') == '1'
+PROFILING_INTERVAL = 0.005
+PROFILES_ROOT = Path(os.environ.get('OPBMS_PROFILES_ROOT', BASE_DIR / 'profiles'))
+PROFILES_KEEP = 200
+
+# Query budgets
+# Views declare their budget with billingplatform.querybudget.query_budget;
+# QUERY_BUDGETS overrides or adds budgets by URL name. With checks on,
+# over-budget requests log their SQL fingerprints (or raise when strict).
+
+QUERY_BUDGETS = {}
+QUERY_BUDGET_CHECKS = DEBUG
+QUERY_BUDGET_STRICT = False
+
+
+# Password hashing
+# OPBMS_PASSWORD_HASHER selects the algorithm used for new hashes: 'pbkdf2'
+# (default), 'scrypt' (memory-hard, stdlib only) or 'argon2' (memory-hard,
+# requires argon2-cffi). Existing hashes keep verifying and are upgraded on the
+# next login. Measure the cost with `python manage.py benchmark_login`.
+
+_PASSWORD_HASHER_CHOICES = {
+    'pbkdf2': 'billingplatform.hashers.TunablePBKDF2PasswordHasher',
+    'scrypt': 'billingplatform.hashers.TunableScryptPasswordHasher',
+    'argon2': 'billingplatform.hashers.TunableArgon2PasswordHasher',
+}
+PASSWORD_HASH_ALGORITHM = os.environ.get('OPBMS_PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CHOICES[PASSWORD_HASH_ALGORITHM]] + [
+    hasher for name, hasher in _PASSWORD_HASHER_CHOICES.items() if name != PASSWORD_HASH_ALGORITHM
+] + [
+    # Django's other default hashers, so hashes made with them keep verifying.
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# Work factors; None keeps Django's defaults.
+PBKDF2_ITERATIONS = int(os.environ['OPBMS_PBKDF2_ITERATIONS']) if os.environ.get('OPBMS_PBKDF2_ITERATIONS') else None
+SCRYPT_WORK_FACTOR = int(os.environ['OPBMS_SCRYPT_WORK_FACTOR']) if os.environ.get('OPBMS_SCRYPT_WORK_FACTOR') else None
+ARGON2_TIME_COST = None
+ARGON2_MEMORY_COST = None
+ARGON2_PARALLELISM = None
+
+
+# Add 'billingplatform.routers.TenantRouter' to serve organizations that set
+# Organization.database from their own DATABASES alias.
+DATABASE_ROUTERS = []
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -129,10 +271,51 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic writes content-hashed copies plus .gz/.br siblings so the web
+# server can send them with far-future cache headers (see README).
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'billingplatform.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Bump to invalidate every conditional-GET validator after a template change.
+PAGE_CACHE_VERSION = '1'
+
+# Outgoing email. The console backend prints messages; point EMAIL_BACKEND at
+# django.core.mail.backends.smtp.EmailBackend (plus EMAIL_HOST etc.) in production.
+EMAIL_BACKEND = os.environ.get('OPBMS_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('OPBMS_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('OPBMS_EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('OPBMS_EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('OPBMS_EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('OPBMS_EMAIL_USE_TLS', '') == '1'
+DEFAULT_FROM_EMAIL = os.environ.get('OPBMS_DEFAULT_FROM_EMAIL', 'billing@opbms.local')
+
+# Absolute base URL used for links in emails.
+SITE_URL = os.environ.get('OPBMS_SITE_URL', 'http://127.0.0.1:8000')
+
+# Live admin dashboard (server-sent events): seconds between change checks,
+# between KPI refreshes when nothing else changed, and before a stream closes
+# and the browser reconnects.
+DASHBOARD_STREAM_POLL_SECONDS = 2
+DASHBOARD_STREAM_KPI_SECONDS = 30
+DASHBOARD_STREAM_MAX_SECONDS = 300
+# Under WSGI the stream is not held open; the browser polls this often instead.
+DASHBOARD_POLL_SECONDS = 15
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Rendered monthly statements, stored by content digest. STATEMENT_WORKERS
+# sets the rendering processes for `manage.py generate_statements` (None: one per CPU).
+STATEMENTS_ROOT = Path(os.environ.get('OPBMS_STATEMENTS_ROOT', BASE_DIR / 'statements'))
+STATEMENT_WORKERS = None
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
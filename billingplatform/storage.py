@@ -0,0 +1,51 @@
+"""Static file storage with content hashes and precompressed variants."""
+
+from __future__ import annotations
+
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Fingerprint assets during ``collectstatic`` and write ``.gz``/``.br`` siblings.
+
+    Hashed names never change content, so the web server can serve them with a
+    far-future ``Cache-Control`` and pick the precompressed file that matches
+    the client's ``Accept-Encoding`` (``gzip_static``/``brotli_static`` in nginx).
+    Brotli output is only produced when the ``brotli`` package is installed.
+    """
+
+    compressible_extensions = (".css", ".js", ".svg", ".json", ".map", ".txt", ".html", ".xml")
+    minimum_compress_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for hashed_name in set(self.hashed_files.values()):
+            if hashed_name.endswith(self.compressible_extensions):
+                self._write_compressed(hashed_name)
+
+    def _write_compressed(self, name: str) -> None:
+        with self.open(name) as source:
+            content = source.read()
+        if len(content) < self.minimum_compress_size:
+            return
+
+        self._write_if_smaller(f"{name}.gz", content, gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            self._write_if_smaller(f"{name}.br", content, brotli.compress(content))
+
+    def _write_if_smaller(self, name: str, original: bytes, compressed: bytes) -> None:
+        if len(compressed) >= len(original):
+            return
+        path = self.path(name)
+        with open(path, "wb") as handle:
+            handle.write(compressed)
@@ -0,0 +1,45 @@
+"""Helpers shared by the apps' test suites."""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+# Pages render without a collectstatic manifest.
+STORAGES = {**settings.STORAGES, "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}
+
+# Data sizes a page is requested at to prove its query count does not grow.
+SIZES = (1, 5, 20)
+
+
+def add_billing_history(customer, number: int, paid_by=None):
+    """Give ``customer`` subscription ``number`` with one unpaid and one paid bill; returns the subscription."""
+
+    from billingapp.models import Bill, Subscription
+
+    today = timezone.now().date()
+    subscription = Subscription.objects.create(
+        user=customer, name=f"Plan {number}", amount=99, next_renewal_date=today + timedelta(days=30)
+    )
+    Bill.objects.create(user=customer, title=f"Fees {number}", amount=250, due_date=today + timedelta(days=number), created_by=paid_by)
+    paid = Bill.objects.create(user=customer, subscription=subscription, title=f"Power {number}", amount=80, due_date=today)
+    paid.mark_paid(paid_by=paid_by)
+    return subscription
+
+
+class ConstantQueriesMixin:
+    def assertConstantQueries(self, url, grow):
+        """Request ``url`` (a string or a callable returning one) after ``grow(size)`` for each of ``SIZES``."""
+
+        counts = []
+        for size in SIZES:
+            grow(size)
+            current = url() if callable(url) else url
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(current)
+            self.assertLess(response.status_code, 400, current)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, f"{current} query counts grew with data: {counts}")
@@ -0,0 +1,268 @@
+import gzip
+import json
+import logging
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from billingapp.models import Organization, Profile
+
+from .profiling import ProfilingMiddleware, profile_path, recent_profiles
+from .querybudget import QueryBudgetExceeded, QueryBudgetMiddleware, fingerprint, unbudgeted_views
+from .ratelimit import CacheBackend, InMemoryBackend, Rate
+from .testing import STORAGES
+
+
+User = get_user_model()
+
+
+class CompressedStaticFilesTests(SimpleTestCase):
+    def test_collectstatic_writes_hashed_and_gzipped_files(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storages = {
+            **settings.STORAGES,
+            "staticfiles": {"BACKEND": "billingplatform.storage.CompressedManifestStaticFilesStorage"},
+        }
+
+        with override_settings(STATIC_ROOT=root, STORAGES=storages):
+            call_command("collectstatic", interactive=False, verbosity=0)
+
+        manifest = json.loads((Path(root) / "staticfiles.json").read_text())["paths"]
+        hashed = manifest["css/style.css"]
+        self.assertRegex(hashed, r"^css/style\.[0-9a-f]{12}\.css$")
+        self.assertTrue((Path(root) / hashed).is_file())
+        self.assertTrue((Path(root) / f"{hashed}.gz").is_file())
+        self.assertEqual(gzip.decompress((Path(root) / f"{hashed}.gz").read_bytes()), (Path(root) / hashed).read_bytes())
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_literals_and_placeholder_lists_are_collapsed(self):
+        self.assertEqual(
+            fingerprint("SELECT *  FROM bill WHERE id IN (%s, %s, %s) AND title = 'Rent' LIMIT 21"),
+            "SELECT * FROM bill WHERE id IN (...) AND title = ? LIMIT ?",
+        )
+
+
+class PasswordHasherTests(TestCase):
+    def test_django_fallback_hashers_follow_the_tunable_ones(self):
+        tunable = [path for path in settings.PASSWORD_HASHERS if path.startswith("billingplatform.")]
+        self.assertEqual(settings.PASSWORD_HASHERS[: len(tunable)], tunable)
+        self.assertIn("django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher", settings.PASSWORD_HASHERS)
+        self.assertIn("django.contrib.auth.hashers.BCryptSHA256PasswordHasher", settings.PASSWORD_HASHERS)
+
+    def test_pbkdf2_iterations_follow_settings_and_upgrade_on_login(self):
+        with override_settings(PBKDF2_ITERATIONS=1000):
+            user = User.objects.create_user("customer", password="secret")
+            self.assertEqual(identify_hasher(user.password).decode(user.password)["iterations"], 1000)
+
+        with override_settings(PBKDF2_ITERATIONS=1500):
+            self.assertTrue(user.check_password("secret"))
+        user.refresh_from_db()
+        self.assertEqual(identify_hasher(user.password).decode(user.password)["iterations"], 1500)
+
+    @override_settings(SCRYPT_WORK_FACTOR=2**10)
+    def test_scrypt_work_factor_follows_settings(self):
+        encoded = make_password("secret", hasher="scrypt")
+        hasher = get_hasher("scrypt")
+
+        self.assertEqual(hasher.decode(encoded)["work_factor"], 2**10)
+        self.assertTrue(hasher.verify("secret", encoded))
+        with override_settings(SCRYPT_WORK_FACTOR=2**11):
+            self.assertTrue(get_hasher("scrypt").must_update(encoded))
+
+    @override_settings(PBKDF2_ITERATIONS=1000)
+    def test_hashes_from_django_fallback_hashers_verify_and_are_upgraded(self):
+        user = User.objects.create_user("customer")
+        User.objects.filter(pk=user.pk).update(password=make_password("secret", hasher="pbkdf2_sha1"))
+        user.refresh_from_db()
+
+        self.assertTrue(user.check_password("secret"))
+        user.refresh_from_db()
+        self.assertEqual(identify_hasher(user.password).algorithm, "pbkdf2_sha256")
+
+
+class RateLimitBackendTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.backends = (CacheBackend(), InMemoryBackend())
+
+    def test_requests_beyond_the_rate_are_rejected(self):
+        rate = Rate.parse("3/m")
+        for backend in self.backends:
+            with self.subTest(backend=type(backend).__name__):
+                allowed = [backend.acquire([("ratelimit:a", rate)], 600.0) for _ in range(3)]
+                index, wait = backend.acquire([("ratelimit:a", rate)], 600.0)
+
+                self.assertEqual(allowed, [None, None, None])
+                self.assertEqual(index, 0)
+                self.assertGreater(wait, 0)
+
+    def test_a_rejected_request_is_not_counted_against_other_scopes(self):
+        user, ip = Rate.parse("2/m"), Rate.parse("1/m")
+        for backend in self.backends:
+            with self.subTest(backend=type(backend).__name__):
+                self.assertIsNone(backend.acquire([("ratelimit:user", user), ("ratelimit:ip", ip)], 600.0))
+                for _ in range(3):
+                    self.assertEqual(backend.acquire([("ratelimit:user", user), ("ratelimit:ip", ip)], 600.0)[0], 1)
+
+                # The user has one request left despite the three rejected ones.
+                self.assertIsNone(backend.acquire([("ratelimit:user", user)], 600.0))
+                self.assertEqual(backend.acquire([("ratelimit:user", user)], 600.0)[0], 0)
+
+    def test_cache_window_weights_the_previous_period(self):
+        backend = CacheBackend()
+        rate = Rate.parse("4/m")
+        for _ in range(4):
+            backend.acquire([("ratelimit:b", rate)], 600.0)
+
+        # Three quarters into the next minute a quarter of the previous count remains.
+        self.assertIsNone(backend.acquire([("ratelimit:b", rate)], 705.0))
+        self.assertIsNone(backend.acquire([("ratelimit:b", rate)], 705.0))
+        self.assertIsNone(backend.acquire([("ratelimit:b", rate)], 705.0))
+        index, wait = backend.acquire([("ratelimit:b", rate)], 705.0)
+        self.assertEqual(index, 0)
+        self.assertAlmostEqual(wait, 15.0)
+
+
+@override_settings(RATE_LIMITS={"login": {"ip": "2/m"}}, STORAGES=STORAGES)
+class RateLimitMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_login_is_throttled_per_ip(self):
+        with self.assertLogs("billingplatform.ratelimit", "WARNING") as logs:
+            statuses = [
+                self.client.post(reverse("login"), {"username": "nobody", "password": "wrong"}).status_code
+                for _ in range(3)
+            ]
+            response = self.client.post(reverse("login"), {"username": "nobody", "password": "wrong"})
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertEqual(len(logs.records), 2)
+
+    def test_other_methods_are_not_throttled(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse("login")).status_code, 200)
+
+
+@override_settings(QUERY_BUDGET_CHECKS=True, QUERY_BUDGET_STRICT=True, STORAGES=STORAGES)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user("customer", password="secret")
+
+    def test_every_view_declares_a_budget(self):
+        self.assertEqual(unbudgeted_views({"billingplatform.views"}), [])
+
+    def test_public_pages(self):
+        for name in ("home", "about", "contact", "login"):
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    def test_login_and_logout(self):
+        response = self.client.post(reverse("login"), {"username": "customer", "password": "secret"})
+        self.assertRedirects(response, reverse("customerportal:dashboard"), fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse("home")).status_code, 302)
+        self.assertEqual(self.client.get(reverse("logout")).status_code, 302)
+
+    @override_settings(QUERY_BUDGETS={"login": 0})
+    def test_url_budget_overrides_decorator(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.post(reverse("login"), {"username": "customer", "password": "secret"})
+
+    @override_settings(QUERY_BUDGETS={"login": 0}, QUERY_BUDGET_STRICT=False)
+    def test_over_budget_requests_are_logged_in_debug(self):
+        with self.assertLogs("billingplatform.querybudget", logging.WARNING) as logs:
+            self.client.post(reverse("login"), {"username": "customer", "password": "secret"})
+        self.assertIn("budget is 0", logs.output[0])
+        self.assertIn("auth_user", logs.output[0])
+
+    @override_settings(QUERY_BUDGET_CHECKS=False)
+    def test_middleware_is_removed_when_checks_are_off(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryBudgetMiddleware(lambda request: None)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_INTERVAL=0.001, STORAGES=STORAGES)
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", password="secret", is_staff=True)
+        cls.customer = User.objects.create_user("customer", password="secret")
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(PROFILES_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_staff_can_profile_a_request(self):
+        self.client.force_login(self.staff)
+
+        response = self.client.get(reverse("adminportal:dashboard"), {"_profile": "1"})
+
+        profile_id = response["X-OPBMS-Profile-Id"]
+        self.assertTrue(profile_path(profile_id).is_file())
+        [summary] = recent_profiles()
+        self.assertEqual((summary["id"], summary["kind"], summary["user"]), (profile_id, "request", "staff"))
+        self.assertEqual(summary["label"], "GET /admin/dashboard/?_profile=1")
+
+        listing = self.client.get(reverse("adminportal:profile_list"))
+        self.assertContains(listing, reverse("adminportal:profile_download", args=[profile_id]))
+        download = self.client.get(reverse("adminportal:profile_download", args=[profile_id]))
+        self.assertEqual(download.status_code, 200)
+
+    def test_staff_only_see_their_organizations_profiles(self):
+        org_a, org_b = (Organization.objects.create(name=slug, slug=slug) for slug in ("a", "b"))
+        staff_b = User.objects.create_user("staff-b", is_staff=True)
+        Profile.objects.filter(user=self.staff).update(organization=org_a)
+        Profile.objects.filter(user=staff_b).update(organization=org_b)
+        self.client.force_login(self.staff)
+        profile_id = self.client.get(reverse("adminportal:dashboard"), {"_profile": "1"})["X-OPBMS-Profile-Id"]
+        download_url = reverse("adminportal:profile_download", args=[profile_id])
+
+        self.assertEqual(recent_profiles(organization=org_a)[0]["organization"], org_a.pk)
+        self.assertEqual(self.client.get(download_url).status_code, 200)
+
+        self.client.force_login(staff_b)
+        self.assertNotContains(self.client.get(reverse("adminportal:profile_list")), download_url)
+        self.assertEqual(self.client.get(download_url).status_code, 404)
+
+        self.client.force_login(User.objects.create_superuser("root"))
+        self.assertContains(self.client.get(reverse("adminportal:profile_list")), download_url)
+        self.assertEqual(self.client.get(download_url).status_code, 200)
+
+    def test_customers_and_unmarked_requests_are_not_profiled(self):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse("customerportal:dashboard"), HTTP_X_OPBMS_PROFILE="1")
+        self.assertNotIn("X-OPBMS-Profile-Id", response)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("adminportal:dashboard"))
+        self.assertNotIn("X-OPBMS-Profile-Id", response)
+        self.assertEqual(recent_profiles(), [])
+
+    def test_management_command_profiles_a_function(self):
+        call_command("profile", call="billingapp.utils.ensure_subscription_bills", stdout=StringIO())
+
+        [summary] = recent_profiles()
+        self.assertEqual((summary["kind"], summary["label"]), ("function", "billingapp.utils.ensure_subscription_bills"))
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_middleware_is_removed_when_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
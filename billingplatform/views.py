@@ -3,6 +3,8 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.shortcuts import redirect, render
 
+from .querybudget import query_budget
+
 
 def _redirect_for_user(user):
     if user.is_staff:
@@ -10,20 +12,24 @@ def _redirect_for_user(user):
     return redirect("customerportal:dashboard")
 
 
+@query_budget(3)
 def home(request):
     if request.user.is_authenticated:
         return _redirect_for_user(request.user)
     return render(request, "index.html")
 
 
+@query_budget(1)
 def about(request):
     return render(request, "about.html")
 
 
+@query_budget(1)
 def contact(request):
     return render(request, "contact.html")
 
 
+@query_budget(10)
 def login_view(request):
     if request.user.is_authenticated:
         return _redirect_for_user(request.user)
@@ -44,6 +50,7 @@ def login_view(request):
     return render(request, "login.html", {"form": form})
 
 
+@query_budget(5)
 def logout_view(request):
     logout(request)
     messages.info(request, "You have been signed out.")
@@ -0,0 +1,202 @@
+"""Lightweight JSON endpoints for mobile and integration clients.
+
+Rows are serialised straight from ``values()`` so no model instances are built,
+clients can narrow the payload with ``?fields=``, pages are addressed with an
+opaque ``?cursor=`` instead of offsets, and every collection carries an
+``ETag``/``Last-Modified`` pair so polling clients receive ``304 Not Modified``
+while nothing has changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from billingapp.models import Bill, Subscription, Transaction
+from billingplatform.querybudget import query_budget
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+BILL_FIELDS = (
+    "id",
+    "title",
+    "description",
+    "amount",
+    "due_date",
+    "bill_type",
+    "status",
+    "paid_at",
+    "subscription_id",
+    "created_at",
+    "updated_at",
+)
+SUBSCRIPTION_FIELDS = (
+    "id",
+    "name",
+    "amount",
+    "bill_type",
+    "next_renewal_date",
+    "active",
+    "created_by_role",
+    "notes",
+    "created_at",
+    "updated_at",
+)
+TRANSACTION_FIELDS = (
+    "id",
+    "bill_id",
+    "bill_title",
+    "bill_type",
+    "bill_due_date",
+    "amount",
+    "payment_date",
+    "method",
+    "status",
+    "updated_at",
+)
+
+
+class APIError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def api_login_required(view_func):
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        if request.user.is_staff:
+            return JsonResponse({"error": "The JSON API is only available to customer accounts."}, status=403)
+        try:
+            return view_func(request, *args, **kwargs)
+        except APIError as exc:
+            return JsonResponse({"error": exc.message}, status=exc.status)
+
+    return _wrapped
+
+
+def _parse_fields(request, allowed: tuple[str, ...]) -> list[str]:
+    raw = request.GET.get("fields")
+    if not raw:
+        return list(allowed)
+
+    requested = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise APIError(f"Unknown field(s): {', '.join(unknown)}.")
+
+    # The primary key always travels with the row; it doubles as the cursor.
+    return ["id"] + [name for name in dict.fromkeys(requested) if name != "id"]
+
+
+def _parse_positive_int(request, name: str, default: int | None = None) -> int | None:
+    raw = request.GET.get(name)
+    if raw in (None, ""):
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise APIError(f"'{name}' must be a positive integer.") from None
+    if value < 1:
+        raise APIError(f"'{name}' must be a positive integer.")
+    return value
+
+
+def _collection_response(request, queryset, allowed_fields: tuple[str, ...]):
+    """Serve one page of ``queryset`` with conditional-GET validators.
+
+    The validators are derived from a single aggregate over the caller's rows,
+    so an unchanged collection is answered without fetching any row data.
+    """
+
+    fields = _parse_fields(request, allowed_fields)
+    limit = min(_parse_positive_int(request, "limit", DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+    cursor = _parse_positive_int(request, "cursor")
+
+    stats = queryset.order_by().aggregate(last_modified=Max("updated_at"), total=Count("id"))
+    last_modified = stats["last_modified"]
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    fingerprint = "|".join(
+        [
+            str(stats["total"]),
+            last_modified.isoformat() if last_modified else "-",
+            ",".join(fields),
+            str(limit),
+            str(cursor or ""),
+            request.GET.get("status", ""),
+            request.GET.get("active", ""),
+        ]
+    )
+    etag = quote_etag(hashlib.md5(fingerprint.encode(), usedforsecurity=False).hexdigest())
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        page = queryset.order_by("-id")
+        if cursor is not None:
+            page = page.filter(id__lt=cursor)
+        rows = list(page.values(*fields)[: limit + 1])
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["id"]
+
+        response = JsonResponse({"count": stats["total"], "next_cursor": next_cursor, "results": rows})
+
+    response.headers["ETag"] = etag
+    if timestamp is not None:
+        response.headers["Last-Modified"] = http_date(timestamp)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@query_budget(5)
+@require_safe
+@api_login_required
+def bill_list(request):
+    bills = Bill.objects.filter(user=request.user)
+    status = request.GET.get("status")
+    if status:
+        if status not in dict(Bill.STATUS_CHOICES):
+            raise APIError("'status' must be one of: paid, unpaid.")
+        bills = bills.filter(status=status)
+    return _collection_response(request, bills, BILL_FIELDS)
+
+
+@query_budget(5)
+@require_safe
+@api_login_required
+def subscription_list(request):
+    subscriptions = Subscription.objects.filter(user=request.user)
+    active = request.GET.get("active")
+    if active:
+        if active not in ("true", "false"):
+            raise APIError("'active' must be 'true' or 'false'.")
+        subscriptions = subscriptions.filter(active=active == "true")
+    return _collection_response(request, subscriptions, SUBSCRIPTION_FIELDS)
+
+
+@query_budget(5)
+@require_safe
+@api_login_required
+def transaction_list(request):
+    transactions = Transaction.objects.filter(user=request.user)
+    status = request.GET.get("status")
+    if status:
+        if status not in dict(Transaction.STATUS_CHOICES):
+            choices = ", ".join(value for value, _label in Transaction.STATUS_CHOICES)
+            raise APIError(f"'status' must be one of: {choices}.")
+        transactions = transactions.filter(status=status)
+    return _collection_response(request, transactions, TRANSACTION_FIELDS)
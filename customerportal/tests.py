@@ -1,3 +1,270 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from billingapp.models import Bill, Transaction
+from billingapp.payments import start_payment
+from billingapp.statements import previous_month
+from billingplatform.querybudget import unbudgeted_views
+from billingplatform.testing import STORAGES, ConstantQueriesMixin, add_billing_history
+
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_CHECKS=True, QUERY_BUDGET_STRICT=True, STORAGES=STORAGES)
+class QueryBudgetTests(ConstantQueriesMixin, TestCase):
+    """Customer pages and the JSON API stay within budget however much history a customer has."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user("customer", password="secret")
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+
+    def grow(self, size):
+        for number in range(self.customer.subscriptions.count(), size):
+            add_billing_history(self.customer, number, paid_by=self.customer)
+
+    def test_every_view_declares_a_budget(self):
+        self.assertEqual(unbudgeted_views({"customerportal.views", "customerportal.api"}), [])
+
+    def test_pages(self):
+        for name in (
+            "dashboard",
+            "subscriptions",
+            "payment_history",
+            "profile",
+            "subscription_create",
+            "statements",
+            "api_bills",
+            "api_subscriptions",
+            "api_transactions",
+        ):
+            with self.subTest(name=name):
+                self.assertConstantQueries(reverse(f"customerportal:{name}"), self.grow)
+
+    def test_create_subscription(self):
+        response = self.client.post(
+            reverse("customerportal:subscription_create"),
+            {"name": "Gym", "bill_type": "fees", "amount": "30.00", "next_renewal_date": "2030-01-31"},
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_update_profile(self):
+        response = self.client.post(
+            reverse("customerportal:profile"), {"full_name": "A Customer", "phone": "555-0100", "address": "1 Main St"}
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_pay_bill(self):
+        self.grow(1)
+        bill = self.customer.bills.get(status=Bill.STATUS_UNPAID)
+        url = reverse("customerportal:pay_bill", args=[bill.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 302)
+
+    def test_transaction_history_does_not_read_bills(self):
+        self.grow(5)
+        self.customer.bills.filter(title="Power 0").update(title="Renamed")
+        for name in ("dashboard", "payment_history", "api_transactions"):
+            with self.subTest(name=name):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(reverse(f"customerportal:{name}"))
+                self.assertContains(response, "Power 0")
+                listings = [query["sql"] for query in queries if query["sql"].startswith('SELECT "billingapp_transaction".')]
+                self.assertTrue(listings)
+                self.assertFalse([sql for sql in listings if 'JOIN "billingapp_bill"' in sql])
+
+    def test_statements(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        month = previous_month()
+        User.objects.filter(pk=self.customer.pk).update(date_joined=timezone.now() - timedelta(days=90))
+        Bill.objects.create(user=self.customer, title="Hostel", amount=900, due_date=month.replace(day=15))
+
+        with self.settings(STATEMENTS_ROOT=root):
+            listing = self.client.get(reverse("customerportal:statements"))
+            url = reverse("customerportal:statement_download", args=[month.year, month.month, "html"])
+            first = self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                cached = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+            text = self.client.get(reverse("customerportal:statement_download", args=[month.year, month.month, "txt"]))
+            today = timezone.localdate()
+            current = self.client.get(reverse("customerportal:statement_download", args=[today.year, today.month, "html"]))
+            joined = previous_month(previous_month(previous_month(previous_month(month))))
+            before_joining = [
+                self.client.get(reverse("customerportal:statement_download", args=[year, number, "html"])).status_code
+                for year, number in ((1900, 1), (joined.year, joined.month))
+            ]
+
+        self.assertContains(listing, month.strftime("%B %Y"))
+        self.assertIn(b"Hostel", b"".join(first.streaming_content))
+        self.assertEqual(cached.status_code, 304)
+        self.assertFalse(any("INSERT" in query["sql"] for query in queries.captured_queries))
+        self.assertEqual(text["Content-Disposition"], f'attachment; filename="statement-{month:%Y-%m}.txt"')
+        self.assertEqual(current.status_code, 404)
+        self.assertEqual(before_joining, [404, 404])
+        self.assertEqual(list(self.customer.statements.values_list("month", flat=True)), [month])
+
+    def test_subscription_toggle(self):
+        self.grow(1)
+        subscription = self.customer.subscriptions.get()
+        response = self.client.post(reverse("customerportal:subscription_toggle", args=[subscription.pk]))
+        self.assertEqual(response.status_code, 302)
+
+
+class SubscriptionToggleTests(TestCase):
+    def test_toggle_rolls_back_when_the_event_fails(self):
+        customer = User.objects.create_user("customer", password="secret")
+        subscription = add_billing_history(customer, 0)
+        self.client.force_login(customer)
+
+        with mock.patch("customerportal.views.record", side_effect=RuntimeError("outbox unavailable")):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse("customerportal:subscription_toggle", args=[subscription.pk]))
+
+        subscription.refresh_from_db()
+        self.assertTrue(subscription.active)
+
+
+class APITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user("customer", password="secret")
+        today = timezone.now().date()
+        cls.bills = [
+            Bill.objects.create(user=cls.customer, title=f"Bill {number}", amount=10 + number, due_date=today)
+            for number in range(5)
+        ]
+        other = User.objects.create_user("other", password="secret")
+        Bill.objects.create(user=other, title="Not mine", amount=10, due_date=today)
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+
+    def get(self, **params):
+        return self.client.get(reverse("customerportal:api_bills"), params)
+
+    def test_fields_narrow_the_rows(self):
+        response = self.get(fields="title,amount,title", limit=1)
+
+        self.assertEqual(response.json()["results"], [{"id": self.bills[-1].pk, "title": "Bill 4", "amount": "14.00"}])
+        self.assertEqual(self.get(fields="title,password").json(), {"error": "Unknown field(s): password."})
+        self.assertEqual(self.get(fields="title,password").status_code, 400)
+
+    def test_cursor_walks_every_row_once(self):
+        ids, cursor = [], None
+        while True:
+            data = self.get(limit=2, fields="id", **({"cursor": cursor} if cursor else {})).json()
+            self.assertEqual(data["count"], 5)
+            ids += [row["id"] for row in data["results"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+
+        self.assertEqual(ids, sorted((bill.pk for bill in self.bills), reverse=True))
+        self.assertEqual(self.get(limit=0).status_code, 400)
+
+    def test_unchanged_collections_answer_not_modified(self):
+        first = self.get(limit=2)
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(reverse("customerportal:api_bills"), {"limit": 2}, HTTP_IF_NONE_MATCH=first["ETag"])
+        other_page = self.client.get(reverse("customerportal:api_bills"), {"limit": 3}, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(cached.status_code, 304)
+        self.assertFalse([query for query in queries if '"billingapp_bill"."title"' in query["sql"]])
+        self.assertEqual(other_page.status_code, 200)
+
+        bill = self.bills[0]
+        bill.title = "Renamed"
+        bill.save()
+        changed = self.client.get(reverse("customerportal:api_bills"), {"limit": 2}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+    def test_transactions_filter_by_any_status(self):
+        start_payment(self.bills[0])
+        url = reverse("customerportal:api_transactions")
+
+        pending = self.client.get(url, {"status": Transaction.STATUS_PENDING, "fields": "status"}).json()
+        self.assertEqual(pending["results"], [{"id": mock.ANY, "status": "pending"}])
+        self.assertEqual(
+            self.client.get(url, {"status": "refunded"}).json(),
+            {"error": "'status' must be one of: pending, success, failed."},
+        )
+
+    def test_only_customers_may_call_the_api(self):
+        self.client.logout()
+        self.assertEqual(self.get().status_code, 401)
+
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        self.assertEqual(self.get().status_code, 403)
+
+
+@override_settings(STORAGES=STORAGES)
+class ConditionalPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user("customer", password="secret")
+        cls.subscription = add_billing_history(cls.customer, 0, paid_by=cls.customer)
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+
+    def revalidate(self, name, etag):
+        return self.client.get(reverse(f"customerportal:{name}"), HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_answer_not_modified(self):
+        for name in ("dashboard", "subscriptions", "payment_history"):
+            with self.subTest(name=name):
+                first = self.client.get(reverse(f"customerportal:{name}"))
+                with CaptureQueriesContext(connection) as queries:
+                    cached = self.revalidate(name, first["ETag"])
+
+                self.assertEqual(first.status_code, 200)
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual(cached["ETag"], first["ETag"])
+                self.assertFalse([query for query in queries if '"billingapp_bill"."title"' in query["sql"]])
+
+    def test_data_changes_invalidate_the_page(self):
+        etag = self.client.get(reverse("customerportal:dashboard"))["ETag"]
+        bill = Bill.objects.create(user=self.customer, title="Water", amount=30, due_date=timezone.now().date())
+        added = self.revalidate("dashboard", etag)
+        self.assertEqual(added.status_code, 200)
+        self.assertContains(added, "Water")
+
+        # Deleting a row does not move any updated_at; the row counts catch it.
+        bill.delete()
+        Bill.objects.filter(user=self.customer).update(updated_at=timezone.now() - timedelta(days=1))
+        etag = self.client.get(reverse("customerportal:dashboard"))["ETag"]
+        Bill.objects.filter(user=self.customer, title="Fees 0").delete()
+        self.assertEqual(self.revalidate("dashboard", etag).status_code, 200)
+
+    def test_etags_roll_over_at_local_midnight(self):
+        url = reverse("customerportal:dashboard")
+        with mock.patch("billingapp.conditional.timezone.localdate", return_value=date(2026, 9, 1)):
+            etag = self.client.get(url)["ETag"]
+            self.assertEqual(self.revalidate("dashboard", etag).status_code, 304)
+        with mock.patch("billingapp.conditional.timezone.localdate", return_value=date(2026, 9, 2)):
+            self.assertEqual(self.revalidate("dashboard", etag).status_code, 200)
+
+    def test_pending_messages_are_not_swallowed(self):
+        etag = self.client.get(reverse("customerportal:dashboard"))["ETag"]
+        paid = self.customer.bills.get(status=Bill.STATUS_PAID)
+
+        self.client.post(reverse("customerportal:pay_bill", args=[paid.pk]))
+        response = self.revalidate("dashboard", etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "This bill is already paid.")
+        self.assertEqual(self.revalidate("dashboard", etag).status_code, 304)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 
 app_name = "customerportal"
@@ -11,7 +11,12 @@ urlpatterns = [
     path("profile/", views.profile, name="profile"),
     path("history/", views.payment_history, name="payment_history"),
     path("bills/<int:bill_id>/pay/", views.pay_bill, name="pay_bill"),
+    path("statements/", views.statements, name="statements"),
+    path("statements/<int:year>-<int:month>.<str:fmt>", views.statement_download, name="statement_download"),
     path("subscriptions/", views.subscriptions, name="subscriptions"),
     path("subscriptions/new/", views.subscription_create, name="subscription_create"),
     path("subscriptions/<int:subscription_id>/toggle/", views.subscription_toggle, name="subscription_toggle"),
+    path("api/bills/", api.bill_list, name="api_bills"),
+    path("api/subscriptions/", api.subscription_list, name="api_subscriptions"),
+    path("api/transactions/", api.transaction_list, name="api_transactions"),
 ]
\ No newline at end of file
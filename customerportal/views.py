@@ -1,18 +1,27 @@
 from __future__ import annotations
 
 import json
-from datetime import timedelta
+from datetime import date, timedelta
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.db.models import Sum
 from django.db.models.functions import TruncMonth
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
+from billingapp.conditional import conditional_page
+from billingapp.events import record
 from billingapp.forms import ProfileForm, SelfSubscriptionForm
-from billingapp.models import Bill, Subscription, Transaction
+from billingapp.models import Bill, BillingEvent, Subscription, Transaction
+from billingapp.payments import PaymentError, start_payment
+from billingapp.statements import FORMATS, month_end, previous_month, statement_for, statement_path
 from billingapp.utils import ensure_subscription_bills
+from billingplatform.querybudget import query_budget
 
 
 def _ensure_customer(user):
@@ -21,7 +30,13 @@ def _ensure_customer(user):
     return None
 
 
+def _first_statement_month(user) -> date:
+    return user.date_joined.date().replace(day=1)
+
+
+@query_budget(19)
 @login_required
+@conditional_page
 def dashboard(request):
     redirect_response = _ensure_customer(request.user)
     if redirect_response:
@@ -33,16 +48,17 @@ def dashboard(request):
     today = timezone.now().date()
     due_soon_bills = pending_bills.filter(due_date__gte=today, due_date__lte=today + timedelta(days=7))
 
-    recent_transactions = request.user.transactions.select_related("bill")[:10]
+    recent_transactions = request.user.transactions.all()[:10]
     subscriptions = request.user.subscriptions.all()
     active_subscriptions = subscriptions.filter(active=True)
     recent_paid_bills = request.user.bills.filter(status=Bill.STATUS_PAID).order_by("-paid_at")[:5]
 
-    total_paid = request.user.transactions.aggregate(total=Sum("amount"))["total"] or 0
+    successful = request.user.transactions.filter(status=Transaction.STATUS_SUCCESS)
+    total_paid = successful.aggregate(total=Sum("amount"))["total"] or 0
     total_pending = pending_bills.aggregate(total=Sum("amount"))["total"] or 0
 
     monthly_spend = (
-        request.user.transactions.annotate(month=TruncMonth("payment_date"))
+        successful.annotate(month=TruncMonth("payment_date"))
         .values("month")
         .order_by("month")
         .annotate(total=Sum("amount"))
@@ -77,6 +93,7 @@ def dashboard(request):
     return render(request, "customer/dashboard.html", context)
 
 
+@query_budget(10)
 @login_required
 def pay_bill(request, bill_id):
     redirect_response = _ensure_customer(request.user)
@@ -86,14 +103,27 @@ def pay_bill(request, bill_id):
     bill = get_object_or_404(Bill, pk=bill_id, user=request.user)
 
     if request.method == "POST":
-        bill.mark_paid(paid_by=request.user)
-        messages.success(request, f"Bill '{bill.title}' marked as paid.")
+        try:
+            payment = start_payment(bill, paid_by=request.user)
+        except PaymentError as exc:
+            messages.warning(request, str(exc))
+            return redirect("customerportal:dashboard")
+        payment.refresh_from_db(fields=["status", "failure_reason"])
+        if payment.status == Transaction.STATUS_SUCCESS:
+            messages.success(request, f"Bill '{bill.title}' marked as paid.")
+        elif payment.status == Transaction.STATUS_FAILED:
+            messages.error(request, f"Payment for '{bill.title}' failed: {payment.failure_reason}")
+        else:
+            messages.info(request, f"Payment for '{bill.title}' is processing. The bill updates once the gateway confirms it.")
         return redirect("customerportal:dashboard")
 
-    return render(request, "customer/pay_bill_confirm.html", {"bill": bill})
+    processing = bill.transactions.filter(status=Transaction.STATUS_PENDING).exists()
+    return render(request, "customer/pay_bill_confirm.html", {"bill": bill, "processing": processing})
 
 
+@query_budget(8)
 @login_required
+@conditional_page
 def subscriptions(request):
     redirect_response = _ensure_customer(request.user)
     if redirect_response:
@@ -104,6 +134,7 @@ def subscriptions(request):
     return render(request, "customer/subscriptions.html", {"subscriptions": subs})
 
 
+@query_budget(8)
 @login_required
 def subscription_create(request):
     redirect_response = _ensure_customer(request.user)
@@ -126,30 +157,41 @@ def subscription_create(request):
     return render(request, "customer/subscription_form.html", {"form": form})
 
 
+@query_budget(7)
 @login_required
 def subscription_toggle(request, subscription_id):
     redirect_response = _ensure_customer(request.user)
     if redirect_response:
         return redirect_response
 
-    subscription = get_object_or_404(Subscription, pk=subscription_id, user=request.user)
-    subscription.active = not subscription.active
-    subscription.save(update_fields=["active", "updated_at"])
+    # The change and its billing event commit together.
+    with transaction.atomic():
+        subscription = get_object_or_404(Subscription.objects.select_for_update(), pk=subscription_id, user=request.user)
+        subscription.active = not subscription.active
+        subscription.save(update_fields=["active", "updated_at"])
+        record(
+            BillingEvent.KIND_SUBSCRIPTION_RESUMED if subscription.active else BillingEvent.KIND_SUBSCRIPTION_PAUSED,
+            user=subscription.user_id,
+            subscription=subscription,
+            actor=request.user,
+        )
     status = "activated" if subscription.active else "paused"
     messages.info(request, f"Subscription '{subscription.name}' {status}.")
     return redirect("customerportal:subscriptions")
 
 
+@query_budget(8)
 @login_required
+@conditional_page
 def payment_history(request):
     redirect_response = _ensure_customer(request.user)
     if redirect_response:
         return redirect_response
 
-    transactions = request.user.transactions.select_related("bill")
+    transactions = request.user.transactions.all()
     success_count = transactions.filter(status=Transaction.STATUS_SUCCESS).count()
     failed_count = transactions.filter(status=Transaction.STATUS_FAILED).count()
-    total_amount = transactions.aggregate(total=Sum("amount"))["total"] or 0
+    total_amount = transactions.filter(status=Transaction.STATUS_SUCCESS).aggregate(total=Sum("amount"))["total"] or 0
 
     context = {
         "transactions": transactions,
@@ -160,6 +202,7 @@ def payment_history(request):
     return render(request, "customer/payment_history.html", context)
 
 
+@query_budget(5)
 @login_required
 def profile(request):
     redirect_response = _ensure_customer(request.user)
@@ -178,3 +221,55 @@ def profile(request):
         form = ProfileForm(instance=profile)
 
     return render(request, "customer/profile.html", {"form": form})
+
+
+STATEMENT_MONTHS = 12
+
+
+@query_budget(4)
+@login_required
+def statements(request):
+    redirect_response = _ensure_customer(request.user)
+    if redirect_response:
+        return redirect_response
+
+    month = previous_month()
+    first = _first_statement_month(request.user)
+    stored = {statement.month: statement for statement in request.user.statements.filter(month__gte=first)}
+    months = []
+    while month >= first and len(months) < STATEMENT_MONTHS:
+        months.append({"month": month, "statement": stored.get(month)})
+        month = previous_month(month)
+    return render(request, "customer/statements.html", {"months": months})
+
+
+@query_budget(10)
+@login_required
+def statement_download(request, year, month, fmt):
+    redirect_response = _ensure_customer(request.user)
+    if redirect_response:
+        return redirect_response
+
+    try:
+        month = date(year, month, 1)
+    except ValueError:
+        raise Http404("No such month.")
+    if fmt not in FORMATS or month_end(month) > timezone.localdate().replace(day=1):
+        raise Http404("Statements are available for completed months only.")
+    if month < _first_statement_month(request.user):
+        raise Http404("There are no statements before the account was opened.")
+
+    statement = statement_for(request.user, month)
+    digest = statement.digest(fmt)
+    etag = quote_etag(digest)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(
+            statement_path(digest, fmt).open("rb"),
+            content_type=FORMATS[fmt][1],
+            as_attachment=fmt == "txt" or "download" in request.GET,
+            filename=f"statement-{month:%Y-%m}.{fmt}",
+        )
+        response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
@@ -0,0 +1,121 @@
+/* Customer picker for admin forms: fetches matches as the user types and
+   stores the chosen customer's id in the hidden input next to the text box. */
+(function () {
+    "use strict";
+
+    function setup(container) {
+        var url = container.dataset.autocompleteUrl;
+        var minLength = parseInt(container.dataset.autocompleteMinLength, 10) || 1;
+        var hidden = container.querySelector('input[type="hidden"]');
+        var input = container.querySelector('input[type="search"]');
+        var list = container.querySelector(".autocomplete-results");
+        var timer = null;
+        var controller = null;
+        var active = -1;
+
+        function close() {
+            list.hidden = true;
+            list.innerHTML = "";
+            active = -1;
+            input.setAttribute("aria-expanded", "false");
+        }
+
+        function choose(item) {
+            hidden.value = item.dataset.id;
+            input.value = item.textContent;
+            close();
+        }
+
+        function highlight(index) {
+            var items = list.querySelectorAll("li[data-id]");
+            if (!items.length) {
+                return;
+            }
+            active = (index + items.length) % items.length;
+            items.forEach(function (item, position) {
+                item.setAttribute("aria-selected", position === active ? "true" : "false");
+            });
+            items[active].scrollIntoView({ block: "nearest" });
+        }
+
+        function show(results) {
+            list.innerHTML = "";
+            if (!results.length) {
+                var empty = document.createElement("li");
+                empty.className = "autocomplete-empty";
+                empty.textContent = "No matching customers";
+                list.appendChild(empty);
+            }
+            results.forEach(function (result) {
+                var item = document.createElement("li");
+                item.dataset.id = result.id;
+                item.setAttribute("role", "option");
+                item.textContent = result.label;
+                list.appendChild(item);
+            });
+            list.hidden = false;
+            input.setAttribute("aria-expanded", "true");
+            active = -1;
+        }
+
+        function search() {
+            var query = input.value.trim();
+            if (controller) {
+                controller.abort();
+            }
+            if (query.length < minLength) {
+                close();
+                return;
+            }
+            controller = new AbortController();
+            fetch(url + "?q=" + encodeURIComponent(query), {
+                credentials: "same-origin",
+                headers: { Accept: "application/json" },
+                signal: controller.signal
+            })
+                .then(function (response) { return response.ok ? response.json() : { results: [] }; })
+                .then(function (data) { show(data.results); })
+                .catch(function (error) {
+                    if (error.name !== "AbortError") {
+                        close();
+                    }
+                });
+        }
+
+        input.addEventListener("input", function () {
+            // Typing invalidates the previous choice until a match is picked.
+            hidden.value = "";
+            clearTimeout(timer);
+            timer = setTimeout(search, 150);
+        });
+
+        input.addEventListener("keydown", function (event) {
+            if (list.hidden) {
+                return;
+            }
+            if (event.key === "ArrowDown" || event.key === "ArrowUp") {
+                event.preventDefault();
+                highlight(active + (event.key === "ArrowDown" ? 1 : -1));
+            } else if (event.key === "Enter" && active >= 0) {
+                event.preventDefault();
+                choose(list.querySelectorAll("li[data-id]")[active]);
+            } else if (event.key === "Escape") {
+                close();
+            }
+        });
+
+        list.addEventListener("mousedown", function (event) {
+            var item = event.target.closest("li[data-id]");
+            if (item) {
+                event.preventDefault();
+                choose(item);
+            }
+        });
+
+        input.addEventListener("blur", function () {
+            setTimeout(close, 100);
+        });
+    }
+
+    document.querySelectorAll(".autocomplete[data-autocomplete-url]").forEach(setup);
+})();